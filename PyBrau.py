@@ -12,6 +12,7 @@
     Revision History
     14 Jan 2017 - Created
     22 Dec 2017 - Tested and debugged
+    16 Oct 2026 - Moved the control loop into a separate control worker thread
     
     Author: Lars Soltmann
     
@@ -32,6 +33,28 @@
     - Temperature sensors used are 10K NTC B57861S thermistor using a 5V voltage divider with 10K resistor
     - Thermistor wiring:
         V+ --- R10K --- Pin# --- Therm --- GND
+    - Data logs are written in binary (PyBrau_Log_<timestamp>.bin), convert to text with:
+        python3 PyBrau_logger.py PyBrau_Log_<timestamp>.bin
+    - Tunables (DAQ port, gains, filter, setpoint inputs, ...) are read from PyBrau_config.json,
+      see PyBrau_config.py for the defaults.  The session is checkpointed to PyBrau_state.json
+      and resumed on the next start if PyBrau did not shut down cleanly.
+    - The DAQ is opened in the background (PyBrau_connect.py) with a timeout and retries, the
+      DEVICE label shows the progress and the Connect button cancels it
+    - While connected, DAQ errors are retried and the port is reopened by the control worker
+      (PyBrau_supervisor.py).  If the DAQ stays gone for io_blackout sec the pump and heaters
+      are switched OFF, they have to be turned on again once it is back.
+    - With the DAQ location set to the URL of a running PyBrau_daemon.py (http://127.0.0.1:8420)
+      the GUI is only a client: the daemon runs the control loop, the data log and the session
+      checkpoints, and keeps the heaters under control when the GUI is closed.  The auto-tune
+      is not available through the daemon.
+    - With telemetry_port set in the configuration every temperature sample is streamed to local
+      subscribers (PyBrau_telemetry.py), while the GUI runs its own control worker
+    - The DAQ pins and any extra vessels come from the configuration (PyBrau_vessels.py).  The
+      GUI shows the mash and boil system, extra vessels and more brew systems are run through
+      PyBrau_daemon.py.
+    - The kettles show the predicted time until they reach their setpoint (h:mm:ss, -- while
+      there is no estimate) and the energy their heater used (with heater_watts in the
+      configuration), both from the control worker (PyBrau_eta.py)
     
     Software Requirements:
     - Python3
@@ -43,6 +66,24 @@
     
     Calls:  DLP_IO8_G_py.py
             Thermistor_B57861S.py
+            PyBrau_control.py
+            PyBrau_daqio.py
+            PyBrau_thermLUT.py
+            PyBrau_logger.py
+            PyBrau_render.py
+            PyBrau_trend.py
+            PyBrau_sim.py
+            PyBrau_probes.py
+            PyBrau_schedule.py
+            PyBrau_predict.py
+            PyBrau_tune.py
+            PyBrau_config.py
+            PyBrau_connect.py
+            PyBrau_supervisor.py
+            PyBrau_client.py
+            PyBrau_telemetry.py
+            PyBrau_vessels.py
+            PyBrau_eta.py (through the control worker)
             
             
     OPEN ITEMS:
@@ -51,13 +92,28 @@
     '''
 
 
-import tkinter as tk
 import time
+T_START=time.perf_counter() #start of the startup time measurement
+import tkinter as tk
+import tkinter.messagebox
 import sys
-import math
 #sys.path.append('/Users/lsoltmann/CodeProjects/DLP_IO8_G') #For MAC only
 from DLP_IO8_G_py import DLP
 from Thermistor_B57861S import thermistor
+from PyBrau_control import control_worker
+from PyBrau_daqio import daq_io
+from PyBrau_logger import data_logger
+from PyBrau_render import tk_render
+from PyBrau_trend import trend_chart
+from PyBrau_probes import timing_probes, PROBE_GUI
+from PyBrau_schedule import read_schedule
+from PyBrau_tune import relay_tuner, tune_result, profile_gains, profile_models, save_result
+from PyBrau_config import load_config, state_store
+from PyBrau_connect import daq_connector
+from PyBrau_supervisor import daq_supervisor
+from PyBrau_client import remote_worker
+from PyBrau_telemetry import start_publisher
+from PyBrau_vessels import config_layout, system_configs, claimed_ports
 
 
 class brew_control:
@@ -73,6 +129,9 @@ class brew_control:
         
         ##Debug
         self.debug=0; #1=ON, 0=OFF, outputs all state variables to screen after any button event
+
+        ##Equipment configuration, PyBrau_config.json overrides the defaults in PyBrau_config.py
+        config=load_config()
         
         ##System variables
         self.comms_status=0 #0,1 - indicates whether or not connected to USB DAQ
@@ -84,39 +143,104 @@ class brew_control:
         self.tempMH=0 #float - RIMS heater temperature
         self.boilMA=0 #0,1 - 0=manual control of boil element, 1=auto control of boil element
         self.setMK=0 #int - setpoint temperature for mash tun kettle
-        self.setMK_IN=154 #Inital input for mash temperature
+        self.setMK_IN=config['setMK_IN'] #Inital input for mash temperature
         self.setBK=0 #int - active setpoint temperature for boil kettle
-        self.setBK_IN=170 #Inital input for boil temperature
+        self.setBK_IN=config['setBK_IN'] #Inital input for boil temperature
         self.heatB_DC=0 #int - active duty cycle of boil heater
         self.heatB_DC_man=0 #int - manual duty cycle of boil heater
-        self.heatB_DC_IN=0 #Inital input for boil duty cycle
+        self.heatB_DC_IN=config['heatB_DC_IN'] #Inital input for boil duty cycle
         self.heatM_DC=0 #int - duty cycle of mash heater
+        self.heatB_DC_act=0 #float - duty cycle of boil heater achieved by the SSR timing in the last period
+        self.heatM_DC_act=0 #float - duty cycle of mash heater achieved by the SSR timing in the last period
+        self.pwm_jitter=0 #float - worst SSR timing error in the last period, sec
         self.setDC_BW=0.5 #int - Duty cycle weight given to boil in optimization algorithm (0 <= x <= 1, 0.5 is equal weight between mash and boil)
         self.setDC_MW=0.5 #int - Duty cycle weight given to mash in optimization algorithm (0 <= x <= 1, 0.5 is equal weight between mash and boil)
-        self.setDC_MW_IN=50 #Inital input for duty cycle optimization mash weight (divided by 100 when used in algorithm)
-        self.setDC_BW_IN=50 #Inital input for duty cycle optimization boil weight (divided by 100 when used in algorithm)
+        self.setDC_MW_IN=config['setDC_MW_IN'] #Inital input for duty cycle optimization mash weight (divided by 100 when used in algorithm)
+        self.setDC_BW_IN=100-self.setDC_MW_IN #Inital input for duty cycle optimization boil weight (divided by 100 when used in algorithm)
         self.log_ON=0 #0,1 - data logging on or not
+        self.LOG=None #background data logger, exists while logging
         self.DCopt=0 #0,1 - duty cycle optimization algorithm active or not
+        self.sched_ON=0 #0,1 - mash schedule running or not, the schedule drives setMK/setBK while it runs
+        self.SCHED=None #mash schedule loaded from a recipe file
+        self.sched_status='SCHED' #text of the schedule button
         
         ##Control variables
-        self.DC_T=0.5 #Duty cycle period in seconds for heaters
-        self.P_M=0.375 #Proportional gain - mash
-        self.I_M=0.09375 #Integral gain - mash
-        self.P_B=0.375 #Proportional gain - boil
-        self.I_B=0.09375 #Integral gain - boil
-        self.VREF=5.0 #Reference voltage used by thermistor
+        self.DC_T=config['DC_T'] #Duty cycle period in seconds for heaters
+        self.P_M=config['P_M'] #Proportional gain - mash
+        self.I_M=config['I_M'] #Integral gain - mash
+        self.P_B=config['P_B'] #Proportional gain - boil
+        self.I_B=config['I_B'] #Integral gain - boil
+        self.esum_max_M=config['esum_max_M'] #Integrator clamp - mash
+        self.esum_max_B=config['esum_max_B'] #Integrator clamp - boil
+        self.profile=config['profile'] #equipment profile, the tuned gains of the profile replace the ones above
+        self.TUNER=None #relay auto-tune test, exists while a test runs or its result is shown
+        self.tune_result=None #gains and predicted response of the finished relay test
+        self.VREF=config['VREF'] #Reference voltage used by thermistor
+        self.load_gains()
         self.THERM=thermistor()
         self.esum_M=0 #error summation used by integrator - mash
         self.esum_B=0 #error summation used by integrator - boil
-        
-        self.log_dt=1 #sec, time between data log writes *NOTE: must be <= DC_T
-        self.gui_update_dt=0.75 #sec, time between GUI updates *NOTE: must be <= DC_T
-        
-        self.temp_filt_cutoff=3 #Hz, cutoff frequency for temperature filter
-        self.temp_filt_coef=(2*math.pi*(1/self.DC_T)*self.temp_filt_cutoff)/(2*math.pi*(1/self.DC_T)*self.temp_filt_cutoff+1) #First order low pass filter for temperature readings
+        self.CTRL=None #control worker, owns the DAQ while connected
+        self.IO=None #supervised DAQ I/O of the control worker, None when attached to a daemon
+        self.remote=0 #0,1 - attached to a PyBrau daemon instead of running the control worker here
+        self.port=config['port'] #DAQ serial port
+        self.recipe_dir=config['recipe_dir'] #mash schedule recipes, the only ones a daemon accepts
+        self.port_serial=config['port_serial'] #USB serial number of the DAQ, None=use the port
+        self.port_fallback=config['port_fallback'] #also try the other ports of the same kind
+        self.claimed_ports=claimed_ports(system_configs(config),'main') #DAQs of the daemon's other brew systems
+        self.LAYOUT=config_layout(config) #DAQ pin map
+        self.CONNECT=None #background DAQ connect, exists while it is trying
+        self.connect_timeout=config['connect_timeout'] #sec, longest time one attempt to open the DAQ may take
+        self.connect_attempts=config['connect_attempts'] #attempts to open the DAQ before giving up
+        self.connect_retry_dt=config['connect_retry_dt'] #sec, time between attempts
+        self.io_blackout=config['io_blackout'] #sec, DAQ failing this long switches the pump and heaters OFF
+        self.io_backoff_max=config['io_backoff_max'] #sec, longest time between retries of a failing DAQ
+
+        ##Session checkpoints, the last session is resumed if PyBrau did not shut down cleanly
+        self.STORE=state_store(interval=config['checkpoint_dt'],max_age=config['resume_max_age'])
+        self.SESSION=self.STORE.load()
+
+        ##Telemetry stream for dashboards, None if off
+        self.TELEM=start_publisher(config['telemetry_port'])
+        
+        self.log_dt=config['log_dt'] #sec, time between data log samples, independent of DC_T (limited by the temperature sample rate)
+        self.log_decimate=config['log_decimate'] #only every Nth log sample is written to disk, for long sessions at a small log_dt
+        self.gui_update_dt=config['gui_update_dt'] #sec, time between GUI updates *NOTE: must be >= DC_T
+        
+        self.allocator=config['allocator'] #'predictive' or 'weights', how the heater budget is split when both heaters ask for more than one period
+        
+        self.temp_filt_cutoff=config['temp_filt_cutoff'] #Hz, cutoff frequency for temperature filter
+        self.sample_dt=self.DC_T if config['sample_dt'] is None else config['sample_dt'] #sec, time between temperature samples, independent of the heater control period
+        self.oversample=config['oversample'] #number of samples per channel taken in each temperature read (1=no oversampling)
+        self.reject=config['reject'] #'median','trimmed' or 'mean', how oversampled readings are reduced to one sample
+        self.sample_rate=0 #float - measured temperature samples/sec per channel
+        self.io_errors=0 #int - failed DAQ transactions since connecting
+        self.io_state='ok' #'ok','retry' or 'reopen' - DAQ link state
+        self.io_reconnects=0 #int - times the DAQ port was reopened since connecting
+        self.io_failsafes=0 #int - times the control worker switched everything OFF because the DAQ was gone
+        self.eta_M=None #float - sec until the mash kettle reaches its setpoint, None if there is no estimate
+        self.eta_B=None #float - sec until the boil kettle reaches its setpoint, None if there is no estimate
+        self.kWh_M=None #float - energy used by the mash heater, None if its power is not configured
+        self.kWh_B=None #float - energy used by the boil heater, None if its power is not configured
         self.first_time=1
         self.first_log=1
 
+        ##Only values that changed are sent to Tk when the GUI is updated
+        self.RENDER=tk_render()
+
+        ##Trend chart, the window is only built when it is first opened
+        self.TREND=trend_chart(self.master)
+        self.last_tick=-1 #last control worker tick added to the trend chart
+
+        ##Loop timing probes, shared with the control worker and switched on from the loop health panel
+        self.PROBES=timing_probes()
+        self.tick_rate=0 #control ticks/sec
+        self.t_rate=None #time and tick of the last tick rate measurement
+        self.tick_rate_start=0
+
+        ##Startup time of every stage, sec
+        self.t_startup={'imports':time.perf_counter()-T_START}
+
         ##Create all the windows
         self.init_daq_win()
         self.init_mash_win()
@@ -126,18 +250,21 @@ class brew_control:
         self.init_boil_stats()
         self.init_cntrl_button_win()
         self.init_DCopt_stats()
-        self.init_DCopt_ACT()
+        ##Panels that only show the running control loop are built after the main window is on screen
+        self.deferred=[self.init_DCopt_ACT,self.init_loop_health]
+        self.master.after_idle(self.build_deferred)
+        self.t_startup['windows']=time.perf_counter()-T_START
     
         ##Initialize switch panel in disabled mode since no device connection has been established
         self.pump_button.config(state = 'disabled')
         self.boil_button.config(state = 'disabled')
         self.boil_type_button.config(state = 'disabled')
         self.log_button.config(state = 'disabled')
+
+        ##Make sure the heaters are turned OFF when the window is closed
+        self.master.protocol("WM_DELETE_WINDOW",self.close_window)
         
         ##Check loop time compatibility
-        if self.log_dt < self.DC_T:
-            print('\n**** WARNING! Data log sampling time is less than heater control period. Setting log sampling time equal to heater control period. ****')
-            self.log_dt=self.DC_T
         if self.gui_update_dt < self.DC_T:
             print('\n**** WARNING! GUI update time is less than heater control period. Setting GUI update time equal to heater control period. ****')
             self.gui_update_dt=self.DC_T
@@ -163,19 +290,30 @@ class brew_control:
         ##Connect button
         daq_connect_button = tk.Button(subframe_daq, text="Connect",command=lambda:self.connect_to_daq(daq_status_light_canvas,daq_status_light,daq_loc,daq_connect_button))
         daq_connect_button.pack(side=tk.LEFT,padx=(5,5), pady=10)
+        self.daq_connect_button=daq_connect_button #pressed by resume_session()
 
 
         ##Entry field for device location
         #daq_loc = tk.StringVar(subframe_daq, value="/dev/tty.usbserial-12345678") #Mac
-        daq_loc = tk.StringVar(subframe_daq, value="/dev/ttyUSB0")
+        #daq_loc = tk.StringVar(subframe_daq, value="/dev/ttyUSB0")
         #daq_loc = tk.StringVar(subframe_daq, value="test") #Makes testing easier
+        #daq_loc = tk.StringVar(subframe_daq, value="sim") #Simulated DAQ and brew system
+        daq_loc = tk.StringVar(subframe_daq, value=self.port) #'port' in PyBrau_config.json
+        self.daq_loc=daq_loc
         daq_field = tk.Entry(subframe_daq, width=25, textvariable=daq_loc).pack(side=tk.RIGHT,padx=(0,5))
 
 
         subframe_daq.place(x=win_loc_x, y=win_loc_y)
-        tk.Label(self.master, text='DEVICE').place(x=win_loc_x+20, y=win_loc_y,anchor=tk.W)
+        self.stat_daq=tk.StringVar(self.master,value='DEVICE') #shows the progress while connecting
+        tk.Label(self.master, textvariable=self.stat_daq).place(x=win_loc_x+20, y=win_loc_y,anchor=tk.W)
 
     def connect_to_daq(self,daq_status_light_canvas,daq_status_light,daq_loc,daq_connect_button):
+        ##Panels that are still waiting to be built are needed from here on
+        self.build_deferred(all=True)
+        ##Stop a connect that is still trying
+        if self.CONNECT is not None:
+            self.CONNECT.cancel()
+            return
         ##Open device if it wasn't previously open
         if self.comms_status==0:
             if (daq_loc.get() == "test"):
@@ -183,56 +321,112 @@ class brew_control:
                 self.comms_status=1
                 daq_connect_button.config(text="Disconnect")
                 print('Test Mode!') #Can't do a whole lot in this mode. Mostly for testing buttons.
-            else:
-                self.DAQ=DLP(daq_loc.get())
-                #If open was successful, change the status light and button text
-                if self.DAQ.initialize()==0:
+            elif daq_loc.get().startswith('http://'):
+                #Attach to a running daemon, it owns the DAQ and the control worker
+                try:
+                    self.CTRL=remote_worker(daq_loc.get())
+                except (OSError,ValueError) as e:
+                    daq_status_light_canvas.itemconfig(daq_status_light, fill="red")
+                    print('Daemon connect error! %s' % e)
+                else:
                     daq_status_light_canvas.itemconfig(daq_status_light, fill="green")
                     self.comms_status=1
+                    self.remote=1
+                    self.SESSION=None #the daemon resumes its own session
+                    self.io_failsafes=0
                     daq_connect_button.config(text="Disconnect")
-                    print('Device opened!')
-                
-                    #Make sure device is setup correctly by setting to binary and degF
-                    self.DAQ.changeSettings("B","F")
-                
-                    ##SET ALL OUPUTS TO OFF!!
-                    self.DAQ.setDigitalOutput(4,0)
-                    self.DAQ.setDigitalOutput(5,0)
-                    self.DAQ.setDigitalOutput(6,0)
-            
-                #If open was not successfull, report error
+                    print('Connected to the daemon!')
+                    self.sync_remote()
+                    self.CTRL.start()
+            else:
+                if (daq_loc.get() == "sim"):
+                    from PyBrau_sim import sim_DLP #only loaded when it is used
+                    factory=lambda port: sim_DLP(self.THERM,pins=self.LAYOUT.pins) #Simulated DAQ and brew system, runs in real time
+                    print('Simulation Mode!')
                 else:
-                    daq_status_light_canvas.itemconfig(daq_status_light, fill="red")
-                    self.comms_status=0
-                    print('Device open error!')
+                    factory=DLP
+                #Open the device in the background, the GUI shows the progress until it is open or all attempts failed
+                self.CONNECT=daq_connector(daq_loc.get(),factory,self.connect_timeout,self.connect_attempts,self.connect_retry_dt,
+                                           self.port_serial if daq_loc.get()==self.port else None,self.port_fallback,self.claimed_ports)
+                self.CONNECT.start()
+                daq_status_light_canvas.itemconfig(daq_status_light, fill="yellow")
+                daq_connect_button.config(text="Cancel")
+                self.connect_poll(daq_status_light_canvas,daq_status_light,daq_loc,daq_connect_button)
+                return
         ##Close device
         else:
             try:
                 #Cancel temp loop
                 self.master.after_cancel(self.temp_loop)
                 self.first_time=1
-                #Set all outputs to zero
-                self.DAQ.setDigitalOutput(4,0)
-                self.DAQ.setDigitalOutput(5,0)
-                self.DAQ.setDigitalOutput(6,0)
-                #Disconnect from device
-                self.DAQ.disconnect()
+                self.t_rate=None
+                self.tick_rate=0
+                #Stop the control worker, this sets all outputs to zero
+                self.CTRL.stop()
+                self.CTRL=None
+                #Disconnect from device, the daemon keeps its DAQ
+                if self.IO is not None:
+                    self.IO.disconnect()
+                    self.IO=None
+                self.remote=0
                 self.comms_status=0
                 print('Device closed!')
             except:
                 print('Could not close device ... or exiting test mode.')
+                self.CTRL=None
                 self.comms_status=0
             daq_status_light_canvas.itemconfig(daq_status_light, fill="red")
             daq_connect_button.config(text="Connect")
+        self.comms_buttons()
+
+    ##Progress of the background connect, once it is done the DAQ is handed to the control worker
+    def connect_poll(self,daq_status_light_canvas,daq_status_light,daq_loc,daq_connect_button):
+        CONNECT=self.CONNECT
+        if CONNECT.is_alive() and CONNECT.phase!='connected':
+            self.stat_daq.set('DEVICE - '+CONNECT.status())
+            self.master.after(100,lambda:self.connect_poll(daq_status_light_canvas,daq_status_light,daq_loc,daq_connect_button))
+            return
+        self.CONNECT=None
+        self.stat_daq.set('DEVICE')
+        if CONNECT.phase=='connected':
+            self.DAQ=CONNECT.DAQ
+            daq_loc.set(CONNECT.port)
+            daq_status_light_canvas.itemconfig(daq_status_light, fill="green")
+            self.comms_status=1
+            daq_connect_button.config(text="Disconnect")
+            print('Device opened!')
+
+            ##SET ALL OUPUTS TO OFF!!
+            #DAQ errors are retried and the port reopened with the same factory
+            self.IO=daq_supervisor(daq_io(self.DAQ),CONNECT.identity,CONNECT.factory,blackout=self.io_blackout,backoff_max=self.io_backoff_max,timeout=self.connect_timeout,lock=CONNECT.LOCK)
+            self.IO.write_pins(self.LAYOUT.all_off(),force=True)
+            self.io_failsafes=0
+
+            ##Hand the DAQ over to the control worker
+            self.CTRL=control_worker(self.IO,self.THERM,DC_T=self.DC_T,VREF=self.VREF,P_M=self.P_M,I_M=self.I_M,P_B=self.P_B,I_B=self.I_B,esum_max_M=self.esum_max_M,esum_max_B=self.esum_max_B,temp_filt_cutoff=self.temp_filt_cutoff,layout=self.LAYOUT,sample_dt=self.sample_dt,oversample=self.oversample,reject=self.reject,probes=self.PROBES,allocator=self.allocator,tuned=profile_models(self.profile))
+            self.send_setpoints()
+            self.restore_outputs()
+            self.send_cmd('telemetry',self.TELEM)
+            self.CTRL.start()
+
+        #If open was not successfull, report error
+        else:
+            daq_status_light_canvas.itemconfig(daq_status_light, fill="red")
+            daq_connect_button.config(text="Connect")
+            self.comms_status=0
+            print('Device open error! %s' % CONNECT.message if CONNECT.phase=='failed' else 'Connect cancelled.')
+        self.comms_buttons()
 
+    ##Enable or disable the switch panel for the connection status
+    def comms_buttons(self):
         if self.comms_status==1:
             #If comms were successfully established, enable all buttons except mash (requires pump to be ON)
             self.pump_button.config(state = 'active')
             self.boil_button.config(state = 'active')
             self.boil_type_button.config(state = 'active')
             self.log_button.config(state = 'active')
+            self.sched_button.config(state = 'active')
             self.t_lastGUIupdate=time.time()
-            self.t_logUpdate=time.time()
             self.main_loop()
         elif self.comms_status==0:
             #If comms are closed, set all buttons to OFF and disable them
@@ -254,12 +448,18 @@ class brew_control:
             self.stat_heatM_ON.set('OFF')
             self.heatB_DC=0
             self.heatB_DC_man=0
-            self.stat_heatB_DC.set(self.heatB_DC)
+            self.RENDER.set(self.stat_heatB_DC,'{:.0f}'.format(self.heatB_DC))
             self.log_button.config(text="DATA LOG      <OFF>  ON",justify=tk.LEFT)
             self.log_button.config(state = 'disabled')
             self.log_ON=0
+            self.sched_button.config(state = 'disabled')
+            self.RENDER.config(self.sched_button,text='SCHED')
+            self.sched_ON=0
+            self.write_log()
             self.esum_M=0
             self.esum_B=0
+            if self.SESSION is None: #keep the checkpoint of a session that has not been resumed yet
+                self.checkpoint(clean=True)
         
         ##FOR DEBUG ONLY
         self.debug_display()
@@ -289,6 +489,12 @@ class brew_control:
         ##Data Logging button
         self.log_button = tk.Button(subframe_switchPanel, text="DATA LOG      <OFF>  ON",justify=tk.LEFT,wraplength=70,command=lambda:self.log_command(self.log_button))
         self.log_button.grid(column = 1, row = 1)
+        ##Trend chart button
+        self.trend_button = tk.Button(subframe_switchPanel, text="TREND",justify=tk.LEFT,wraplength=70,command=lambda:self.TREND.show())
+        self.trend_button.grid(column = 2, row = 1)
+        ##PI auto-tune button
+        self.tune_button = tk.Button(subframe_switchPanel, text="TUNE",justify=tk.CENTER,wraplength=40,command=lambda:self.show_tune_win())
+        self.tune_button.grid(column = 3, row = 0, rowspan = 2, sticky=tk.N+tk.S, pady=(10,0))
     
         subframe_switchPanel.place(x=win_loc_x, y=win_loc_y)
         tk.Label(self.master, text='SWITCH PANEL').place(x=win_loc_x+20, y=win_loc_y,anchor=tk.W)
@@ -309,6 +515,7 @@ class brew_control:
             self.subcanvas_mash.itemconfig(self.mash_heater_color1,fill='white')
             self.stat_heatM_ON.set('OFF')
             self.esum_M=0
+        self.send_cmd('mash',self.heatM_ON)
         
         ##FOR DEBUG ONLY
         self.debug_display()
@@ -324,6 +531,7 @@ class brew_control:
             self.heatB_ON=0
             self.stat_heatB_ON.set('OFF')
             self.esum_B=0
+        self.send_cmd('boil',self.heatB_ON)
         
         ##FOR DEBUG ONLY
         self.debug_display()
@@ -337,7 +545,7 @@ class brew_control:
             self.stat_pump_ON.set('ON')
             self.subcanvas_mash.itemconfig(self.mash_pump_text, text='ON',fill='black')
             self.subcanvas_mash.itemconfig(self.mash_pump_box,fill='green')
-            self.DAQ.setDigitalOutput(4,1)
+            self.send_cmd('pump',1)
         elif self.pump_ON==1:
             #Automatically turn OFF mash heater if pump is turned OFF
             pump_button.config(text="PUMP      <OFF>  ON",justify=tk.LEFT)
@@ -350,7 +558,7 @@ class brew_control:
             self.subcanvas_mash.itemconfig(self.mash_heater_color1,fill='white')
             self.stat_pump_ON.set('OFF')
             self.stat_heatM_ON.set('OFF')
-            self.DAQ.setDigitalOutput(4,0)
+            self.send_cmd('pump',0)
             self.esum_M=0
         
         ##FOR DEBUG ONLY
@@ -362,7 +570,7 @@ class brew_control:
             boil_type_button.config(text="BOIL CNTL           MAN  <AUTO>",justify=tk.LEFT)
             self.boilMA=1
             self.stat_boilMA.set('AUTO')
-            self.stat_heatB_DC.set('{:.0f}'.format(self.heatB_DC))
+            self.RENDER.set(self.stat_heatB_DC,'{:.0f}'.format(self.heatB_DC))
         elif self.boilMA==1:
             boil_type_button.config(text="BOIL CNTL          <MAN>  AUTO",justify=tk.LEFT)
             self.boilMA=0
@@ -371,6 +579,7 @@ class brew_control:
 
         #Reset integrator
         self.esum_B=0
+        self.send_cmd('boil_type',self.boilMA)
 
         ##FOR DEBUG ONLY
         self.debug_display()
@@ -383,6 +592,7 @@ class brew_control:
         elif self.log_ON==1:
             log_button.config(text="DATA LOG      <OFF>  ON",justify=tk.LEFT)
             self.log_ON=0
+        self.write_log()
         
         ##FOR DEBUG ONLY
         self.debug_display()
@@ -464,6 +674,10 @@ class brew_control:
         ##Set all inputs button
         self.set_inputs_button = tk.Button(self.subframe_buttonPanel, text="SET   ",justify=tk.CENTER,wraplength=30,command=lambda:self.set_all_inputs_cmd())
         self.set_inputs_button.grid(column = 8, row=1,rowspan=2,sticky=tk.N+tk.S,pady=(2,0),padx=(5,5))
+
+        ##Mash schedule button, shows the schedule progress while it runs
+        self.sched_button = tk.Button(self.subframe_buttonPanel, text=self.sched_status,justify=tk.CENTER,wraplength=40,width=5,state='disabled',command=lambda:self.schedule_command())
+        self.sched_button.grid(column = 9, row=1,rowspan=2,sticky=tk.N+tk.S,pady=(2,0),padx=(0,5))
         
         self.subframe_buttonPanel.place(x=win_loc_x, y=win_loc_y)
         tk.Label(self.master, text='CONTROL PANEL').place(x=win_loc_x+20, y=win_loc_y,anchor=tk.W)
@@ -631,15 +845,53 @@ class brew_control:
         self.setDC_BW=(100-self.setDC_MW_IN)/100
         
         # Update the gui
-        self.stat_setMK.set(self.setMK)
-        self.stat_setBK.set(self.setBK)
+        self.show_setpoints()
+
+        # Update the control worker
+        self.send_setpoints()
+        
+        ##FOR DEBUG ONLY
+        self.debug_display()
+
+    ##Show the active setpoints
+    def show_setpoints(self):
+        self.RENDER.set(self.stat_setMK,'{:.0f}'.format(self.setMK))
+        self.RENDER.set(self.stat_setBK,'{:.0f}'.format(self.setBK))
         self.stat_heatB_DC_man.set(self.heatB_DC_man)
-        self.stat_setDCMW.set(self.setDC_MW_IN)
-        self.stat_setDCBW.set(100-self.setDC_MW_IN)
+        self.stat_setDCMW.set(round(self.setDC_MW*100))
+        self.stat_setDCBW.set(round(self.setDC_BW*100))
+
+    ##Start a mash schedule from a recipe file, or stop the running one
+    def schedule_command(self):
+        if self.sched_ON==0:
+            import tkinter.filedialog #only loaded when it is used
+            path=tkinter.filedialog.askopenfilename(parent=self.master,title='Mash schedule',initialdir=self.recipe_dir,filetypes=[('Recipe','*.txt'),('All files','*')])
+            if not path:
+                return
+            try:
+                self.SCHED=read_schedule(path,self.DC_T)
+            except (IOError,ValueError) as e:
+                tkinter.messagebox.showerror('Mash schedule',str(e),parent=self.master)
+                return
+            self.sched_ON=1
+            self.send_cmd('schedule',self.SCHED)
+        elif tkinter.messagebox.askyesno('Mash schedule','Stop the mash schedule?\nThe setpoints stay where they are.',parent=self.master):
+            self.sched_ON=0
+            self.send_cmd('schedule',None)
+            self.RENDER.config(self.sched_button,text='SCHED')
         
         ##FOR DEBUG ONLY
         self.debug_display()
 
+    ##Send a command to the control worker, if there is one (not in test mode)
+    def send_cmd(self,cmd,*args):
+        if self.CTRL is not None:
+            self.CTRL.send(cmd,*args)
+
+    ##Send the active setpoints to the control worker
+    def send_setpoints(self):
+        self.send_cmd('setpoints',self.setMK,self.setBK,self.heatB_DC_man,self.setDC_MW,self.setDC_BW)
+
 
     #################### MASH WINDOW ####################
     def init_mash_win(self):
@@ -695,6 +947,8 @@ class brew_control:
         self.mash_water_color=self.subcanvas_mash.create_rectangle(Kshift+BW,(HK-2*BW)/3+BW,Kshift+WK-BW*FC,HK-BW*FC,outline='black',width=0,fill='blue') #simulated water
         self.mash_tolerance=self.subcanvas_mash.create_rectangle(Kshift+WK/2-W1/2+x1+BW1,(((HK-2*BW)/3)/2)+BW-H1/3,Kshift+WK/2-W1/2+x2-BW1,(((HK-2*BW)/3)/2)+BW+H1/3,outline='black',width=0,fill='red') #temperature tolerance indicator box
         self.mash_temp_color=self.subcanvas_mash.create_text(self.mash_tun_loc_x,self.mash_tun_loc_y,text=self.tempMK,fill='black',anchor=tk.CENTER)
+        self.mash_eta_text=self.subcanvas_mash.create_text(self.mash_tun_loc_x,HK*2/3,text='ETA --',fill='white',anchor=tk.CENTER) #time to setpoint
+        self.mash_kWh_text=self.subcanvas_mash.create_text(self.mash_tun_loc_x,HK*2/3+18,text='',fill='white',anchor=tk.CENTER) #heater energy
         self.subcanvas_mash.pack()
     
     
@@ -782,6 +1036,8 @@ class brew_control:
         self.boil_water_color=self.subcanvas_boil.create_rectangle(0+BW1+3,(HK-2*BW1)/3+BW1,WK-BW1*FC,HK-BW1*FC,outline='black',width=0,fill='blue') #simulated water
         self.boil_tolerance=self.subcanvas_boil.create_rectangle(WK/2-W1/2+x1+BW1,(((HK-2*BW)/3)/2)+BW-H1/3,WK/2-W1/2+x2-BW1,(((HK-2*BW)/3)/2)+BW+H1/3,outline='black',width=0,fill='red') #temperature tolerance indicator box
         self.boil_temp_color=self.subcanvas_boil.create_text(self.boil_kettle_loc_x,self.boil_kettle_loc_y,text=self.tempBK,fill='black',anchor=tk.CENTER)
+        self.boil_eta_text=self.subcanvas_boil.create_text(self.boil_kettle_loc_x,HK*2/3,text='ETA --',fill='white',anchor=tk.CENTER) #time to setpoint
+        self.boil_kWh_text=self.subcanvas_boil.create_text(self.boil_kettle_loc_x,HK*2/3+18,text='',fill='white',anchor=tk.CENTER) #heater energy
         self.subcanvas_boil.pack()
 
 
@@ -875,291 +1131,453 @@ class brew_control:
         win_loc_y=260
         
         self.subframe_DCopt_act = tk.Frame(self.master, relief=tk.GROOVE, borderwidth=2)
-        tk.Label(self.subframe_DCopt_act, text="DC Optimization:").grid(row=0,column=0,padx=(10,0),pady=(10,10))
+        tk.Label(self.subframe_DCopt_act, text="DC Optimization:").grid(row=0,column=0,padx=(10,0),pady=(3,3))
     
         self.stat_DCopt_act=tk.StringVar(self.subframe_DCopt_act,value='OFF')
         self.stat_DCopt_act_label=tk.Label(self.subframe_DCopt_act, textvariable=self.stat_DCopt_act,foreground='green')
-        self.stat_DCopt_act_label.grid(row=0,column=1,padx=(0,10),pady=(10,10))
+        self.stat_DCopt_act_label.grid(row=0,column=1,padx=(0,10),pady=(3,3))
     
         self.subframe_DCopt_act.place(x=win_loc_x, y=win_loc_y)
 
+    #################### LOOP HEALTH ####################
+    def init_loop_health(self):
+        ##Window location, right under the DC optimization status
+        win_loc_x=210
+        win_loc_y=292
+        font=('Helvetica',8)
+
+        self.subframe_health = tk.Frame(self.master, relief=tk.GROOVE, borderwidth=2)
+        ##Timing probes ON/OFF, independent of the debug printout
+        self.probes_ON=tk.IntVar(self.subframe_health,value=0)
+        tk.Checkbutton(self.subframe_health, text="Probes", font=font, variable=self.probes_ON, command=lambda:self.PROBES.enable(self.probes_ON.get()==1)).grid(row=0,column=0)
+
+        self.stat_tick_rate=tk.StringVar(self.subframe_health,value='-- Hz')
+        tk.Label(self.subframe_health, textvariable=self.stat_tick_rate, font=font).grid(row=0,column=1,padx=(0,5))
+
+        self.stat_worst=tk.StringVar(self.subframe_health,value='worst --')
+        tk.Label(self.subframe_health, textvariable=self.stat_worst, font=font).grid(row=0,column=2,padx=(0,5))
+
+        self.stat_io_errors=tk.StringVar(self.subframe_health,value='0 err')
+        self.stat_io_errors_label=tk.Label(self.subframe_health, textvariable=self.stat_io_errors, font=font, foreground='green')
+        self.stat_io_errors_label.grid(row=0,column=3,padx=(0,5))
+
+        self.subframe_health.place(x=win_loc_x, y=win_loc_y)
+
 
 ################################################ CONTROL/FLOW FUNCTIONS ###############################################
-    ##PI control to determine duty cycle for both mash and boil controls
-    def PI_ctrl(self,SP,PV,kp,ki,esum):
-        #SP=setpoint
-        #PV=process variable
-        #kp=proportional gain
-        #ki=integral gain
-        #esum=error sum
-        
-        ##Calculate duty cycle for heater
-        error=SP-PV
-        esum=esum+(error*self.DC_T)
-        #Limit the integrator to prevent windup
-        if esum>5.0:
-            esum=5.0
-        elif esum<-5.0:
-            esum=-5.0
-        P=kp*error
-        I=ki*esum
-        u=P+I
-        #Limit output to between 0 and 1
-        if u>1.0:
-            u=1.0
-        elif u<0.0:
-            u=0.0
-        u=u*100 #Bring the duty cycle back to a value between 0 and 100.  This is only done for the dispaly and logging purpose.  The PID gains were orignially used with a 0 to 1 output so the that part of the algorithm will not be changed and just the final duty cycle brough up by two orders of magnitude.
-        return u,esum
-    
-    ##Function to read all thermistors
-    def read_temps(self):
-        #Read temperatures
-        tempMK_volts=self.DAQ.getVoltage(1)
-        tempMH_volts=self.DAQ.getVoltage(2)
-        tempBK_volts=self.DAQ.getVoltage(3)
-        tempMK_raw=self.THERM.getTempF(10000,self.VREF,tempMK_volts)
-        tempMH_raw=self.THERM.getTempF(10000,self.VREF,tempMH_volts)
-        tempBK_raw=self.THERM.getTempF(10000,self.VREF,tempBK_volts)
-
-        #Set temperatures to zero if reading is less than zero (sensor unplugged)
-        if tempMK_raw<0:
-            tempMK_raw=0
-        if tempBK_raw<0:
-            tempBK_raw=0
-        if tempMH_raw<0:
-            tempMH_raw=0
-        
-        #For the first time through, the filter needs a previous value so just set it to the current value
-        if self.first_time==1:
-            self.tempMK=tempMK_raw
-            self.tempMH=tempMH_raw
-            self.tempBK=tempBK_raw
-        
-        #Apply exponential moving average filter to temperature data
-        self.tempMK=self.temp_filt_coef*tempMK_raw+(1-self.temp_filt_coef)*self.tempMK
-        self.tempMH=self.temp_filt_coef*tempMH_raw+(1-self.temp_filt_coef)*self.tempMH
-        self.tempBK=self.temp_filt_coef*tempBK_raw+(1-self.temp_filt_coef)*self.tempBK
-
-    ##Function to control heaters
-    def heater_control(self):
-        ##Calculate raw duty cycles for mash and boil heater
-        #Mash
-        if self.heatM_ON==1:
-            temp_heatM_DC,self.esum_M=self.PI_ctrl(self.setMK,self.tempMK,self.P_M,self.I_M,self.esum_M) #PI control to determine duty cycle
-            u_M=temp_heatM_DC/100
-        else:
-            u_M=0
-        
-        #Boil
-        if self.heatB_ON==1:
-            if self.boilMA==1:
-                temp_heatB_DC,self.esum_B=self.PI_ctrl(self.setBK,self.tempBK,self.P_B,self.I_B,self.esum_B) #PI control to determine duty cycle
-                u_B=temp_heatB_DC/100
-            elif self.boilMA==0:
-                u_B=self.heatB_DC_man/100
-        else:
-            u_B=0
-
-        ##Apply duty cycle optimization algorithm, if needed
-        #
-        #Algorithm is based on the cost function:
-        #    cost=wB*[uB-uB_O]^2+wM*[uM-uM_O]^2
-        #where  wB=weight applied to boil duty cycle input
-        #       wM=weight applied to mash duty cycle input
-        #       uB=raw boil duty cycle
-        #       uM=raw mash duty cycle
-        #       uB_O=optimized boil duty cycle
-        #       uM_O=optimized mash duty cycle
-        #
-        #Constraints are:
-        #    wB+wM=1
-        #    uB_O+uM_O=1
-        #
-        if (u_B+u_M)>1:
-            self.DCopt=1
-            u_B=self.setDC_MW*(1-u_M)+self.setDC_BW*u_B
-            u_M=1-u_B
-        else:
-            self.DCopt=0
-
-        ##Record actual duty cycle for display
-        self.heatB_DC=u_B*100
-        self.heatM_DC=u_M*100
-
-        ##Calculate time based on duty cycle
-        t_on_M=u_M*self.DC_T #sec
-        t_off_M=self.DC_T-t_on_M; #sec
-        t_on_B=u_B*self.DC_T #sec
-        t_off_B=self.DC_T-t_on_B; #sec
-        delta_t=abs(t_on_M-t_on_B)
-        
-        ##Turn ON and OFF heaters
-        #
-        #[ 0 < x,y < 1]
-        #
-        #Case 1 (u_M=1,u_B=0)
-        if (u_M==1 and u_B==0):
-            self.DAQ.setDigitalOutput(6,0)
-            self.DAQ.setDigitalOutput(5,1)
-            time.sleep(self.DC_T)
-        
-        #Case 2 (u_M=0,u_B=1)
-        elif (u_M==0 and u_B==1):
-            self.DAQ.setDigitalOutput(5,0)
-            self.DAQ.setDigitalOutput(6,1)
-            time.sleep(self.DC_T)
-        
-        #Case 3 (u_M=0,u_B=0)
-        elif (u_M==0 and u_B==0):
-            self.DAQ.setDigitalOutput(5,0)
-            self.DAQ.setDigitalOutput(6,0)
-            time.sleep(self.DC_T)
-        
-        #Case 4 (u_M=x,u_B=0)
-        elif (u_B==0):
-            self.DAQ.setDigitalOutput(6,0)
-            self.DAQ.setDigitalOutput(5,1)
-            time.sleep(t_on_M)
-            self.DAQ.setDigitalOutput(5,0)
-            time.sleep(t_off_M)
-        
-        #Case 5 (u_M=0,u_B=y)
-        elif (u_M==0):
-            self.DAQ.setDigitalOutput(5,0)
-            self.DAQ.setDigitalOutput(6,1)
-            time.sleep(t_on_B)
-            self.DAQ.setDigitalOutput(6,0)
-            time.sleep(t_off_B)
-        
-        #Case 6 (u_M=x,u_B=y, x+y=1)
-        elif (u_M+u_B==1):
-            self.DAQ.setDigitalOutput(6,0)
-            self.DAQ.setDigitalOutput(5,1)
-            time.sleep(t_on_M)
-            self.DAQ.setDigitalOutput(5,0)
-            self.DAQ.setDigitalOutput(6,1)
-            time.sleep(t_off_M)
-
-        #Case 7 (u_M=x,u_B=y, x+y<1)
-        elif (u_M+u_B<1):
-            self.DAQ.setDigitalOutput(6,0)
-            self.DAQ.setDigitalOutput(5,1)
-            time.sleep(t_on_M)
-            self.DAQ.setDigitalOutput(5,0)
-            time.sleep(delta_t)
-            self.DAQ.setDigitalOutput(6,1)
-            time.sleep(t_on_B)
-        
+    ##Copy the latest state snapshot from the control worker
+    def read_state(self):
+        state=self.CTRL.state
+        self.tempMK=state.tempMK
+        self.tempMH=state.tempMH
+        self.tempBK=state.tempBK
+        self.heatM_DC=state.heatM_DC
+        self.heatB_DC=state.heatB_DC
+        self.esum_M=state.esum_M
+        self.esum_B=state.esum_B
+        self.DCopt=state.DCopt
+        self.heatB_DC_act=state.heatB_DC_act
+        self.heatM_DC_act=state.heatM_DC_act
+        self.pwm_jitter=state.pwm_jitter
+        self.sample_rate=state.sample_rate
+        self.io_errors=state.io_errors
+        self.io_state=state.io_state
+        self.io_reconnects=state.io_reconnects
+        self.eta_M=state.eta_M
+        self.eta_B=state.eta_B
+        self.kWh_M=state.kWh_M
+        self.kWh_B=state.kWh_B
+        ##The control worker switched everything OFF because the DAQ was gone, show it
+        if state.io_failsafes!=self.io_failsafes:
+            self.io_failsafes=state.io_failsafes
+            if self.pump_ON==1:
+                self.pump_command(self.pump_button,self.mash_button)
+            if self.heatB_ON==1:
+                self.boil_command(self.boil_button)
+            if self.TUNER is not None and self.TUNER.phase in ('idle','relay'):
+                self.tune_abort()
+        ##The mash schedule drives the setpoints while it runs
+        if self.sched_ON==1 and state.sched_step>=0:
+            self.setMK=state.setMK
+            self.setBK=state.setBK
+            if state.sched_phase=='done':
+                self.sched_status='DONE'
+            elif state.sched_left is not None:
+                self.sched_status='{}/{} {:.0f}:{:02.0f}'.format(state.sched_step+1,len(self.SCHED.steps),*divmod(state.sched_left//1,60))
+            else:
+                self.sched_status='{}/{} {}'.format(state.sched_step+1,len(self.SCHED.steps),state.sched_phase.upper())
+        ##Control ticks/sec, measured over about two seconds
+        if self.t_rate is None:
+            self.t_rate=state.t
+            self.tick_rate_start=state.tick
+        elif state.t-self.t_rate>=2:
+            self.tick_rate=(state.tick-self.tick_rate_start)/(state.t-self.t_rate)
+            self.t_rate=state.t
+            self.tick_rate_start=state.tick
 
     ##Function to update all temperature labels
+    #Everything goes through the render layer so only the values that changed are sent to Tk
     def update_gui(self):
-        self.subcanvas_mash.delete(self.mash_heater_color2) # Update the mash heater temp in mash canvas
-        self.mash_heater_color2=self.subcanvas_mash.create_text(self.mash_heater_loc_x,self.mash_heater_loc_y,text='{:.1f}'.format(self.tempMH),fill='black',anchor=tk.CENTER)
-
-        self.subcanvas_mash.delete(self.mash_temp_color) # Update the mash kettle temp in mash canvas
-        self.mash_temp_color=self.subcanvas_mash.create_text(self.mash_tun_loc_x,self.mash_tun_loc_y,text='{:.1f}'.format(self.tempMK),fill='black',anchor=tk.CENTER)
+        self.RENDER.begin()
+        self.RENDER.itemconfig(self.subcanvas_mash,self.mash_heater_color2,text='{:.1f}'.format(self.tempMH)) # Update the mash heater temp in mash canvas
+        self.RENDER.itemconfig(self.subcanvas_mash,self.mash_temp_color,text='{:.1f}'.format(self.tempMK)) # Update the mash kettle temp in mash canvas
         
         ##Tolerance box color of mash kettle
         # +/-0.5deg = green, +/-0.5 to +/-1deg = yellow, >+/-1deg = red
         if abs(self.tempMK-self.setMK)>1:
-            self.subcanvas_mash.itemconfig(self.mash_tolerance,fill='red')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_tolerance,fill='red')
         elif abs(self.tempMK-self.setMK)>0.5 and abs(self.tempMK-self.setMK)<=1:
-            self.subcanvas_mash.itemconfig(self.mash_tolerance,fill='yellow')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_tolerance,fill='yellow')
         else:
-            self.subcanvas_mash.itemconfig(self.mash_tolerance,fill='green')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_tolerance,fill='green')
         
         ##Change the mash kettle water color based on temperature
         if self.tempMK<=100:
-            self.subcanvas_mash.itemconfig(self.mash_water_color,fill='#0000FF')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_water_color,fill='#0000FF')
         elif self.tempMK<=120:
-            self.subcanvas_mash.itemconfig(self.mash_water_color,fill='#7F00FF')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_water_color,fill='#7F00FF')
         elif self.tempMK<=140:
-            self.subcanvas_mash.itemconfig(self.mash_water_color,fill='#FF00FF')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_water_color,fill='#FF00FF')
         elif self.tempMK<=160:
-            self.subcanvas_mash.itemconfig(self.mash_water_color,fill='#FF007F')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_water_color,fill='#FF007F')
         elif self.tempMK>=180:
-            self.subcanvas_mash.itemconfig(self.mash_water_color,fill='#FF0000')
+            self.RENDER.itemconfig(self.subcanvas_mash,self.mash_water_color,fill='#FF0000')
 
-        self.subcanvas_boil.delete(self.boil_temp_color) # Update the boil kettle temp in boil canvas
-        self.boil_temp_color=self.subcanvas_boil.create_text(self.boil_kettle_loc_x,self.boil_kettle_loc_y,text='{:.1f}'.format(self.tempBK),fill='black',anchor=tk.CENTER)
+        self.RENDER.itemconfig(self.subcanvas_boil,self.boil_temp_color,text='{:.1f}'.format(self.tempBK)) # Update the boil kettle temp in boil canvas
         
         ##Tolerance box color of boil kettle
         # +/-0.5deg = green, +/-0.5 to +/-1deg = yellow, >+/-1deg = red
         if abs(self.tempBK-self.setBK)>1:
-            self.subcanvas_boil.itemconfig(self.boil_tolerance,fill='red')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_tolerance,fill='red')
         elif abs(self.tempBK-self.setBK)>0.5 and abs(self.tempBK-self.setBK)<=1:
-            self.subcanvas_boil.itemconfig(self.boil_tolerance,fill='yellow')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_tolerance,fill='yellow')
         else:
-            self.subcanvas_boil.itemconfig(self.boil_tolerance,fill='green')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_tolerance,fill='green')
 
         ##Change the boil kettle water color based on temperature
         if self.tempBK<=100:
-            self.subcanvas_boil.itemconfig(self.boil_water_color,fill='#0000FF')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_water_color,fill='#0000FF')
         elif self.tempBK<=120:
-            self.subcanvas_boil.itemconfig(self.boil_water_color,fill='#7F00FF')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_water_color,fill='#7F00FF')
         elif self.tempBK<=140:
-            self.subcanvas_boil.itemconfig(self.boil_water_color,fill='#FF00FF')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_water_color,fill='#FF00FF')
         elif self.tempBK<=160:
-            self.subcanvas_boil.itemconfig(self.boil_water_color,fill='#FF007F')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_water_color,fill='#FF007F')
         elif self.tempBK>=180:
-            self.subcanvas_boil.itemconfig(self.boil_water_color,fill='#FF0000')
+            self.RENDER.itemconfig(self.subcanvas_boil,self.boil_water_color,fill='#FF0000')
 
         ##Update temperatures in stats box
-        self.stat_tempMK.set('{:.1f}'.format(self.tempMK))
-        self.stat_tempMH.set('{:.1f}'.format(self.tempMH))
-        self.stat_tempBK.set('{:.1f}'.format(self.tempBK))
+        self.RENDER.set(self.stat_tempMK,'{:.1f}'.format(self.tempMK))
+        self.RENDER.set(self.stat_tempMH,'{:.1f}'.format(self.tempMH))
+        self.RENDER.set(self.stat_tempBK,'{:.1f}'.format(self.tempBK))
 
         ##Update the duty cycle in the stats box
-        self.stat_heatB_DC.set('{:.0f}'.format(self.heatB_DC))
-        self.stat_heatM_DC.set('{:.0f}'.format(self.heatM_DC))
+        self.RENDER.set(self.stat_heatB_DC,'{:.0f}'.format(self.heatB_DC))
+        self.RENDER.set(self.stat_heatM_DC,'{:.0f}'.format(self.heatM_DC))
         
         ##Update duty cycle optimization algorithm status
         if self.DCopt==1:
-            self.stat_DCopt_act.set('ON')
-            self.stat_DCopt_act_label.config(foreground='#FFA500')
+            self.RENDER.set(self.stat_DCopt_act,'ON')
+            self.RENDER.config(self.stat_DCopt_act_label,foreground='#FFA500')
         elif self.DCopt==0:
-            self.stat_DCopt_act.set('OFF')
-            self.stat_DCopt_act_label.config(foreground='green')
-
-
-    ##Function to write to data log
+            self.RENDER.set(self.stat_DCopt_act,'OFF')
+            self.RENDER.config(self.stat_DCopt_act_label,foreground='green')
+
+        ##Heat-up ETA and heater energy
+        self.RENDER.itemconfig(self.subcanvas_mash,self.mash_eta_text,text=self.format_eta(self.eta_M))
+        self.RENDER.itemconfig(self.subcanvas_mash,self.mash_kWh_text,text=self.format_kWh(self.kWh_M))
+        self.RENDER.itemconfig(self.subcanvas_boil,self.boil_eta_text,text=self.format_eta(self.eta_B))
+        self.RENDER.itemconfig(self.subcanvas_boil,self.boil_kWh_text,text=self.format_kWh(self.kWh_B))
+
+        ##Auto-tune progress
+        self.update_tune()
+
+        ##Mash schedule progress and the setpoints it drives
+        if self.sched_ON==1:
+            self.RENDER.set(self.stat_setMK,'{:.0f}'.format(self.setMK))
+            self.RENDER.set(self.stat_setBK,'{:.0f}'.format(self.setBK))
+            self.RENDER.config(self.sched_button,text=self.sched_status)
+
+        ##Loop health
+        self.RENDER.set(self.stat_tick_rate,'{:.1f} Hz'.format(self.tick_rate))
+        if self.PROBES.enabled:
+            stage,worst=self.PROBES.worst_stage()
+            self.RENDER.set(self.stat_worst,'{} {:.1f} ms'.format(stage,worst*1000))
+        else:
+            self.RENDER.set(self.stat_worst,'worst --')
+        if self.io_state!='ok':
+            self.RENDER.set(self.stat_io_errors,'DAQ {}'.format(self.io_state.upper()))
+        elif self.io_reconnects:
+            self.RENDER.set(self.stat_io_errors,'{} err {} rc'.format(self.io_errors,self.io_reconnects))
+        else:
+            self.RENDER.set(self.stat_io_errors,'{} err'.format(self.io_errors))
+        self.RENDER.config(self.stat_io_errors_label,foreground='red' if self.io_state!='ok' else '#FFA500' if self.io_errors else 'green')
+        self.RENDER.end()
+
+
+    ##Time to setpoint as h:mm:ss, -- without an estimate
+    def format_eta(self,eta):
+        if eta is None:
+            return 'ETA --'
+        minutes,seconds=divmod(int(eta),60)
+        return 'ETA {}:{:02d}:{:02d}'.format(*divmod(minutes,60),seconds)
+
+    ##Heater energy, nothing if the heater power is not configured
+    def format_kWh(self,kWh):
+        if kWh is None:
+            return ''
+        return '{:.2f} kWh'.format(kWh)
+
+    ##Function to start/stop the data log
+    #The control worker samples the log every log_dt on its own clock and queues the records, the logger thread packs them and writes them to disk
+    #Convert the binary log to the text format with: python3 PyBrau_logger.py PyBrau_Log_<timestamp>.bin
     def write_log(self):
-        if self.log_ON==1:
-            if self.first_log==1:
-                timestr = time.strftime("%Y-%m-%d--%H-%M")
-                self.log_file=open('PyBrau_Log_'+timestr+'.txt','w')
-                self.log_file.write('# PyBrau Data Log\n')
-                self.log_file.write('# %s\n\n' % timestr)
-                self.log_file.write('#LABELS Time Pump Mash_heater Boil_heater Mash_temp Boil_temp Mash_heater_temp Boil_type Mash_setpoint Boil_setpoint Boil_dutycycle_manual Boil_dutycycle_active Mash_dutycycle_active Mash_errorSum Boil_errorSum DC_opt\n')
-                self.log_file.write('#UNITS sec On/Off On/Off On/Off degF degF degF Man/Auto degF degF % % % N/A N/A On/Off\n')
-                self.tstart=time.time()
-                self.first_log=0
-            else:
-                tsamp=time.time()
-                self.log_file.write('%.1f %d %d %d %.1f %.1f %.1f %d %.1f %.1f %d %d %d %.1f %.1f %d\n' % (tsamp-self.tstart,self.pump_ON,self.heatM_ON,self.heatB_ON,self.tempMK,self.tempBK,self.tempMH,self.boilMA,self.setMK,self.setBK,self.heatB_DC_man,self.heatB_DC,self.heatM_DC,self.esum_M,self.esum_B,self.DCopt))
-        if self.log_ON==0:
-            try:
-                self.log_file.close()
-                self.first_log=1
-            except:
-                pass
+        if self.remote==1:
+            #The daemon writes the log
+            self.send_cmd('logging',self.log_ON)
+            return
+        if self.log_ON==1 and self.first_log==1:
+            timestr = time.strftime("%Y-%m-%d--%H-%M")
+            self.LOG=data_logger('PyBrau_Log_'+timestr+'.bin',timestr,decimate=self.log_decimate)
+            self.LOG.start()
+            self.send_cmd('log',self.LOG,self.log_dt)
+            self.first_log=0
+        if self.log_ON==0 and self.first_log==0:
+            #The worker owns the logger, it stops it once it is detached (or when the worker ends) so no record is lost
+            self.send_cmd('log',None,self.log_dt)
+            self.first_log=1
 
 
     ########## Main loop for GUI ##########
     def main_loop(self):
-        self.read_temps() #Read all temp sensors
-        self.heater_control() #Turn on/off heaters based on input
+        #The control worker reads the temp sensors, runs the heaters and samples the data log, the GUI only displays its state
+        self.read_state()
+        if self.CTRL.state.tick!=self.last_tick:
+            self.last_tick=self.CTRL.state.tick
+            self.TREND.add(self.CTRL.state.t,(self.tempMK,self.tempMH,self.tempBK,self.setMK,self.setBK,self.heatM_DC,self.heatB_DC))
         if ((time.time()-self.t_lastGUIupdate)>=self.gui_update_dt) or self.first_time==1:
+            t=self.PROBES.start()
             self.update_gui() #Update the GUI
+            self.TREND.redraw() #Update the trend chart, if it is open
+            self.PROBES.stop(PROBE_GUI,t)
             self.t_lastGUIupdate=time.time()
-        if ((time.time()-self.t_logUpdate)>=self.log_dt) or self.first_time==1:
-            self.write_log() #Write to data log
-            self.t_logUpdate=time.time()
+            self.checkpoint() #Session checkpoint, written every checkpoint_dt
         #Loop around again
         self.first_time=0
         self.temp_loop=self.master.after(10, self.main_loop)
 
+    #################### DEFERRED STARTUP ####################
+    ##Build the deferred panels one per idle callback, all=True builds the rest now
+    def build_deferred(self,all=False):
+        if not self.deferred:
+            return
+        if 'first paint' not in self.t_startup:
+            self.t_startup['first paint']=time.perf_counter()-T_START
+        while self.deferred:
+            self.deferred.pop(0)()
+            if not all:
+                break
+        if self.deferred:
+            self.master.after_idle(self.build_deferred)
+            return
+        self.t_startup['ready']=time.perf_counter()-T_START
+        print('Startup: '+', '.join('%s %.0f ms' % (stage,t*1000) for stage,t in self.t_startup.items()))
+        ##Setpoints of the last session, and the session itself if it was left running
+        if self.SESSION is not None:
+            self.master.after(0,self.resume_session)
+
+
+    #################### SESSION CHECKPOINT AND RESUME ####################
+    ##Checkpoint the session, at most every checkpoint_dt unless it is a clean shutdown
+    def checkpoint(self,clean=False):
+        if self.remote==1: #the daemon checkpoints its own session
+            return
+        session={'clean':clean,'port':self.daq_loc.get(),
+                 'pump_ON':self.pump_ON,'heatM_ON':self.heatM_ON,'heatB_ON':self.heatB_ON,'boilMA':self.boilMA,'log_ON':self.log_ON,
+                 'setMK':self.setMK,'setBK':self.setBK,'heatB_DC_man':self.heatB_DC_man,'setDC_MW':self.setDC_MW,'setDC_BW':self.setDC_BW,
+                 'setMK_IN':self.setMK_IN,'setBK_IN':self.setBK_IN,'heatB_DC_IN':self.heatB_DC_IN,'setDC_MW_IN':self.setDC_MW_IN,
+                 'esum_M':self.esum_M,'esum_B':self.esum_B}
+        self.STORE.checkpoint(session,force=clean)
+
+    ##Setpoint inputs of the last session, and if it was left running its setpoints and a reconnect to its DAQ
+    def resume_session(self):
+        S=self.SESSION
+        self.setMK_IN,self.setBK_IN,self.heatB_DC_IN,self.setDC_MW_IN=S['setMK_IN'],S['setBK_IN'],S['heatB_DC_IN'],S['setDC_MW_IN']
+        self.stat_inMK.set(self.setMK_IN)
+        self.stat_inBK.set(self.setBK_IN)
+        self.stat_inheatB_DC.set(self.heatB_DC_IN)
+        self.stat_inDCMW.set(self.setDC_MW_IN)
+        self.stat_inDCBW.set(100-self.setDC_MW_IN)
+        if not self.STORE.resumable(S):
+            self.SESSION=None
+            return
+        print('Resuming the session of %s' % time.strftime("%Y-%m-%d %H:%M:%S",time.localtime(S['time'])))
+        self.setMK,self.setBK,self.heatB_DC_man,self.setDC_MW,self.setDC_BW=S['setMK'],S['setBK'],S['heatB_DC_man'],S['setDC_MW'],S['setDC_BW']
+        self.show_setpoints()
+        self.daq_loc.set(S['port'])
+        self.daq_connect_button.invoke()
+
+    ##Show the switches, setpoints and schedule of the daemon the GUI attached to
+    def sync_remote(self):
+        state=self.CTRL.state
+        self.setMK,self.setBK,self.heatB_DC_man,self.setDC_MW,self.setDC_BW=state.setMK,state.setBK,state.heatB_DC_man,state.setDC_MW,state.setDC_BW
+        self.show_setpoints()
+        #The switch functions only change the GUI while there is no worker to send the commands to
+        CTRL,self.CTRL=self.CTRL,None
+        if state.pump_ON==1:
+            self.pump_command(self.pump_button,self.mash_button)
+            if state.heatM_ON==1:
+                self.mash_command(self.mash_button)
+        if state.heatB_ON==1:
+            self.boil_command(self.boil_button)
+        if state.boilMA==1:
+            self.boil_type_command(self.boil_type_button)
+        if CTRL.extra.get('log_ON'):
+            self.log_command(self.log_button)
+        #Failsafes the daemon had before the GUI attached are not new, read_state would switch the pump and boil OFF for them
+        self.io_failsafes=state.io_failsafes
+        self.CTRL=CTRL
+        if CTRL.extra.get('sched_name'):
+            try:
+                self.SCHED=read_schedule(CTRL.extra['sched_name'],self.DC_T)
+                self.sched_ON=1
+            except (IOError,ValueError) as e:
+                print('Could not read the daemon\'s mash schedule: %s' % e)
+
+    ##Switches and integrators of a resumed session, queued before the control worker starts so its first period runs them
+    def restore_outputs(self):
+        S=self.SESSION
+        self.SESSION=None
+        if not self.STORE.resumable(S):
+            return
+        if S['pump_ON']==1:
+            self.pump_command(self.pump_button,self.mash_button)
+            if S['heatM_ON']==1:
+                self.mash_command(self.mash_button)
+        if S['heatB_ON']==1:
+            self.boil_command(self.boil_button)
+        if S['boilMA']==1:
+            self.boil_type_command(self.boil_type_button)
+        if S['log_ON']==1:
+            self.log_command(self.log_button)
+        self.esum_M,self.esum_B=S['esum_M'],S['esum_B']
+        self.send_cmd('restore',self.esum_M,self.esum_B)
+
+
+    #################### PI AUTO-TUNE ####################
+    ##Gains of the equipment profile, if it has been tuned
+    def load_gains(self):
+        gains=profile_gains(self.profile)
+        if 'mash' in gains:
+            self.P_M,self.I_M,self.esum_max_M=gains['mash']
+        if 'boil' in gains:
+            self.P_B,self.I_B,self.esum_max_B=gains['boil']
+
+    ##Auto-tune window, built the first time it is opened
+    def show_tune_win(self):
+        if getattr(self,'tune_win',None) is None:
+            self.tune_win=tk.Toplevel(self.master)
+            self.tune_win.title('Py Brau PI Auto-Tune')
+            self.tune_win.protocol("WM_DELETE_WINDOW",self.tune_win.withdraw)
+            frame=tk.Frame(self.tune_win)
+            frame.pack(padx=10,pady=10)
+            self.tune_kettle=tk.StringVar(frame,value='mash')
+            tk.Label(frame,text='Kettle:').grid(row=0,column=0,sticky=tk.E)
+            tk.Radiobutton(frame,text='MASH',variable=self.tune_kettle,value='mash').grid(row=0,column=1,sticky=tk.W)
+            tk.Radiobutton(frame,text='BOIL',variable=self.tune_kettle,value='boil').grid(row=0,column=2,sticky=tk.W)
+            tk.Label(frame,text='Profile: '+self.profile).grid(row=0,column=3,padx=(20,0))
+            tk.Label(frame,text='The heater is switched ON/OFF around the active setpoint until the kettle oscillates steadily.',wraplength=400,justify=tk.LEFT).grid(row=1,column=0,columnspan=4,pady=(5,5),sticky=tk.W)
+            self.stat_tune=tk.StringVar(frame,value='Idle')
+            tk.Label(frame,textvariable=self.stat_tune,wraplength=400,justify=tk.LEFT).grid(row=2,column=0,columnspan=4,sticky=tk.W)
+            self.stat_tune_result=tk.StringVar(frame,value='')
+            tk.Label(frame,textvariable=self.stat_tune_result,wraplength=400,justify=tk.LEFT,foreground='blue').grid(row=3,column=0,columnspan=4,pady=(5,5),sticky=tk.W)
+            tk.Button(frame,text='START',command=lambda:self.tune_start()).grid(row=4,column=0)
+            tk.Button(frame,text='ABORT',command=lambda:self.tune_abort()).grid(row=4,column=1)
+            self.tune_apply_button=tk.Button(frame,text='APPLY & SAVE',state='disabled',command=lambda:self.tune_apply())
+            self.tune_apply_button.grid(row=4,column=2)
+            tk.Button(frame,text='CLOSE',command=self.tune_win.withdraw).grid(row=4,column=3)
+        self.tune_win.deiconify()
+        self.tune_win.lift()
+
+    def tune_start(self):
+        kettle=self.tune_kettle.get()
+        if self.CTRL is None:
+            tkinter.messagebox.showerror('PI Auto-Tune','Connect to the DAQ first.',parent=self.tune_win)
+            return
+        if self.remote==1:
+            tkinter.messagebox.showerror('PI Auto-Tune','The auto-tune runs in the GUI\'s own control worker, it is not available through the daemon.',parent=self.tune_win)
+            return
+        if (kettle=='mash' and self.heatM_ON==0) or (kettle=='boil' and self.heatB_ON==0):
+            tkinter.messagebox.showerror('PI Auto-Tune','Turn the %s heater ON first.' % kettle.upper(),parent=self.tune_win)
+            return
+        self.TUNER=relay_tuner(kettle,self.setMK if kettle=='mash' else self.setBK)
+        self.tune_result=None
+        self.send_cmd('autotune',self.TUNER)
+        self.tune_apply_button.config(state='disabled')
+        self.stat_tune_result.set('')
+        self.RENDER.set(self.stat_tune,'Starting relay test at %.0f degF...' % self.TUNER.setpoint)
+
+    def tune_abort(self):
+        if self.TUNER is not None and self.TUNER.phase in ('idle','relay'):
+            self.send_cmd('autotune',None)
+            self.RENDER.set(self.stat_tune,'Aborted')
+        self.TUNER=None
+
+    ##Use the tuned gains from now on and store them in the equipment profile
+    def tune_apply(self):
+        kettle=self.TUNER.kettle
+        result=self.tune_result
+        self.send_cmd('gains',kettle,result['P'],result['I'],result['esum_max'])
+        if kettle=='mash':
+            self.P_M,self.I_M,self.esum_max_M=result['P'],result['I'],result['esum_max']
+        else:
+            self.P_B,self.I_B,self.esum_max_B=result['P'],result['I'],result['esum_max']
+        save_result(self.profile,kettle,result)
+        self.send_cmd('models',profile_models(self.profile))
+        self.tune_apply_button.config(state='disabled')
+        self.RENDER.set(self.stat_tune,'%s gains applied and saved to profile "%s"' % (kettle.upper(),self.profile))
+        self.TUNER=None
+
+    ##Progress of the relay test, called with the GUI update
+    def update_tune(self):
+        TUNER=self.TUNER
+        if TUNER is None or self.tune_result is not None:
+            return
+        if TUNER.phase=='relay':
+            self.RENDER.set(self.stat_tune,'Relay test running %.1f min, %d of %d switches' % (TUNER.elapsed(time.monotonic())/60,len(TUNER.turns),2*(TUNER.cycles+1)))
+        elif TUNER.phase=='failed':
+            self.RENDER.set(self.stat_tune,'Relay test failed: '+TUNER.message)
+            self.TUNER=None
+        elif TUNER.phase=='done':
+            self.tune_result=tune_result(TUNER.model,self.DC_T,source='relay test')
+            r=self.tune_result
+            self.RENDER.set(self.stat_tune,'Relay test done in %.1f min' % (TUNER.elapsed(time.monotonic())/60))
+            self.stat_tune_result.set('Model: %.4f degF/s at full power, dead time %.1f s\nGains: P=%.4f  I=%.5f  integrator clamp %.1f\n10 degF step: settles in %.1f min, overshoot %.2f degF' % (r['k'],r['theta'],r['P'],r['I'],r['esum_max'],r['settling']/60,r['overshoot']))
+            self.tune_apply_button.config(state='active')
+
+
+    ##Close the window, turning all outputs OFF first
+    def close_window(self):
+        if self.CONNECT is not None:
+            self.CONNECT.cancel()
+        if self.CTRL is not None:
+            try:
+                self.CTRL.stop()
+                if self.IO is not None:
+                    self.IO.disconnect()
+            except:
+                print('Could not close device.')
+        if self.remote==0:
+            #Attached to a daemon the GUI only detaches, the daemon keeps its data log
+            self.log_ON=0
+            self.write_log()
+        self.checkpoint(clean=True)
+        if self.LOG is not None:
+            self.LOG.join(2.0)
+        if self.TELEM is not None:
+            self.TELEM.close()
+        self.master.destroy()
+
 
     ##Display debug data
     def debug_display(self):
@@ -1179,6 +1597,16 @@ class brew_control:
             print('Boil duty cycle input = %d' % self.heatB_DC_IN)
             print('Boil duty cycle = %d' % self.heatB_DC)
             print('Mash duty cycle = %d' % self.heatM_DC)
+            print('Duty cycle achieved (M | B) = %.1f | %.1f' % (self.heatM_DC_act,self.heatB_DC_act))
+            print('SSR timing jitter = %.1f ms' % (self.pwm_jitter*1000))
+            print('Temperature samples/sec per channel = %.1f' % self.sample_rate)
+            print('Control ticks/sec = %.2f, DAQ errors = %d' % (self.tick_rate,self.io_errors))
+            if self.CTRL is not None:
+                print('DAQ link = %s, retries = %d, reconnects = %d, failsafes = %d' % (self.io_state,self.CTRL.state.io_retries,self.io_reconnects,self.io_failsafes))
+            if self.PROBES.enabled:
+                for name,stats in self.PROBES.summary().items():
+                    print('Probe %-4s n=%-7d mean %8.3f ms  p99 <%8.3f ms  worst %8.3f ms' % (name,stats['count'],stats['mean']*1000,stats['p99']*1000,stats['worst']*1000))
+            print('GUI Tk calls saved in last refresh = %d (%d made, %d saved in total)' % (self.RENDER.saved_last,self.RENDER.calls,self.RENDER.saved))
             print('Data logging = %d' % self.log_ON)
             print('Duty cycle optimization = %d' % self.DCopt)
             print('Duty cycle weight mash input = %d' % self.setDC_MW_IN)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_bench.py
+
+    Description: Benchmark of the PyBrau control tick against the simulated
+                 DAQ.  Measures the latency distribution (p50/p99/max) of
+                 every stage of the loop (sensor read and conversion, PI
+                 control, heater control, GUI refresh and data log), the
+                 loop timing jitter against DC_T and the error between
+                 the requested and the achieved heater duty cycles.
+                 Results are written to a JSON file so runs of different
+                 versions can be compared.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Usage:
+        python3 PyBrau_bench.py                          #writes PyBrau_bench_<timestamp>.json
+        python3 PyBrau_bench.py -o pi.json -s 60         #60 sec real time loop test
+        python3 PyBrau_bench.py --compare old.json       #compare against an earlier run
+        python3 PyBrau_bench.py --latency 0.002          #simulate a 2 ms serial round-trip
+
+    Notes:
+    - Stage latencies are measured with time.perf_counter on the real CPU, the
+      brew itself runs on the simulator
+    - The GUI refresh is only measured when a display is available
+    - Jitter and duty cycle error come from a real time run of the control
+      worker, so that part takes --seconds to run
+
+    Calls:  PyBrau_control.py
+            PyBrau_daqio.py
+            PyBrau_sim.py
+            PyBrau_logger.py
+            PyBrau.py (GUI refresh only)
+            Thermistor_B57861S.py
+    '''
+
+
+import time
+import json
+import os
+import platform
+import argparse
+import tempfile
+from PyBrau_control import control_worker
+from PyBrau_daqio import daq_io
+from PyBrau_sim import sim_DLP, sim_clock, brew_plant
+from PyBrau_logger import data_logger
+
+
+##Percentiles of a list of samples
+def summarize(samples,scale=1e6):
+    #scale=1e6 reports seconds as microseconds
+    if not samples:
+        return None
+    samples=sorted(samples)
+    n=len(samples)
+    def pct(p):
+        return samples[min(int(p*n),n-1)]*scale
+    return {'n':n,'mean':sum(samples)/n*scale,'p50':pct(0.50),'p99':pct(0.99),'max':samples[-1]*scale}
+
+
+##Time a function call n times
+def time_stage(function,n):
+    samples=[]
+    clock=time.perf_counter
+    for i in range(n):
+        t=clock()
+        function()
+        samples.append(clock()-t)
+    return samples
+
+
+##Serial round-trip delay added to every simulated DAQ call
+class slow_sim_DLP(sim_DLP):
+    def __init__(self,*args,latency=0.0,**kwargs):
+        sim_DLP.__init__(self,*args,**kwargs)
+        self.latency=latency
+
+    def setDigitalOutput(self,pin,state):
+        if self.latency:
+            time.sleep(self.latency)
+        sim_DLP.setDigitalOutput(self,pin,state)
+
+    def getVoltage(self,pin):
+        if self.latency:
+            time.sleep(self.latency)
+        return sim_DLP.getVoltage(self,pin)
+
+
+##Control worker that records the timing of every period
+class bench_worker(control_worker):
+    def heater_control(self):
+        layout=control_worker.heater_control(self)
+        self.requested.append((self.heatM_DC/100,self.heatB_DC/100))
+        return layout
+
+    def publish(self):
+        control_worker.publish(self)
+        if hasattr(self,'requested') and len(self.requested)>=2:
+            #The period that just ended ran the duty cycles requested one call before the last
+            u_M,u_B=self.requested[-2]
+            self.periods.append((self.PWM.period,self.PWM.jitter,self.PWM.duty[self.pin_mash]-u_M,self.PWM.duty[self.pin_boil]-u_B))
+
+
+def make_worker(THERM,latency=0.0,clock=None,worker=control_worker):
+    plant=brew_plant(T_MK=148.0,T_MH=150.0,T_BK=150.0)
+    DAQ=slow_sim_DLP(THERM,plant,clock.time if clock else time.monotonic,latency=latency,noise=1.0)
+    DAQ.initialize()
+    CTRL=worker(daq_io(DAQ),THERM,clock=clock)
+    if worker is bench_worker:
+        CTRL.requested=[]
+        CTRL.periods=[]
+    CTRL.send('setpoints',152,200,37,0.5,0.5)
+    CTRL.send('pump',1)
+    CTRL.send('mash',1)
+    CTRL.send('boil',1)
+    CTRL.process_commands()
+    return CTRL
+
+
+##Latency of every stage of the control tick
+def bench_stages(THERM,n=2000,latency=0.0):
+    results={}
+    CLOCK=sim_clock()
+    CTRL=make_worker(THERM,latency,CLOCK)
+    stop=CTRL.stop_event
+
+    ##Advance virtual time between calls so the plant and the filter see a running brew
+    def step(function):
+        samples=[]
+        for i in range(n):
+            CLOCK.wait_until(CLOCK.t+CTRL.DC_T,stop)
+            t=time.perf_counter()
+            function()
+            samples.append(time.perf_counter()-t)
+        return samples
+
+    results['read_temps']=summarize(step(CTRL.read_temps))
+    results['PI_ctrl']=summarize(time_stage(lambda:CTRL.PI_ctrl(152,CTRL.tempMK,CTRL.P_M,CTRL.I_M,0.5),n))
+    results['heater_control']=summarize(step(CTRL.heater_control))
+
+    ##One full period of SSR events (output writes only, the waits are skipped)
+    def pwm_period():
+        CTRL.PWM.plan(CLOCK.t,CTRL.heater_control())
+        while CTRL.PWM.next_deadline() is not None:
+            CLOCK.wait_until(CTRL.PWM.next_deadline(),stop)
+            t=time.perf_counter()
+            CTRL.PWM.fire_due(CTRL.write_outputs)
+            samples.append(time.perf_counter()-t)
+        CLOCK.wait_until(CLOCK.t+CTRL.DC_T,stop)
+        CTRL.PWM.end_period()
+    samples=[]
+    for i in range(n):
+        pwm_period()
+    results['ssr_output']=summarize(samples)
+
+    ##Data log record
+    path=os.path.join(tempfile.mkdtemp(),'bench.bin')
+    LOG=data_logger(path,'bench')
+    LOG.start()
+    CTRL.LOG=LOG
+    CTRL.t_log_start=CTRL.clock_ns()
+    results['write_log']=summarize(time_stage(CTRL.write_log,n))
+    LOG.stop()
+    LOG.join()
+    os.remove(path)
+
+    results['update_gui']=bench_gui(CTRL,n//10)
+    return results
+
+
+##GUI refresh, needs a display
+def bench_gui(CTRL,n):
+    try:
+        import tkinter as tk
+        root=tk.Tk()
+    except Exception as e:
+        print('GUI refresh not measured: %s' % e)
+        return None
+    from PyBrau import brew_control
+    BC=brew_control(root)
+    BC.build_deferred(all=True)
+    BC.setMK=152
+    BC.setBK=200
+    def refresh():
+        CTRL.read_temps()
+        CTRL.heater_control()
+        BC.tempMK,BC.tempMH,BC.tempBK=CTRL.tempMK,CTRL.tempMH,CTRL.tempBK
+        BC.heatM_DC,BC.heatB_DC,BC.DCopt=CTRL.heatM_DC,CTRL.heatB_DC,CTRL.DCopt
+        BC.update_gui()
+        root.update_idletasks()
+    samples=time_stage(refresh,n)
+    root.destroy()
+    return summarize(samples)
+
+
+##Loop jitter and duty cycle error of the control worker running in real time
+def bench_loop(THERM,seconds=10,latency=0.0):
+    CTRL=make_worker(THERM,latency,worker=bench_worker)
+    CTRL.start()
+    time.sleep(seconds)
+    CTRL.stop()
+    periods=CTRL.periods[1:] #the first period includes the startup
+    return {'DC_T':CTRL.DC_T,
+            'periods':len(periods),
+            'period_error_us':summarize([abs(p[0]-CTRL.DC_T) for p in periods]),
+            'jitter_us':summarize([p[1] for p in periods]),
+            'duty_error_mash_pct':summarize([abs(p[2]) for p in periods],100),
+            'duty_error_boil_pct':summarize([abs(p[3]) for p in periods],100)}
+
+
+##Print a table of the results, with the change against a baseline run
+def report(results,baseline=None):
+    def line(name,new,old):
+        if new is None:
+            print('  %-22s %s' % (name,'not measured'))
+            return
+        text='  %-22s p50 %10.2f  p99 %10.2f  max %10.2f' % (name,new['p50'],new['p99'],new['max'])
+        if old:
+            text+='   (p99 %+.0f%%)' % (100*(new['p99']-old['p99'])/old['p99'] if old['p99'] else 0)
+        print(text)
+    print('Stage latency (us):')
+    for name,new in results['stages'].items():
+        line(name,new,baseline['stages'].get(name) if baseline else None)
+    print('Control loop (DC_T=%.3f s, %d periods):' % (results['loop']['DC_T'],results['loop']['periods']))
+    for name in ('period_error_us','jitter_us','duty_error_mash_pct','duty_error_boil_pct'):
+        line(name,results['loop'][name],baseline['loop'].get(name) if baseline else None)
+
+
+if __name__ == "__main__":
+    from Thermistor_B57861S import thermistor
+    parser=argparse.ArgumentParser(description='PyBrau control loop benchmark')
+    parser.add_argument('-o','--output',default='PyBrau_bench_'+time.strftime("%Y-%m-%d--%H-%M")+'.json',help='result file')
+    parser.add_argument('-n','--samples',type=int,default=2000,help='samples per stage')
+    parser.add_argument('-s','--seconds',type=float,default=10,help='length of the real time loop test')
+    parser.add_argument('--latency',type=float,default=0.0,help='simulated serial round-trip per DAQ call, sec')
+    parser.add_argument('--compare',help='earlier result file to compare against')
+    args=parser.parse_args()
+
+    THERM=thermistor()
+    results={'time':time.strftime("%Y-%m-%d %H:%M:%S"),
+             'python':platform.python_version(),
+             'machine':platform.machine(),
+             'platform':platform.platform(),
+             'latency':args.latency,
+             'stages':bench_stages(THERM,args.samples,args.latency),
+             'loop':bench_loop(THERM,args.seconds,args.latency)}
+    with open(args.output,'w') as f:
+        json.dump(results,f,indent=2)
+
+    baseline=None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline=json.load(f)
+    report(results,baseline)
+    print('Results written to %s' % args.output)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_client.py
+
+    Description: Client of the PyBrau daemon HTTP API (PyBrau_daemon.py).
+                 remote_worker has the same interface as the control worker
+                 (send(), state, start(), stop()), so the GUI runs on top of
+                 a daemon exactly as it runs its own control worker.  The
+                 state is read from the daemon's NDJSON stream in a
+                 background thread.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - Stopping the client only closes the connection, the daemon keeps the
+      heaters running
+    - Commands that carry Python objects in the local control worker are
+      translated: 'schedule' sends the recipe file path of the schedule
+      (read again by the daemon), 'log' is not sent (the GUI sends 'logging'
+      to switch the daemon's own data log)
+    - If the stream breaks the client connects again every second and keeps
+      the last state, connected is False meanwhile
+    - Fields the daemon adds to the state ('log_ON','sched_name') are kept in
+      extra
+
+    Calls:  PyBrau_control.py (state layout only)
+            PyBrau_vessels.py (state layout only)
+    '''
+
+
+import json
+import threading
+import urllib.request
+import urllib.error
+from PyBrau_control import control_state
+from PyBrau_vessels import vessel_state
+
+
+class remote_worker(threading.Thread):
+    remote=True
+
+    def __init__(self,url,timeout=2.0):
+        #url=daemon address, e.g. http://127.0.0.1:8420 or http://127.0.0.1:8420/systems/<name>
+        threading.Thread.__init__(self,name='PyBrau client')
+        self.daemon=True
+        self.url=url.rstrip('/')
+        self.timeout=timeout
+        self.stop_event=threading.Event()
+        self.response=None #open stream
+        self.connected=False
+        self.extra={}
+        #The first state is read straight away, an error here means there is no daemon at url
+        with urllib.request.urlopen(self.url+'/state',timeout=timeout) as f:
+            data=json.load(f)
+        if not data.get('connected'):
+            raise IOError('the daemon at %s has no DAQ connected' % self.url)
+        self.set_state(data)
+
+    def set_state(self,data):
+        self.extra={key:data.pop(key) for key in ('connected','log_ON','sched_name') if key in data}
+        data['temps']=tuple(data['temps'])
+        data['vessels']=tuple(vessel_state(*v) for v in data['vessels'])
+        self.state=control_state(**data)
+
+    ##Queue a command on the daemon, e.g. send('pump',1)
+    def send(self,cmd,*args):
+        if cmd=='log':
+            return
+        if cmd=='schedule':
+            args=(args[0].name if args[0] is not None else None,)
+        request=urllib.request.Request(self.url+'/command',data=json.dumps({'cmd':cmd,'args':args}).encode(),headers={'Content-Type':'application/json'})
+        try:
+            with urllib.request.urlopen(request,timeout=self.timeout) as f:
+                f.read()
+        except urllib.error.HTTPError as e:
+            print('Daemon refused %s: %s' % (cmd,json.load(e).get('error')))
+        except OSError as e:
+            print('Could not send %s to the daemon: %s' % (cmd,e))
+
+    ##Close the connection, the daemon keeps running
+    def stop(self,timeout=2.0):
+        self.stop_event.set()
+        response=self.response
+        if response is not None:
+            try:
+                response.close()
+            except OSError:
+                pass
+        if self.is_alive():
+            self.join(timeout)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.response=urllib.request.urlopen(self.url+'/stream',timeout=self.timeout+1)
+                self.connected=True
+                for line in self.response:
+                    self.set_state(json.loads(line))
+                    if self.stop_event.is_set():
+                        break
+            except (OSError,ValueError) as e:
+                if not self.stop_event.is_set():
+                    print('Daemon stream lost: %s' % e)
+            self.connected=False
+            self.stop_event.wait(1.0)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_config.py
+
+    Description: Equipment configuration and session state store for PyBrau.
+                 The tunables of the brew system are read from a JSON
+                 configuration file at startup.  The runtime state of the
+                 session (setpoints, integrators, which elements are ON)
+                 is checkpointed to a small JSON file every few seconds
+                 so that after a crash or a reboot the session resumes
+                 where it was instead of starting the integrators from
+                 zero.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Files:
+        PyBrau_config.json - tunables, any key missing from the file takes the
+                             default below.  The file is written with the
+                             defaults the first time PyBrau runs.
+        PyBrau_state.json  - last checkpoint of the session, written by PyBrau
+
+    Notes:
+    - Every write goes to a temporary file that is synced and then renamed
+      over the old one, so a power cut leaves either the old or the new file
+      and never a partial one
+    - A checkpoint is only written when the state changed and at most every
+      interval sec, it is one small JSON object (a few hundred bytes)
+    - A session is only resumed if the last checkpoint was not written by a
+      clean shutdown (disconnect or closing the window) and is not older than
+      max_age sec, so the heaters never come back on hours later
+    - The mash schedule and a running auto-tune test are not part of the
+      session, they have to be started again
+    '''
+
+
+import json
+import os
+import time
+
+
+CONFIG_PATH='PyBrau_config.json'
+STATE_PATH='PyBrau_state.json'
+
+##Default tunables, PyBrau_config.json overrides any of them
+DEFAULTS={'port':'/dev/ttyUSB0', #DAQ serial port, 'sim' for the simulator, 'test' for test mode, best its /dev/serial/by-id path
+          'port_serial':None, #USB serial number of the DAQ, it is found under /dev/serial/by-id instead of using port, None=use port
+          'port_fallback':False, #try the other ports of the same kind (/dev/ttyUSB*) when port is missing
+          'connect_timeout':5.0, #sec, longest time one attempt to open the DAQ may take
+          'connect_attempts':3, #attempts to open the DAQ before giving up
+          'connect_retry_dt':2.0, #sec, time between attempts
+          'io_blackout':10.0, #sec, DAQ failing this long switches the pump and heaters OFF
+          'io_backoff_max':5.0, #sec, longest time between retries of a failing DAQ
+          'daemon_port':8420, #HTTP API port of PyBrau_daemon.py on 127.0.0.1
+          'recipe_dir':'recipes', #mash schedule recipes, the daemon only reads recipes from this directory
+          'telemetry_port':None, #TCP port of the telemetry stream on 127.0.0.1 (PyBrau_telemetry.py), None=off
+          'pins':{}, #pins of the mash/boil system that differ from the standard DLP-IO8-G map (PyBrau_vessels.py)
+          'vessels':[], #extra vessels (hot liquor tank, second pump), each with its own sensor, heater and pump pins
+          'heater_watts':{}, #W, power of each heater by name ('mash','boil' and the vessel names), for the circuit limit and the energy meters
+          'circuit_limit_W':None, #W, heaters may be ON together up to this total, None=one heater at a time
+          'systems':[], #more brew systems on their own DAQs, run by PyBrau_daemon.py
+          'profile':'default', #equipment profile of the tuned PI gains (PyBrau_profiles.json)
+          'DC_T':0.5, #sec, duty cycle period for heaters
+          'P_M':0.375, #Proportional gain - mash
+          'I_M':0.09375, #Integral gain - mash
+          'P_B':0.375, #Proportional gain - boil
+          'I_B':0.09375, #Integral gain - boil
+          'esum_max_M':5.0, #Integrator clamp - mash
+          'esum_max_B':5.0, #Integrator clamp - boil
+          'VREF':5.0, #Reference voltage used by thermistor
+          'temp_filt_cutoff':3, #Hz, cutoff frequency for temperature filter
+          'sample_dt':None, #sec, time between temperature samples, None=DC_T
+          'oversample':1, #samples per channel in each temperature read
+          'reject':'median', #'median','trimmed' or 'mean'
+          'allocator':'predictive', #'predictive' or 'weights'
+          'log_dt':1, #sec, time between data log samples
+          'log_decimate':1, #only every Nth log sample is written to disk
+          'gui_update_dt':0.75, #sec, time between GUI updates
+          'setMK_IN':154, #Inital input for mash temperature
+          'setBK_IN':170, #Inital input for boil temperature
+          'heatB_DC_IN':0, #Inital input for boil duty cycle
+          'setDC_MW_IN':50, #Inital input for duty cycle optimization mash weight
+          'checkpoint_dt':5.0, #sec, time between session checkpoints
+          'resume_max_age':1800} #sec, oldest session that is resumed after a restart
+
+
+##Write an object as JSON, atomically
+def write_json(path,data,indent=None):
+    tmp=path+'.tmp'
+    with open(tmp,'w') as f:
+        json.dump(data,f,indent=indent,sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp,path)
+
+
+##Tunables from the configuration file, with the defaults for anything it does not set
+def load_config(path=CONFIG_PATH):
+    config=dict(DEFAULTS)
+    try:
+        with open(path) as f:
+            loaded=json.load(f)
+    except FileNotFoundError:
+        write_json(path,config,indent=2)
+        return config
+    except ValueError as e:
+        print('Could not read %s (%s), using the default configuration.' % (path,e))
+        return config
+    for key,value in loaded.items():
+        if key in config:
+            config[key]=value
+        else:
+            print('Unknown configuration key in %s: %s' % (path,key))
+    return config
+
+
+class state_store:
+    def __init__(self,path=STATE_PATH,interval=5.0,max_age=1800):
+        #interval=sec, shortest time between checkpoints
+        #max_age=sec, oldest checkpoint that is resumed
+        self.path=path
+        self.interval=interval
+        self.max_age=max_age
+        self.t_last=None #time.monotonic() of the last checkpoint
+        self.last=None #last state written
+        self.writes=0
+
+    ##Last checkpoint, None if there is none or it cannot be read
+    def load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print('Could not read %s (%s), not resuming.' % (self.path,e))
+            return None
+
+    ##True if a session was left running and is recent enough to resume
+    def resumable(self,session):
+        return session is not None and not session.get('clean',True) and 0<=time.time()-session.get('time',0)<=self.max_age
+
+    ##Write the session state if it changed and the interval has passed, force=write now
+    def checkpoint(self,session,force=False):
+        now=time.monotonic()
+        if not force and self.t_last is not None and now-self.t_last<self.interval:
+            return False
+        if not force and session==self.last:
+            return False
+        self.t_last=now
+        self.last=session
+        try:
+            write_json(self.path,dict(session,time=time.time()))
+        except OSError as e:
+            print('Could not write %s: %s' % (self.path,e))
+            return False
+        self.writes+=1
+        return True
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_connect.py
+
+    Description: Opens the DLP-IO8-G DAQ in a background thread so the GUI
+                 never waits on a slow or missing USB device.  The port is
+                 probed first, every open attempt has a timeout and a
+                 failed attempt is retried a few times.  The GUI polls the
+                 phase and message of the connector to show the progress.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - Phases: 'probing' (looking for the port), 'opening' (open, initialize
+      and settings of the DAQ), 'waiting' (before the next attempt), then
+      'connected', 'failed' or 'cancelled'
+    - Only the configured device is opened.  Use its stable
+      /dev/serial/by-id path as the port, or give its USB serial number
+      (serial, port_serial in PyBrau_config.py) to find it under
+      /dev/serial/by-id wherever it enumerated.  Trying other ports of the
+      same kind (/dev/ttyUSB1 when /dev/ttyUSB0 is gone) is off unless
+      fallback is set, as it may open another system's DAQ or some other
+      USB-serial device.  Ports claimed by other brew systems are never
+      tried.  Ports that are not device paths ('sim' or a Windows COM port)
+      are not probed.
+    - The device is locked exclusively (flock, the lock pyserial takes with
+      exclusive=True) before it is opened and stays locked while it is
+      connected, a device another PyBrau process has open is skipped
+    - identity is the /dev/serial/by-id path of the opened device (the port
+      if it has none), a reopen after the device dropped out uses it so it
+      can only get the same device back
+    - An open that does not finish within timeout is abandoned.  The thread
+      doing it is left to finish on its own, if it still succeeds the device
+      is closed again so the next attempt can have the port.
+    - The DAQ is opened by factory(port), e.g. DLP, and set to binary/degF
+      (changeSettings("B","F")) before it is handed over
+
+    Calls:  DLP_IO8_G_py.py (through the factory passed in)
+    '''
+
+
+import os
+import glob
+import threading
+try:
+    import fcntl
+except ImportError: #Windows, ports are not locked
+    fcntl=None
+
+
+BY_ID='/dev/serial/by-id' #stable links to the USB serial devices, named after their USB serial number
+
+
+##Ports to try for the configured device
+def candidate_ports(port,serial=None,fallback=False,claimed=()):
+    #serial=USB serial number, the device is looked up under /dev/serial/by-id instead of using port
+    #fallback=also try the other ports of the same kind that are present
+    #claimed=ports of other brew systems, never tried
+    if not port.startswith('/'):
+        return [port]
+    if serial is not None:
+        ports=[link for link in sorted(glob.glob(BY_ID+'/*')) if serial in os.path.basename(link)]
+    else:
+        ports=[port] if os.path.exists(port) else []
+        if fallback:
+            prefix=port.rstrip('0123456789')
+            for other in sorted(glob.glob(prefix+'*')):
+                if other!=port:
+                    ports.append(other)
+    taken={os.path.realpath(other) for other in claimed if other.startswith('/')}
+    return [other for other in ports if os.path.realpath(other) not in taken]
+
+
+##Stable /dev/serial/by-id path of a serial port, None if it has none
+def device_id(port):
+    if port.startswith(BY_ID+'/'):
+        return port
+    real=os.path.realpath(port)
+    for link in sorted(glob.glob(BY_ID+'/*')):
+        if os.path.realpath(link)==real:
+            return link
+    return None
+
+
+class port_lock:
+    def __init__(self,port):
+        #Exclusive lock of a serial device, raises IOError if another process holds it
+        self.fd=None
+        if fcntl is None or not port.startswith('/'):
+            return
+        fd=os.open(port,os.O_RDWR|os.O_NOCTTY|os.O_NONBLOCK)
+        try:
+            fcntl.flock(fd,fcntl.LOCK_EX|fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise IOError('in use by another program')
+        self.fd=fd
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd=None
+
+
+class daq_connector(threading.Thread):
+    def __init__(self,port,factory,timeout=5.0,attempts=3,retry_dt=2.0,serial=None,fallback=False,claimed=()):
+        #factory=function(port) returning an unopened DAQ object
+        #timeout=sec, longest time one open attempt may take
+        #attempts=number of attempts before giving up
+        #retry_dt=sec, time between attempts
+        #serial,fallback,claimed=which ports are tried, see candidate_ports
+        threading.Thread.__init__(self,name='PyBrau connect')
+        self.daemon=True
+        self.port=port
+        self.factory=factory
+        self.timeout=timeout
+        self.attempts=attempts
+        self.retry_dt=retry_dt
+        self.serial=serial
+        self.fallback=fallback
+        self.claimed=claimed
+        self.phase='probing'
+        self.attempt=0
+        self.message='Looking for %s' % port
+        self.DAQ=None #the opened DAQ once the phase is 'connected'
+        self.LOCK=None #port_lock of the opened DAQ, released by whoever closes it
+        self.identity=port #device to ask for when the DAQ has to be reopened
+        self.cancel_event=threading.Event()
+
+    ##Stop trying, a DAQ that is already open is closed again
+    def cancel(self):
+        self.cancel_event.set()
+
+    ##Short text for the GUI
+    def status(self):
+        if self.phase in ('probing','opening','waiting'):
+            return '%s (%d/%d)' % (self.phase,self.attempt,self.attempts)
+        return self.phase
+
+    def run(self):
+        for self.attempt in range(1,self.attempts+1):
+            if self.cancel_event.is_set():
+                break
+            self.phase='probing'
+            ports=candidate_ports(self.port,self.serial,self.fallback,self.claimed)
+            if not ports:
+                self.message='%s not found' % (self.port if self.serial is None else 'serial number %s' % self.serial)
+            for port in ports:
+                self.phase='opening'
+                self.message='Opening %s' % port
+                DAQ,lock,error=self.open(port)
+                if DAQ is not None:
+                    if self.cancel_event.is_set():
+                        DAQ.disconnect()
+                        lock.release()
+                        break
+                    self.port=port
+                    self.identity=(device_id(port) or port) if port.startswith('/') else port
+                    self.DAQ=DAQ
+                    self.LOCK=lock
+                    self.message='Opened %s' % port
+                    self.phase='connected'
+                    return
+                self.message='%s: %s' % (port,error)
+            print('DAQ connect attempt %d/%d: %s' % (self.attempt,self.attempts,self.message))
+            if self.attempt<self.attempts and not self.cancel_event.is_set():
+                self.phase='waiting'
+                self.cancel_event.wait(self.retry_dt)
+        self.phase='cancelled' if self.cancel_event.is_set() else 'failed'
+
+    ##One open attempt with a timeout, returns (DAQ,port_lock,None) or (None,None,error)
+    def open(self,port):
+        result=[]
+        lock=threading.Lock() #the attempt either hands over the DAQ or, once abandoned, closes it
+        abandoned=[]
+        def open_daq():
+            try:
+                LOCK=port_lock(port)
+            except (IOError,OSError) as e:
+                result.append((None,None,str(e) or type(e).__name__))
+                return
+            try:
+                DAQ=self.factory(port)
+                if DAQ.initialize()!=0:
+                    LOCK.release()
+                    result.append((None,None,'open error'))
+                    return
+                #Make sure device is setup correctly by setting to binary and degF
+                DAQ.changeSettings("B","F")
+            except Exception as e:
+                LOCK.release()
+                result.append((None,None,str(e) or type(e).__name__))
+                return
+            with lock:
+                if abandoned:
+                    DAQ.disconnect()
+                    LOCK.release()
+                else:
+                    result.append((DAQ,LOCK,None))
+        worker=threading.Thread(target=open_daq,name='PyBrau open',daemon=True)
+        worker.start()
+        worker.join(self.timeout)
+        with lock:
+            abandoned.append(True)
+            if result:
+                return result[0]
+        return None,None,'no reply within %g s' % self.timeout
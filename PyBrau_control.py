@@ -0,0 +1,643 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_control.py
+
+    Description: Real time control worker for PyBrau.  The worker runs
+                 in its own thread and owns the DAQ, the PI controllers
+                 and the SSR timing so that the Tk event loop never
+                 waits on the serial link or on heater timing.  The GUI
+                 sends commands through a queue and reads back the
+                 latest state snapshot published by the worker.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - The state snapshot is an immutable namedtuple that the worker replaces
+      once per control period.  Replacing an attribute is atomic in Python so
+      the GUI can read it at any time without a lock.
+    - Commands are appended to a deque (append/popleft are thread safe) and
+      are applied by the worker at the start of every control period.
+    - All outputs are turned OFF when the worker is stopped.
+    - The temperature sensors are sampled on their own clock (sample_dt) in
+      between the SSR events, independent of the duty cycle period
+    - While a data logger is attached (command 'log') a log record is queued
+      every log_dt, on the sensor sample that passes the log deadline.  Log
+      times come from time.monotonic_ns() and count from the log start.
+      The worker owns the logger from the moment it is sent, nothing else
+      stops it.  It stops the logger when it is detached or replaced
+      (command 'log' with None or another logger) and when the worker ends,
+      after the last record for it was queued, the logger then writes out
+      what is queued and closes the file.
+    - All timing goes through a clock object (real_clock by default).  The
+      simulator passes a virtual clock so the loop can run faster than real
+      time.
+    - Timing probes (PyBrau_probes.py) around the DAQ read, thermistor
+      conversion, PI control, SSR output and data log stages are off until
+      PROBES.enable() is called, they can be switched at any time
+    - While a mash schedule is running (command 'schedule') it sets setMK and
+      setBK at the start of every period, setpoints sent by the GUI are
+      overridden
+    - When the mash and boil heaters ask for more than one period together the
+      heater budget is split by the predictive allocator (PyBrau_predict.py,
+      allocator='predictive') or by the original two weight rule
+      (allocator='weights').  setDC_MW/setDC_BW are the priorities/weights of
+      either one.  The allocator models the kettles with the heater power of
+      the layout and the process models of the tuned equipment profile
+      (tuned), the command 'models' replaces the process models after a new
+      tune.
+    - A relay auto-tune test (command 'autotune', PyBrau_tune.py) drives the
+      heater of its kettle instead of the PI controller until it is done, the
+      other heater only gets what is left of the period.  New gains are set
+      with the command 'gains'.
+    - DAQ I/O goes through a daq_supervisor (PyBrau_supervisor.py), a plain
+      daq_io is wrapped in one that never reopens the port.  A failed read
+      keeps the last temperatures, a failed write is repeated once the DAQ
+      is back.  When the DAQ has been gone for the blackout time the pump
+      and both heaters are switched OFF and stay OFF until they are turned
+      on again (failsafes counts how often).
+    - The command 'restore' sets the integrators of a session resumed after a
+      restart.  Sent before the worker is started, together with the switch
+      and setpoint commands, the first period already runs the resumed
+      session.
+    - While a telemetry publisher is attached (command 'telemetry',
+      PyBrau_telemetry.py) every temperature sample is published with the
+      fields of a log record and the SSR states last written to the DAQ
+    - The pins come from a system_layout (PyBrau_vessels.py), the default is
+      the standard DLP-IO8-G map.  Extra vessels of the layout are switched
+      with the command 'vessel' (name, ON, setpoint) and their heaters get
+      what the mash and boil heaters leave of the period.  One worker runs
+      one system on one DAQ, several systems run several workers.
+    - With a circuit limit in the layout the heaters are packed by their
+      power (layout_budget) and may overlap, the mash/boil split above is
+      only applied when the two heaters together are above the limit.  The
+      active duty cycles are those of the packed layout.
+    - After every period the heat-up estimators (PyBrau_eta.py) of the
+      kettles and vessels are fed the temperature and the achieved duty
+      cycle, and the energy meters the SSR on-time of every heater.  The
+      snapshot has the time to the setpoint (eta_M, eta_B, sec, None if
+      there is no estimate) and the energy (kWh_M, kWh_B, None without the
+      heater power).
+
+    Calls:  PyBrau_daqio.py (through the IO object passed in)
+            Thermistor_B57861S.py (through the THERM object passed in)
+            PyBrau_pwm.py
+            PyBrau_thermLUT.py
+            PyBrau_sensors.py
+            PyBrau_probes.py
+            PyBrau_schedule.py (through the schedule object passed in)
+            PyBrau_predict.py
+            PyBrau_tune.py (through the tuner object passed in)
+            PyBrau_supervisor.py
+            PyBrau_telemetry.py (through the publisher object passed in)
+            PyBrau_vessels.py
+            PyBrau_eta.py
+    '''
+
+
+import threading
+import collections
+import time
+import math
+from PyBrau_pwm import pwm_scheduler, layout_exclusive, layout_budget
+from PyBrau_thermLUT import therm_table
+from PyBrau_sensors import sensor_pipeline
+from PyBrau_predict import power_allocator, equipment_models
+from PyBrau_probes import timing_probes, PROBE_DAQ, PROBE_CONVERT, PROBE_PI, PROBE_SSR, PROBE_LOG
+from PyBrau_supervisor import daq_supervisor
+from PyBrau_vessels import system_layout
+from PyBrau_eta import heatup_estimator, energy_meter
+
+
+##Monotonic wall clock used by the control worker
+class real_clock:
+    def __init__(self):
+        self.time=time.monotonic
+        self.time_ns=time.monotonic_ns
+
+    ##Wait until time t, returns early if stop_event is set
+    def wait_until(self,t,stop_event):
+        dt=t-self.time()
+        if dt>0:
+            stop_event.wait(dt)
+
+
+##State snapshot published by the control worker
+control_state=collections.namedtuple('control_state',['tick','t','pump_ON','heatM_ON','heatB_ON','boilMA',
+                                                      'setMK','setBK','heatB_DC_man','setDC_MW','setDC_BW',
+                                                      'tempMK','tempMH','tempBK','heatM_DC','heatB_DC',
+                                                      'esum_M','esum_B','DCopt','heatM_DC_act','heatB_DC_act','pwm_jitter',
+                                                      'temps','sample_rate','io_errors',
+                                                      'io_state','io_retries','io_reconnects','io_failsafes',
+                                                      'sched_step','sched_phase','sched_left','tune_phase',
+                                                      'eta_M','eta_B','kWh_M','kWh_B','vessels'])
+
+
+class control_worker(threading.Thread):
+    def __init__(self,IO,THERM,DC_T=0.5,VREF=5.0,P_M=0.375,I_M=0.09375,P_B=0.375,I_B=0.09375,esum_max_M=5.0,esum_max_B=5.0,temp_filt_cutoff=3,layout=None,sample_dt=None,oversample=1,reject='median',clock=None,probes=None,allocator='predictive',tuned=None):
+        threading.Thread.__init__(self,name='PyBrau control')
+        self.daemon=True
+        self.IO=IO if isinstance(IO,daq_supervisor) else daq_supervisor(IO) #supervised batched DAQ I/O
+        self.failsafes=0 #times everything was switched OFF because the DAQ was gone
+        self.THERM=THERM
+
+        ##Pin map of the system
+        self.LAYOUT=system_layout() if layout is None else layout
+        pins=self.LAYOUT.pins
+        self.pin_pump=pins['pump']
+        self.pin_mash=pins['mash_heater']
+        self.pin_boil=pins['boil_heater']
+        self.ssr_pins=(self.pin_pump,self.pin_mash,self.pin_boil) #SSR states published with the telemetry
+        self.pair_exclusive=self.LAYOUT.exclusive() #mash and boil heaters may never be ON together
+
+        ##Control variables
+        self.DC_T=DC_T #Duty cycle period in seconds for heaters
+        self.P_M=P_M #Proportional gain - mash
+        self.I_M=I_M #Integral gain - mash
+        self.P_B=P_B #Proportional gain - boil
+        self.I_B=I_B #Integral gain - boil
+        self.esum_max_M=esum_max_M #Integrator clamp - mash
+        self.esum_max_B=esum_max_B #Integrator clamp - boil
+        self.VREF=VREF #Reference voltage used by thermistor
+        self.sample_dt=DC_T if sample_dt is None else sample_dt #Time between temperature samples in seconds
+        self.TEMP=therm_table(THERM,10000,self.VREF) #thermistor temperature for every ADC code
+        self.temp_filt_coef=(2*math.pi*(1/self.sample_dt)*temp_filt_cutoff)/(2*math.pi*(1/self.sample_dt)*temp_filt_cutoff+1) #First order low pass filter for temperature readings
+        self.esum_M=0 #error summation used by integrator - mash
+        self.esum_B=0 #error summation used by integrator - boil
+
+        ##Heater budget split when both heaters ask for more than one period together
+        if allocator=='predictive':
+            self.ALLOC=self.make_allocator(tuned)
+        elif allocator=='weights':
+            self.ALLOC=None
+        else:
+            raise ValueError('Unknown heater allocator: %s' % allocator)
+
+        ##Temperature sensors, the first three pins are the mash kettle, mash heater and boil kettle, then the extra vessels
+        self.SENSORS=sensor_pipeline(self.IO,self.TEMP,self.LAYOUT.sensor_pins,self.temp_filt_coef,oversample=oversample,reject=reject)
+
+        ##Extra vessels, each with the index of its temperature
+        self.VESSELS=self.LAYOUT.make_vessels()
+        self.vessel_names={v.name:v for v in self.VESSELS}
+        channel=3
+        for v in self.VESSELS:
+            if v.sensor is not None:
+                v.channel=channel
+                channel+=1
+        self.sensed_vessels=[v for v in self.VESSELS if v.sensor is not None]
+
+        ##Heat-up estimates and energy of every heater
+        self.ETA_M=heatup_estimator()
+        self.ETA_B=heatup_estimator()
+        self.METERS={pin:energy_meter(self.LAYOUT.watts.get(pin)) for pin in self.LAYOUT.heater_pins}
+        for v in self.VESSELS:
+            if v.heater is not None:
+                v.METER=self.METERS[v.heater]
+                if v.sensor is not None:
+                    v.ETA=heatup_estimator()
+        self.heated_vessels=[v for v in self.VESSELS if v.ETA is not None]
+
+        ##System variables, only changed through commands
+        self.pump_ON=0
+        self.heatM_ON=0
+        self.heatB_ON=0
+        self.boilMA=0
+        self.setMK=0
+        self.setBK=0
+        self.heatB_DC_man=0
+        self.setDC_MW=0.5
+        self.setDC_BW=0.5
+
+        ##Outputs of the control loop
+        self.tempMK=0
+        self.tempMH=0
+        self.tempBK=0
+        self.heatM_DC=0
+        self.heatB_DC=0
+        self.DCopt=0
+        self.tick=0
+
+        ##SSR timing
+        self.CLOCK=real_clock() if clock is None else clock
+        self.clock=self.CLOCK.time
+        #With a circuit limit the planned intervals are the power ceiling, a late ON is not made up for
+        self.PWM=pwm_scheduler(self.LAYOUT.heater_pins,self.DC_T,self.clock,compensate=self.LAYOUT.limit is None)
+
+        self.t_sample=0 #time of the next temperature sample
+
+        ##Stage timing, shared with the GUI if it passes one in
+        self.PROBES=timing_probes() if probes is None else probes
+
+        ##Data log
+        self.clock_ns=self.CLOCK.time_ns
+        self.LOG=None #data logger, records are queued while it is set
+        self.log_dt=1 #sec, time between log records
+        self.t_log=0 #time of the next log record
+        self.t_log_start=0 #ns, log start time
+        self.TELEM=None #telemetry publisher, every sample is published while it is set
+        ##Mash schedule, drives the setpoints while it is set
+        self.SCHED=None
+
+        ##Relay auto-tune test, drives the heater of its kettle while it runs
+        self.TUNE=None
+
+        self.commands=collections.deque()
+        self.stop_event=threading.Event()
+        self.publish()
+
+
+    #################### INTERFACE FOR THE GUI ####################
+    ##Queue a command for the worker, e.g. send('pump',1)
+    def send(self,cmd,*args):
+        self.commands.append((cmd,args))
+
+    ##Stop the worker and wait for it to turn all outputs OFF
+    def stop(self,timeout=2.0):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    ##Predictive allocator for the heaters of the layout, tuned={'mash':result,'boil':result} process models of the kettles
+    def make_allocator(self,tuned):
+        watts={'mash':self.LAYOUT.watts.get(self.pin_mash),'boil':self.LAYOUT.watts.get(self.pin_boil)}
+        mash,boil=equipment_models(self.DC_T,watts,tuned)
+        return power_allocator(self.DC_T,mash=mash,boil=boil)
+
+    ##Replace the state snapshot
+    def publish(self):
+        if self.SCHED is not None:
+            sched=(self.SCHED.step,self.SCHED.phase,self.SCHED.remaining(self.clock()))
+        else:
+            sched=(-1,'idle',None)
+        self.state=control_state(self.tick,time.time(),self.pump_ON,self.heatM_ON,self.heatB_ON,self.boilMA,
+                                 self.setMK,self.setBK,self.heatB_DC_man,self.setDC_MW,self.setDC_BW,
+                                 self.tempMK,self.tempMH,self.tempBK,self.heatM_DC,self.heatB_DC,
+                                 self.esum_M,self.esum_B,self.DCopt,
+                                 self.PWM.duty[self.pin_mash]*100,self.PWM.duty[self.pin_boil]*100,self.PWM.jitter,
+                                 tuple(self.SENSORS.value),self.SENSORS.rate,self.IO.errors,
+                                 self.IO.state,self.IO.retries,self.IO.reconnects,self.failsafes,*sched,
+                                 self.TUNE.phase if self.TUNE is not None else 'idle',
+                                 self.ETA_M.eta(self.tempMK,self.setMK,self.heatM_ON==1),self.ETA_B.eta(self.tempBK,self.setBK,self.heatB_ON==1),
+                                 self.METERS[self.pin_mash].kWh,self.METERS[self.pin_boil].kWh,
+                                 tuple(v.state() for v in self.VESSELS))
+
+
+    #################### COMMANDS ####################
+    def process_commands(self):
+        while self.commands:
+            cmd,args=self.commands.popleft()
+            if cmd=='pump':
+                self.pump_ON=args[0]
+                self.IO.write_pins({self.pin_pump:self.pump_ON})
+                #Mash heater cannot be ON without the pump
+                if self.pump_ON==0:
+                    self.heatM_ON=0
+                    self.esum_M=0
+            elif cmd=='mash':
+                if args[0]==1 and self.pump_ON==1:
+                    self.heatM_ON=1
+                else:
+                    self.heatM_ON=0
+                    self.esum_M=0
+            elif cmd=='boil':
+                self.heatB_ON=args[0]
+                if self.heatB_ON==0:
+                    self.esum_B=0
+            elif cmd=='boil_type':
+                self.boilMA=args[0]
+                self.esum_B=0
+            elif cmd=='setpoints':
+                self.setMK,self.setBK,self.heatB_DC_man,self.setDC_MW,self.setDC_BW=args
+            elif cmd=='schedule':
+                #Start a mash schedule, None stops it and leaves the setpoints where they are
+                self.SCHED=args[0]
+                if self.SCHED is not None:
+                    self.SCHED.start(self.clock(),self.tempMK,self.setBK)
+            elif cmd=='schedule_skip':
+                if self.SCHED is not None:
+                    self.SCHED.skip(self.clock(),self.tempMK)
+            elif cmd=='autotune':
+                #Start a relay test, None aborts it
+                self.TUNE=args[0]
+                self.esum_M=0
+                self.esum_B=0
+            elif cmd=='gains':
+                kettle,P,I,esum_max=args
+                if kettle=='mash':
+                    self.P_M,self.I_M,self.esum_max_M=P,I,esum_max
+                    self.esum_M=0
+                else:
+                    self.P_B,self.I_B,self.esum_max_B=P,I,esum_max
+                    self.esum_B=0
+            elif cmd=='models':
+                #Process models of a new tune, {'mash':result,'boil':result}
+                if self.ALLOC is not None:
+                    self.ALLOC=self.make_allocator(args[0])
+            elif cmd=='restore':
+                #Integrators of a resumed session
+                esum_M,esum_B=args
+                self.esum_M=max(-self.esum_max_M,min(self.esum_max_M,esum_M))
+                self.esum_B=max(-self.esum_max_B,min(self.esum_max_B,esum_B))
+            elif cmd=='log':
+                #The logger that is detached or replaced is stopped here, after the last record it gets was queued
+                LOG,self.log_dt=args
+                if self.LOG is not None and self.LOG is not LOG:
+                    self.LOG.stop()
+                self.LOG=LOG
+                self.t_log=self.clock()
+                self.t_log_start=self.clock_ns()
+            elif cmd=='telemetry':
+                self.TELEM=args[0]
+            elif cmd=='vessel':
+                name,ON,setpoint=args
+                v=self.vessel_names.get(name)
+                if v is None:
+                    print('Unknown vessel: %s' % name)
+                    continue
+                v.ON=ON
+                v.setpoint=setpoint
+                if ON==0:
+                    v.esum=0
+                if v.pump is not None:
+                    self.IO.write_pins({v.pump:ON})
+            else:
+                print('Unknown control command: %s' % cmd)
+
+
+    #################### MAIN LOOP ####################
+    def run(self):
+        try:
+            self.process_commands()
+            self.read_temps() #Read all temp sensors
+            layout=self.heater_control() #Calculate heater on-times
+            t0=self.clock()
+            #Sample in the middle of the period so the sensor reads stay clear of the period start events
+            self.t_sample=t0+self.sample_dt/2
+            while not self.stop_event.is_set():
+                ##Fire the SSR events of this period and sample the sensors in between
+                self.PWM.plan(t0,layout)
+                t_end=t0+self.DC_T
+                while not self.stop_event.is_set():
+                    deadline=self.PWM.next_deadline()
+                    if deadline is None:
+                        deadline=t_end
+                    self.wait_until(min(deadline,self.t_sample,t_end))
+                    if self.stop_event.is_set():
+                        break
+                    if self.PWM.next_deadline() is not None and self.clock()>=self.PWM.next_deadline():
+                        t=self.PROBES.start()
+                        self.PWM.fire_due(self.write_outputs)
+                        self.PROBES.stop(PROBE_SSR,t)
+                    if self.clock()>=self.t_sample:
+                        self.read_temps()
+                    if self.PWM.next_deadline() is None and self.clock()>=t_end:
+                        break
+                if self.stop_event.is_set():
+                    break
+                self.PWM.end_period()
+                self.account()
+
+                ##Next period
+                self.process_commands()
+                if self.IO.blackout:
+                    self.failsafe()
+                t=self.PROBES.start()
+                layout=self.heater_control()
+                self.PROBES.stop(PROBE_PI,t)
+                t0=t_end
+                #Start over from now if the loop fell more than a period behind
+                if self.clock()-t0>self.DC_T:
+                    t0=self.clock()
+                self.tick+=1
+                self.publish()
+        finally:
+            ##SET ALL OUPUTS TO OFF!!
+            self.IO.write_pins(self.LAYOUT.all_off(),force=True)
+            self.pump_ON=0
+            self.heatM_ON=0
+            self.heatB_ON=0
+            for v in self.VESSELS:
+                v.ON=0
+            self.publish()
+            if self.LOG is not None:
+                self.LOG.stop()
+                self.LOG=None
+            #Loggers sent but never attached are the worker's too
+            while self.commands:
+                cmd,args=self.commands.popleft()
+                if cmd=='log' and args[0] is not None:
+                    args[0].stop()
+
+    ##Feed the period that just ended to the heat-up estimators and energy meters
+    def account(self):
+        now=self.clock()
+        dt=self.PWM.period
+        duty=self.PWM.duty
+        for pin,meter in self.METERS.items():
+            meter.update(dt,duty[pin])
+        self.ETA_M.update(now,dt,self.tempMK,duty[self.pin_mash])
+        self.ETA_B.update(now,dt,self.tempBK,duty[self.pin_boil])
+        for v in self.heated_vessels:
+            v.ETA.update(now,dt,v.temp,duty[v.heater])
+
+    ##Switch everything OFF while the DAQ is gone, the outputs are written as soon as it is back
+    def failsafe(self):
+        if self.pump_ON==0 and self.heatM_ON==0 and self.heatB_ON==0 and not any(v.ON for v in self.VESSELS):
+            return
+        print('DAQ gone for %.0f s, switching the pump and heaters OFF' % self.IO.blackout_dt)
+        self.pump_ON=0
+        self.heatM_ON=0
+        self.heatB_ON=0
+        self.esum_M=0
+        self.esum_B=0
+        self.TUNE=None
+        for v in self.VESSELS:
+            v.ON=0
+            v.esum=0
+        self.failsafes+=1
+        self.IO.write_pins(self.LAYOUT.all_off(),force=True)
+
+    ##Wait until a time on the worker clock, returns early if the worker is being stopped
+    def wait_until(self,t):
+        self.CLOCK.wait_until(t,self.stop_event)
+
+    ##Set the SSR outputs, states={pin:0/1}
+    def write_outputs(self,states):
+        self.IO.write_pins(states)
+
+
+################################################ CONTROL/FLOW FUNCTIONS ###############################################
+    ##PI control to determine duty cycle for both mash and boil controls
+    def PI_ctrl(self,SP,PV,kp,ki,esum,esum_max=5.0):
+        #SP=setpoint
+        #PV=process variable
+        #kp=proportional gain
+        #ki=integral gain
+        #esum=error sum
+        #esum_max=integrator clamp
+
+        ##Calculate duty cycle for heater
+        error=SP-PV
+        esum=esum+(error*self.DC_T)
+        #Limit the integrator to prevent windup
+        if esum>esum_max:
+            esum=esum_max
+        elif esum<-esum_max:
+            esum=-esum_max
+        P=kp*error
+        I=ki*esum
+        u=P+I
+        #Limit output to between 0 and 1
+        if u>1.0:
+            u=1.0
+        elif u<0.0:
+            u=0.0
+        u=u*100 #Bring the duty cycle back to a value between 0 and 100.  This is only done for the dispaly and logging purpose.  The PID gains were orignially used with a 0 to 1 output so the that part of the algorithm will not be changed and just the final duty cycle brough up by two orders of magnitude.
+        return u,esum
+
+    ##Function to read all thermistors
+    def read_temps(self):
+        #Read all channels in one DAQ transaction, then convert and filter them in one go
+        now=self.clock()
+        t=self.PROBES.start()
+        codes=self.IO.read_codes(self.SENSORS.burst)
+        self.PROBES.stop(PROBE_DAQ,t)
+        if codes is not None: #no reply keeps the last temperatures
+            t=self.PROBES.start()
+            temps=self.SENSORS.add_codes(now,codes)
+            self.PROBES.stop(PROBE_CONVERT,t)
+            self.tempMK,self.tempMH,self.tempBK=temps[0],temps[1],temps[2]
+            for v in self.sensed_vessels:
+                v.temp=temps[v.channel]
+        #Schedule the next sample, skip the missed ones if the loop fell behind
+        self.t_sample=self.t_sample+self.sample_dt
+        if self.t_sample<=now:
+            self.t_sample=now+self.sample_dt
+        #Log on its own clock
+        if self.LOG is not None and now>=self.t_log:
+            t=self.PROBES.start()
+            self.write_log()
+            self.PROBES.stop(PROBE_LOG,t)
+            self.t_log=self.t_log+self.log_dt
+            if self.t_log<=now:
+                self.t_log=now+self.log_dt
+        if self.TELEM is not None:
+            outputs=self.IO.outputs
+            self.TELEM.publish(self.log_record(time.time()),[outputs.get(pin,0) for pin in self.ssr_pins])
+
+    ##Queue a data log record
+    def write_log(self):
+        self.LOG.log(self.log_record((self.clock_ns()-self.t_log_start)*1e-9))
+
+    ##Fields of a data log record at time tsamp
+    def log_record(self,tsamp):
+        return (tsamp,self.pump_ON,self.heatM_ON,self.heatB_ON,self.tempMK,self.tempBK,self.tempMH,self.boilMA,self.setMK,self.setBK,self.heatB_DC_man,self.heatB_DC,self.heatM_DC,self.esum_M,self.esum_B,self.DCopt)
+
+    ##Function to calculate the heater duty cycles and on-times for the next period
+    def heater_control(self):
+        ##Setpoints from the mash schedule
+        if self.SCHED is not None:
+            self.setMK,self.setBK=self.SCHED.update(self.clock(),self.tempMK)
+
+        ##Relay auto-tune test, dropped once it is finished
+        tune=None
+        if self.TUNE is not None:
+            if self.TUNE.phase in ('done','failed'):
+                self.TUNE=None
+            else:
+                tune=self.TUNE.kettle
+
+        ##Calculate raw duty cycles for mash and boil heater
+        #Mash
+        if self.heatM_ON==1:
+            if tune=='mash':
+                u_M=self.TUNE.update(self.clock(),self.tempMK)
+            else:
+                temp_heatM_DC,self.esum_M=self.PI_ctrl(self.setMK,self.tempMK,self.P_M,self.I_M,self.esum_M,self.esum_max_M) #PI control to determine duty cycle
+                u_M=temp_heatM_DC/100
+        else:
+            u_M=0
+
+        #Boil
+        if self.heatB_ON==1:
+            if tune=='boil':
+                u_B=self.TUNE.update(self.clock(),self.tempBK)
+            elif self.boilMA==1:
+                temp_heatB_DC,self.esum_B=self.PI_ctrl(self.setBK,self.tempBK,self.P_B,self.I_B,self.esum_B,self.esum_max_B) #PI control to determine duty cycle
+                u_B=temp_heatB_DC/100
+            elif self.boilMA==0:
+                u_B=self.heatB_DC_man/100
+        else:
+            u_B=0
+
+        ##Apply duty cycle optimization algorithm, if needed
+        #
+        #Algorithm is based on the cost function:
+        #    cost=wB*[uB-uB_O]^2+wM*[uM-uM_O]^2
+        #where  wB=weight applied to boil duty cycle input
+        #       wM=weight applied to mash duty cycle input
+        #       uB=raw boil duty cycle
+        #       uM=raw mash duty cycle
+        #       uB_O=optimized boil duty cycle
+        #       uM_O=optimized mash duty cycle
+        #
+        #Constraints are:
+        #    wB+wM=1
+        #    uB_O+uM_O=1
+        #
+        #The predictive allocator replaces it with a split of the budget over the next few minutes,
+        #based on a thermal model of both kettles and with the weights as priorities
+        #
+        if not self.pair_exclusive:
+            #Both heaters fit in the circuit together, the period is not split
+            self.DCopt=0
+        elif tune=='mash' and (u_B+u_M)>1:
+            #The relay test keeps its duty cycle
+            self.DCopt=1
+            u_B=1-u_M
+        elif tune=='boil' and (u_B+u_M)>1:
+            self.DCopt=1
+            u_M=1-u_B
+        elif (u_B+u_M)>1:
+            self.DCopt=1
+            if self.ALLOC is not None:
+                setBK=self.setBK if (self.heatB_ON==1 and self.boilMA==1) else None #a manual boil keeps to its duty cycle
+                u_M,u_B=self.ALLOC.allocate((self.tempMH,self.tempMK),self.setMK,(self.tempBK,),setBK,u_M,u_B,self.setDC_MW,self.setDC_BW)
+            else:
+                u_B=self.setDC_MW*(1-u_M)+self.setDC_BW*u_B
+                u_M=1-u_B
+        else:
+            self.DCopt=0
+
+        ##Record actual duty cycle for display
+        self.heatB_DC=u_B*100
+        self.heatM_DC=u_M*100
+
+        duties=[(self.pin_mash,u_M),(self.pin_boil,u_B)]
+        if self.LAYOUT.limit is None:
+            ##Extra vessel heaters get what is left of the period, in the order they are listed
+            left=1-u_M-u_B
+            for v in self.VESSELS:
+                u=min(v.control(self.DC_T),max(left,0.0))
+                v.DC=u*100
+                left-=u
+                if v.heater is not None:
+                    duties.append((v.heater,u))
+
+            ##Lay out the heater on-times within the period, mash first then boil, then the extra vessels
+            return layout_exclusive(duties,self.DC_T)
+
+        ##Pack the heater on-times within the circuit limit, mash first then boil, then the extra vessels
+        for v in self.VESSELS:
+            u=v.control(self.DC_T)
+            if v.heater is not None:
+                duties.append((v.heater,u))
+        layout=layout_budget(duties,self.LAYOUT.watts,self.LAYOUT.limit,self.DC_T)
+        DC=lambda pin:(layout[pin][1]-layout[pin][0])/self.DC_T*100 if pin in layout else 0.0
+        self.heatM_DC=DC(self.pin_mash)
+        self.heatB_DC=DC(self.pin_boil)
+        for v in self.VESSELS:
+            v.DC=DC(v.heater) if v.heater is not None else 0.0
+        return layout
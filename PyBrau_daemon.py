@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_daemon.py
+
+    Description: Headless PyBrau control service.  Runs the control worker,
+                 the data logger, the mash schedule and the session
+                 checkpoints without Tk, and serves the state and the
+                 commands over a small HTTP API on localhost.  The Tk GUI
+                 (PyBrau.py with the DAQ location set to the daemon URL)
+                 and any other local program are clients, closing them
+                 or an X crash leaves the heaters under control.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    HTTP API (127.0.0.1 only, JSON):
+        GET  /state    latest state snapshot of the control worker, plus
+                       'connected', 'log_ON' and 'sched_name'
+        GET  /stream   one state snapshot per line (newline delimited JSON) every
+                       control period, for as long as the client reads
+        POST /command  {"cmd":"pump","args":[1]} with Content-Type
+                       application/json, replies {"ok":true} or
+                       {"ok":false,"error":"..."} with status 400
+        GET  /systems  names of the brew systems
+    The paths above are those of the main system, the systems listed in the
+    configuration (PyBrau_vessels.py) have the same ones under
+    /systems/<name>, e.g. GET /systems/second/state.
+    Commands:
+        pump, mash, boil, boil_type   [0/1]
+        setpoints                     [setMK,setBK,heatB_DC_man,setDC_MW,setDC_BW]
+        schedule                      [recipe file path] or [null] to stop, the
+                                      recipe must be in recipe_dir
+        schedule_skip                 []
+        gains                         ['mash'/'boil',P,I,esum_max]
+        logging                       [0/1] data log on the daemon host
+        vessel                        [name,0/1,setpoint] extra vessel
+
+    Usage:
+        python3 PyBrau_daemon.py                     #DAQ port and settings from PyBrau_config.json
+        python3 PyBrau_daemon.py --port sim          #simulated DAQ and brew system
+        curl http://127.0.0.1:8420/state
+        curl -H 'Content-Type: application/json' -d '{"cmd":"pump","args":[1]}' http://127.0.0.1:8420/command
+        PyBrau.py DAQ location http://127.0.0.1:8420/systems/second for another system
+
+    Notes:
+    - The session is checkpointed to PyBrau_daemon_state.json (separate from
+      the GUI's own file) and resumed when the daemon is started again after
+      an unclean exit, the same way as the GUI does it
+    - If the control worker thread ends on an error the outputs are OFF
+      (the worker turns them OFF when it ends); the daemon opens the DAQ
+      again and resumes the last checkpoint
+    - The API has no authentication, it only listens on localhost.  So that
+      a web page open in a browser on the same host cannot use it, requests
+      with an Origin header or with a Host other than 127.0.0.1:<port> or
+      localhost:<port> (DNS rebinding) are refused with 403, and commands
+      must be sent as application/json (415 otherwise), which a page cannot
+      send to another origin without the Origin header.
+    - Recipes are only read from recipe_dir (PyBrau_config.py), a relative
+      path is taken relative to it
+    - Every brew system has its own DAQ, control worker, data log and
+      checkpoint file (PyBrau_daemon_state_<name>.json for all but the main
+      one), the DAQs are served concurrently by their own workers
+
+    Calls:  PyBrau_control.py
+            PyBrau_config.py
+            PyBrau_connect.py
+            PyBrau_supervisor.py
+            PyBrau_daqio.py
+            PyBrau_logger.py
+            PyBrau_schedule.py
+            PyBrau_telemetry.py
+            PyBrau_tune.py (tuned process models)
+            PyBrau_vessels.py
+            DLP_IO8_G_py.py
+            Thermistor_B57861S.py
+    '''
+
+
+import os
+import json
+import time
+import threading
+import argparse
+import signal
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from PyBrau_control import control_worker
+from PyBrau_config import load_config, state_store
+from PyBrau_connect import daq_connector
+from PyBrau_supervisor import daq_supervisor
+from PyBrau_daqio import daq_io
+from PyBrau_logger import data_logger
+from PyBrau_schedule import read_schedule
+from PyBrau_telemetry import start_publisher
+from PyBrau_tune import profile_models
+from PyBrau_vessels import config_layout, system_configs, claimed_ports
+
+
+DAEMON_STATE_PATH='PyBrau_daemon_state.json'
+
+##Commands accepted by the API and their argument check
+def switch_args(args):
+    if len(args)!=1 or args[0] not in (0,1):
+        raise ValueError('expected [0] or [1]')
+    return (int(args[0]),)
+
+def setpoint_args(args):
+    if len(args)!=5:
+        raise ValueError('expected [setMK,setBK,heatB_DC_man,setDC_MW,setDC_BW]')
+    return tuple(float(a) for a in args)
+
+def gain_args(args):
+    if len(args)!=4 or args[0] not in ('mash','boil'):
+        raise ValueError('expected ["mash" or "boil",P,I,esum_max]')
+    return (args[0],)+tuple(float(a) for a in args[1:])
+
+def schedule_args(args):
+    if len(args)!=1 or not (args[0] is None or isinstance(args[0],str)):
+        raise ValueError('expected [recipe path] or [null]')
+    return tuple(args)
+
+##Full path of a recipe, which has to be in recipe_dir
+def recipe_path(recipe_dir,path):
+    recipe_dir=os.path.realpath(recipe_dir)
+    full=os.path.realpath(os.path.join(recipe_dir,path))
+    if os.path.commonpath((recipe_dir,full))!=recipe_dir:
+        raise ValueError('recipes are only read from %s' % recipe_dir)
+    return full
+
+def vessel_args(args):
+    if len(args)!=3 or not isinstance(args[0],str) or args[1] not in (0,1):
+        raise ValueError('expected [name,0 or 1,setpoint]')
+    return (args[0],int(args[1]),float(args[2]))
+
+def no_args(args):
+    if args:
+        raise ValueError('expected []')
+    return ()
+
+COMMANDS={'pump':switch_args,'mash':switch_args,'boil':switch_args,'boil_type':switch_args,
+          'setpoints':setpoint_args,'schedule':schedule_args,'schedule_skip':no_args,
+          'gains':gain_args,'logging':switch_args,'vessel':vessel_args}
+
+
+class brew_daemon:
+    def __init__(self,config,port=None,name='main',claimed=()):
+        #claimed=DAQ ports of the other brew systems, never opened by this one
+        from Thermistor_B57861S import thermistor
+        self.config=config
+        self.name=name
+        self.port=config['port'] if port is None else port
+        self.claimed=claimed
+        self.LAYOUT=config_layout(config) #DAQ pin map
+        self.vessels={spec['name'] for spec in self.LAYOUT.vessels}
+        self.THERM=thermistor()
+        self.CTRL=None #control worker while the DAQ is open
+        self.LOG=None #data logger while logging
+        self.SCHED=None #running mash schedule
+        self.lock=threading.Lock() #commands come from several HTTP threads
+        path=DAEMON_STATE_PATH if name=='main' else DAEMON_STATE_PATH.replace('.json','_%s.json' % name)
+        self.STORE=state_store(path,config['checkpoint_dt'],config['resume_max_age'])
+        self.SESSION=self.STORE.load()
+        if not self.STORE.resumable(self.SESSION):
+            self.SESSION=None
+        self.TELEM=start_publisher(config['telemetry_port']) #telemetry stream, None if off
+        self.stop_event=threading.Event()
+
+    #################### DAQ AND CONTROL WORKER ####################
+    ##Open the DAQ (with the retries of daq_connector) and start a control worker, True if it runs
+    def connect(self):
+        config=self.config
+        if self.port=='sim':
+            from PyBrau_sim import sim_DLP
+            factory=lambda port: sim_DLP(self.THERM,pins=self.LAYOUT.pins)
+        else:
+            from DLP_IO8_G_py import DLP
+            factory=DLP
+        serial=config['port_serial'] if self.port==config['port'] else None
+        CONNECT=daq_connector(self.port,factory,config['connect_timeout'],config['connect_attempts'],config['connect_retry_dt'],serial,config['port_fallback'],self.claimed)
+        CONNECT.start()
+        while CONNECT.is_alive() and not self.stop_event.is_set():
+            CONNECT.join(0.5)
+        if CONNECT.phase!='connected':
+            CONNECT.cancel()
+            return False
+        print('%s: device opened on %s' % (self.name,CONNECT.port))
+        IO=daq_supervisor(daq_io(CONNECT.DAQ),CONNECT.identity,factory,blackout=config['io_blackout'],backoff_max=config['io_backoff_max'],timeout=config['connect_timeout'],lock=CONNECT.LOCK)
+        IO.write_pins(self.LAYOUT.all_off(),force=True)
+        sample_dt=config['DC_T'] if config['sample_dt'] is None else config['sample_dt']
+        self.CTRL=control_worker(IO,self.THERM,DC_T=config['DC_T'],VREF=config['VREF'],P_M=config['P_M'],I_M=config['I_M'],P_B=config['P_B'],I_B=config['I_B'],
+                                 esum_max_M=config['esum_max_M'],esum_max_B=config['esum_max_B'],temp_filt_cutoff=config['temp_filt_cutoff'],layout=self.LAYOUT,
+                                 sample_dt=sample_dt,oversample=config['oversample'],reject=config['reject'],allocator=config['allocator'],tuned=profile_models(config['profile']))
+        self.restore()
+        self.CTRL.send('telemetry',self.TELEM)
+        self.CTRL.start()
+        return True
+
+    ##Queue the last checkpoint before the worker starts, so its first period runs it
+    def restore(self):
+        S=self.SESSION
+        self.SESSION=None
+        if S is None:
+            return
+        print('Resuming the session of %s' % time.strftime("%Y-%m-%d %H:%M:%S",time.localtime(S['time'])))
+        self.CTRL.send('setpoints',S['setMK'],S['setBK'],S['heatB_DC_man'],S['setDC_MW'],S['setDC_BW'])
+        for cmd in ('pump','mash','boil','boil_type'):
+            self.CTRL.send(cmd,S[cmd])
+        self.CTRL.send('restore',S['esum_M'],S['esum_B'])
+        if S['log_ON']:
+            self.logging(1)
+
+    ##Session checkpoint from the worker snapshot
+    def checkpoint(self,clean=False):
+        state=self.CTRL.state
+        session={'clean':clean,'port':self.port,
+                 'pump':state.pump_ON,'mash':state.heatM_ON,'boil':state.heatB_ON,'boil_type':state.boilMA,'log_ON':int(self.LOG is not None),
+                 'setMK':state.setMK,'setBK':state.setBK,'heatB_DC_man':state.heatB_DC_man,'setDC_MW':state.setDC_MW,'setDC_BW':state.setDC_BW,
+                 'esum_M':state.esum_M,'esum_B':state.esum_B}
+        self.STORE.checkpoint(session,force=clean)
+
+    ##Keep the control worker running until the daemon is stopped
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                if self.CTRL is None:
+                    if not self.connect():
+                        self.stop_event.wait(self.config['connect_retry_dt'])
+                    continue
+                if not self.CTRL.is_alive():
+                    #The worker ended on an error, its outputs are OFF; open the DAQ again and resume the last checkpoint
+                    print('Control worker stopped, reconnecting')
+                    self.SESSION=self.STORE.last and dict(self.STORE.last,time=time.time())
+                    self.disconnect()
+                    continue
+                self.checkpoint()
+                self.stop_event.wait(0.5)
+        finally:
+            ##SET ALL OUPUTS TO OFF!! (the worker does it when it stops)
+            self.stop_event.set()
+            if self.CTRL is not None:
+                self.CTRL.stop()
+                self.checkpoint(clean=True)
+                self.disconnect()
+            self.logging(0)
+            if self.TELEM is not None:
+                self.TELEM.close()
+
+    def disconnect(self):
+        try:
+            self.CTRL.IO.disconnect()
+        except Exception as e:
+            print('Could not close device: %s' % e)
+        self.CTRL=None
+        self.LOG=None #stopped by the worker when it ended, the resumed session starts a new one
+
+    def stop(self):
+        self.stop_event.set()
+
+    #################### COMMANDS ####################
+    def command(self,cmd,args):
+        if cmd not in COMMANDS:
+            raise ValueError('unknown command: %s' % cmd)
+        args=COMMANDS[cmd](args)
+        with self.lock:
+            if self.CTRL is None:
+                raise ValueError('DAQ not connected')
+            if cmd=='vessel' and args[0] not in self.vessels:
+                raise ValueError('unknown vessel: %s' % args[0])
+            if cmd=='schedule':
+                self.SCHED=read_schedule(recipe_path(self.config['recipe_dir'],args[0]),self.CTRL.DC_T) if args[0] is not None else None
+                self.CTRL.send('schedule',self.SCHED)
+            elif cmd=='logging':
+                self.logging(args[0])
+            else:
+                self.CTRL.send(cmd,*args)
+
+    ##Start or stop the data log on the daemon host
+    def logging(self,on):
+        if on and self.LOG is None and self.CTRL is not None:
+            timestr=time.strftime("%Y-%m-%d--%H-%M")
+            prefix='PyBrau_Log_' if self.name=='main' else 'PyBrau_Log_%s_' % self.name
+            self.LOG=data_logger(prefix+timestr+'.bin',timestr,decimate=self.config['log_decimate'])
+            self.LOG.start()
+            self.CTRL.send('log',self.LOG,self.config['log_dt'])
+        elif not on and self.LOG is not None:
+            #The worker owns the logger, it stops it once it is detached (or when the worker ends) so no record is lost
+            if self.CTRL is not None:
+                self.CTRL.send('log',None,self.config['log_dt'])
+            self.LOG=None
+
+    ##State snapshot as a JSON object
+    def state(self):
+        CTRL=self.CTRL
+        state=CTRL.state._asdict() if CTRL is not None else {}
+        state['connected']=CTRL is not None
+        state['log_ON']=int(self.LOG is not None)
+        state['sched_name']=self.SCHED.name if self.SCHED is not None else None
+        return state
+
+
+#################### HTTP API ####################
+class api_handler(BaseHTTPRequestHandler):
+    protocol_version='HTTP/1.1'
+    daemons=None #{name:brew_daemon}, set by serve()
+    port=None #listening port, set by serve()
+
+    def log_message(self,fmt,*args):
+        pass
+
+    def reply(self,status,data):
+        body=json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type','application/json')
+        self.send_header('Content-Length',str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    ##False (after replying 403) for a request that may come from a web page
+    def local_request(self):
+        if self.headers.get('Origin') is not None or self.headers.get('Host') not in ('127.0.0.1:%d' % self.port,'localhost:%d' % self.port):
+            self.close_connection=True #the body, if any, is not read
+            self.reply(403,{'ok':False,'error':'forbidden'})
+            return False
+        return True
+
+    ##Brew system and endpoint of the request path, (None,path) for an unknown system
+    def route(self):
+        parts=self.path.split('/')
+        if len(parts)==4 and parts[1]=='systems':
+            return self.daemons.get(parts[2]),'/'+parts[3]
+        return self.daemons['main'],self.path
+
+    def do_GET(self):
+        if not self.local_request():
+            return
+        if self.path=='/systems':
+            self.reply(200,list(self.daemons))
+            return
+        daemon,path=self.route()
+        if daemon is None:
+            self.reply(404,{'ok':False,'error':'unknown system'})
+        elif path=='/state':
+            self.reply(200,daemon.state())
+        elif path=='/stream':
+            self.stream(daemon)
+        else:
+            self.reply(404,{'ok':False,'error':'not found'})
+
+    def do_POST(self):
+        if not self.local_request():
+            return
+        daemon,path=self.route()
+        if daemon is None or path!='/command':
+            self.reply(404,{'ok':False,'error':'not found'})
+            return
+        if self.headers.get('Content-Type','').split(';')[0].strip().lower()!='application/json':
+            self.close_connection=True
+            self.reply(415,{'ok':False,'error':'expected application/json'})
+            return
+        try:
+            request=json.loads(self.rfile.read(int(self.headers.get('Content-Length',0))))
+            daemon.command(request['cmd'],request.get('args',[]))
+        except (ValueError,KeyError,TypeError,IOError) as e:
+            self.reply(400,{'ok':False,'error':str(e)})
+            return
+        self.reply(200,{'ok':True})
+
+    ##One snapshot per control period until the client goes away
+    def stream(self,daemon):
+        self.send_response(200)
+        self.send_header('Content-Type','application/x-ndjson')
+        self.send_header('Cache-Control','no-cache')
+        self.send_header('Connection','close')
+        self.end_headers()
+        self.close_connection=True
+        tick=None
+        dt=daemon.config['DC_T']/5
+        try:
+            while not daemon.stop_event.is_set():
+                CTRL=daemon.CTRL
+                if CTRL is not None and CTRL.state.tick!=tick:
+                    tick=CTRL.state.tick
+                    self.wfile.write((json.dumps(daemon.state())+'\n').encode())
+                    self.wfile.flush()
+                daemon.stop_event.wait(dt)
+        except (BrokenPipeError,ConnectionResetError):
+            pass
+
+
+##Serve the API of the brew systems in a background thread
+def serve(daemons,port):
+    handler=type('handler',(api_handler,),{'daemons':{BD.name:BD for BD in daemons},'port':port})
+    server=ThreadingHTTPServer(('127.0.0.1',port),handler)
+    server.daemon_threads=True
+    threading.Thread(target=server.serve_forever,name='PyBrau API',daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    config=load_config()
+    parser=argparse.ArgumentParser(description='Headless PyBrau control service')
+    parser.add_argument('--port',default=config['port'],help='DAQ serial port of the main system, or sim')
+    parser.add_argument('--listen',type=int,default=config['daemon_port'],help='HTTP API port on 127.0.0.1')
+    args=parser.parse_args()
+
+    #One daemon per brew system, the main one runs in this thread and the others in their own
+    configs=system_configs(config)
+    if args.port!=config['port']:
+        configs[0]=('main',dict(config,port=args.port,port_serial=None))
+    daemons=[brew_daemon(system,None,name,claimed_ports(configs,name)) for name,system in configs]
+    server=serve(daemons,args.listen)
+    print('PyBrau daemon on http://127.0.0.1:%d, systems: %s' % (args.listen,' '.join(BD.name for BD in daemons)))
+    threads=[threading.Thread(target=BD.run,name='PyBrau %s' % BD.name,daemon=True) for BD in daemons[1:]]
+    for thread in threads:
+        thread.start()
+    def stop_all(*args):
+        for BD in daemons:
+            BD.stop()
+    signal.signal(signal.SIGTERM,stop_all)
+    try:
+        daemons[0].run()
+    except KeyboardInterrupt:
+        pass
+    stop_all()
+    for thread in threads:
+        thread.join(5.0)
+    server.shutdown()
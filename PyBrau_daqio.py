@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_daqio.py
+
+    Description: Batched I/O layer around the DLP-IO8-G DAQ object.  A
+                 multi-channel analog read is sent as one burst of
+                 commands followed by one read of all the replies, and a
+                 multi-pin digital write is sent as one burst of
+                 commands.  The last written state of every output is
+                 cached so writes that would not change a pin are
+                 skipped entirely.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - DLP-IO8-G single byte commands (see DLP-IO8-G datasheet):
+        Digital output high:  '1' '2' '3' '4' '5' '6' '7' '8'
+        Digital output low:   'Q' 'W' 'E' 'R' 'T' 'Y' 'U' 'I'
+        Analog voltage:       'Z' 'X' 'C' 'V' 'B' 'N' 'M' ','
+    - In binary mode (DAQ.changeSettings("B","F")) every analog read replies
+      with the 10 bit ADC code in 2 bytes
+    - The pyserial handle is taken from DLP.ser.  If the DAQ object has none
+      (e.g. a simulated device) the layer falls back to one getVoltage or
+      setDigitalOutput call per pin, the output cache still applies.
+    - Failed transactions are counted in errors and the exception is passed on
+
+    Calls:  DLP_IO8_G_py.py (through the DAQ object passed in)
+    '''
+
+
+##DLP-IO8-G command bytes, indexed by pin number
+PIN_HIGH=b' 12345678'
+PIN_LOW=b' QWERTYUI'
+PIN_ADC=b' ZXCVBNM,'
+
+ADC_MAX=1023 #10 bit ADC
+ADC_VREF=5.0 #V, ADC full scale voltage
+ADC_BYTES=2 #bytes per analog reply in binary mode
+ADC_BYTE_ORDER='little'
+
+
+class daq_io:
+    def __init__(self,DAQ):
+        self.DAQ=DAQ
+        self.ser=getattr(DAQ,'ser',None) #pyserial handle, None if the DAQ object does not expose one
+
+        self.outputs={} #last written state of each digital output, {pin:0/1}
+        self.writes_skipped=0 #number of pin writes skipped because the pin already had that state
+        self.errors=0 #number of failed DAQ transactions (serial errors and short reads)
+
+    ##Forget the output cache, the next write sets every pin again (e.g. after reconnecting)
+    def invalidate(self):
+        self.outputs={}
+
+    ##Throw away any reply bytes left over from a failed read, so the next read is not shifted
+    def flush(self):
+        if self.ser is not None:
+            self.ser.reset_input_buffer()
+
+    ##Set digital outputs, states={pin:0/1}
+    def write_pins(self,states,force=False):
+        #force=1 writes every pin even if the cache says it already has that state
+        if force:
+            changed=dict(states)
+        else:
+            changed={pin:state for pin,state in states.items() if self.outputs.get(pin)!=state}
+            self.writes_skipped+=len(states)-len(changed)
+        if not changed:
+            return changed
+        try:
+            if self.ser is not None:
+                self.ser.write(bytes((PIN_HIGH if state else PIN_LOW)[pin] for pin,state in changed.items()))
+            else:
+                for pin,state in changed.items():
+                    self.DAQ.setDigitalOutput(pin,state)
+        except IOError:
+            self.errors+=1
+            raise
+        self.outputs.update(changed)
+        return changed
+
+    ##Read the raw ADC codes of several analog channels in one transaction
+    def read_codes(self,pins):
+        try:
+            if self.ser is not None:
+                self.ser.write(bytes(PIN_ADC[pin] for pin in pins))
+                reply=self.ser.read(ADC_BYTES*len(pins))
+                if len(reply)!=ADC_BYTES*len(pins):
+                    raise IOError('DAQ read timed out, got %d of %d bytes' % (len(reply),ADC_BYTES*len(pins)))
+                return [int.from_bytes(reply[i:i+ADC_BYTES],ADC_BYTE_ORDER) for i in range(0,len(reply),ADC_BYTES)]
+            else:
+                return [volts_to_code(self.DAQ.getVoltage(pin)) for pin in pins]
+        except IOError:
+            self.errors+=1
+            raise
+
+    ##Read the voltage of several analog channels in one transaction
+    def read_volts(self,pins):
+        return [code_to_volts(code) for code in self.read_codes(pins)]
+
+
+##Conversion between ADC code and voltage
+def code_to_volts(code):
+    return code*ADC_VREF/ADC_MAX
+
+def volts_to_code(volts):
+    code=int(round(volts*ADC_MAX/ADC_VREF))
+    return min(max(code,0),ADC_MAX)
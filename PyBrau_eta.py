@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_eta.py
+
+    Description: Heat-up time estimate and energy meter for the kettles.
+                 The heating rate of each kettle is fitted to its recent
+                 temperature history and the duty cycle its heater actually
+                 got, with recursive least squares, so every new window
+                 updates the fit in constant time instead of refitting the
+                 whole history.  From the fitted model the time until the
+                 kettle reaches its setpoint is predicted.  The energy
+                 meter adds up the SSR on-times of every heater.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Model (per kettle, temperatures in degF, t in sec):
+        dT/dt = a*u + b + c*T
+        u = duty cycle of the heater (0 to 1) actually achieved by the SSRs
+        a = heating rate at full power, b+c*T = losses (c<0 when the kettle
+            loses heat to the room, b=-c*T_amb)
+    With the duty cycle held the temperature approaches T_inf=-(a*u+b)/c
+    exponentially, the time to the setpoint SP is
+        t = ln((SP-T_inf)/(T-T_inf))/c
+    or (SP-T)/(a*u+b) when c is close to zero.
+
+    Notes:
+    - The fit is updated once per window (window sec, default 10 s) with the
+      temperature change over the window and the mean duty cycle in it, the
+      temperature change over a single control period is too small compared
+      with the ADC steps
+    - forget (< 1) makes old windows count less, so the fit follows the
+      kettle as it fills up or the lid comes off
+    - The estimate assumes the heater keeps the mean duty cycle of the last
+      window, a heater that shares the circuit with the other one gets the
+      ETA of its share.  No estimate (None) while the heater is OFF, before
+      min_windows windows were fitted, or if the setpoint cannot be reached.
+    - Within band degF of the setpoint the ETA is 0
+    - Energy uses the power of the heater (heater_watts in PyBrau_config.py),
+      without it only the on-time is counted and kWh is None
+
+    Calls:  None
+    '''
+
+
+import math
+
+
+class rls_fit:
+    def __init__(self,n,forget=0.98,P0=1e4):
+        #n=number of parameters
+        #forget=forgetting factor, 1=all data counts the same
+        #P0=initial covariance, large=the first samples decide the fit
+        self.n=n
+        self.forget=forget
+        self.theta=[0.0]*n
+        self.P=[[P0 if i==j else 0.0 for j in range(n)] for i in range(n)]
+        self.count=0
+
+    ##Add one sample y=theta.x
+    def update(self,x,y):
+        n=self.n
+        P=self.P
+        Px=[sum(P[i][j]*x[j] for j in range(n)) for i in range(n)]
+        denom=self.forget+sum(x[i]*Px[i] for i in range(n))
+        gain=[Px[i]/denom for i in range(n)]
+        error=y-sum(self.theta[i]*x[i] for i in range(n))
+        self.theta=[self.theta[i]+gain[i]*error for i in range(n)]
+        #P is symmetric, so Px is also x'P
+        self.P=[[(P[i][j]-gain[i]*Px[j])/self.forget for j in range(n)] for i in range(n)]
+        self.count+=1
+
+    def predict(self,x):
+        return sum(self.theta[i]*x[i] for i in range(self.n))
+
+
+class heatup_estimator:
+    def __init__(self,window=10.0,forget=0.98,min_windows=6,band=0.5):
+        #window=sec, time over which the temperature change and mean duty cycle are taken
+        #min_windows=windows fitted before an ETA is given
+        #band=degF, distance to the setpoint that counts as reached
+        self.window=window
+        self.min_windows=min_windows
+        self.band=band
+        self.FIT=rls_fit(3,forget)
+        self.t0=None #start of the window
+        self.T0=0 #temperature at the start of the window
+        self.u_sum=0 #duty cycle x time in the window
+        self.u=0 #mean duty cycle of the last window
+
+    ##Add one control period, dt=sec, T=temperature at its end, u=achieved duty cycle (0 to 1)
+    def update(self,t,dt,T,u):
+        if self.t0 is None:
+            self.t0,self.T0,self.u_sum=t,T,0.0
+            return
+        self.u_sum+=u*dt
+        span=t-self.t0
+        if span<self.window:
+            return
+        self.u=self.u_sum/span
+        #Temperatures are scaled by 1/100 to keep the fit well conditioned
+        self.FIT.update((self.u,1.0,(T+self.T0)/200),(T-self.T0)/span)
+        self.t0,self.T0,self.u_sum=t,T,0.0
+
+    ##sec until T reaches SP with the heater at the mean duty cycle of the last window, None if there is no estimate
+    def eta(self,T,SP,ON=True):
+        if not ON or self.FIT.count<self.min_windows:
+            return None
+        if abs(SP-T)<=self.band:
+            return 0.0
+        a,b,c=self.FIT.theta
+        c=c/100
+        rate=a*self.u+b+c*T
+        if (SP-T)*rate<=0:
+            return None #moving away from the setpoint
+        if abs(c)<1e-7:
+            return (SP-T)/rate
+        T_inf=-(a*self.u+b)/c
+        ratio=(SP-T_inf)/(T-T_inf)
+        if ratio<=0:
+            return None #the setpoint is beyond where the kettle settles
+        t=math.log(ratio)/c
+        return t if t>=0 else None
+
+
+class energy_meter:
+    def __init__(self,watts=None):
+        #watts=W, power of the heater, None if it is not known
+        self.watts=watts
+        self.on_time=0.0 #sec, total SSR on-time
+
+    ##Add the on-time of one period, dt=sec, u=achieved duty cycle (0 to 1)
+    def update(self,dt,u):
+        self.on_time+=u*dt
+
+    @property
+    def kWh(self):
+        if self.watts is None:
+            return None
+        return self.watts*self.on_time/3.6e6
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_logger.py
+
+    Description: Background data logger for PyBrau.  Records are handed to
+                 the logger thread through a queue, packed into fixed size
+                 binary blocks and written to disk.  The file is flushed
+                 and fsync'd at a fixed interval, so at most flush_dt
+                 seconds of data are lost if the power is pulled.  A
+                 converter turns a binary log into the original PyBrau
+                 text log format.
+
+    Revision History
+    16 Oct 2026 - Created
+    16 Oct 2026 - Added decimation, time stamps with ms resolution
+
+    Author: Lars Soltmann
+
+    Binary log format (PyBrau_Log_<timestamp>.bin):
+        8 bytes   magic, b'PYBRAU\\x00\\x01'
+        4 bytes   header length in bytes including these 16 bytes (uint32, little endian)
+        4 bytes   number of fields per record (uint32, little endian)
+        text      header lines of the text log (# PyBrau Data Log, #LABELS, #UNITS)
+                  plus a #FORMAT line, padded with spaces to a multiple of 8 bytes
+        records   one float64 (little endian) per field, back to back
+
+    Notes:
+    - Records are fixed size so a torn write at the end of the file only loses
+      the last partial record
+    - With decimate=N only every Nth record handed to log() is kept, the rest
+      are dropped before they are queued
+    - Convert a binary log to text with:
+        python3 PyBrau_logger.py PyBrau_Log_<timestamp>.bin
+    '''
+
+
+import threading
+import collections
+import struct
+import sys
+import os
+from array import array
+
+
+##PyBrau data log layout
+LOG_LABELS=['Time','Pump','Mash_heater','Boil_heater','Mash_temp','Boil_temp','Mash_heater_temp','Boil_type','Mash_setpoint','Boil_setpoint','Boil_dutycycle_manual','Boil_dutycycle_active','Mash_dutycycle_active','Mash_errorSum','Boil_errorSum','DC_opt']
+LOG_UNITS=['sec','On/Off','On/Off','On/Off','degF','degF','degF','Man/Auto','degF','degF','%','%','%','N/A','N/A','On/Off']
+LOG_FORMAT='%.3f %d %d %d %.1f %.1f %.1f %d %.1f %.1f %d %d %d %.1f %.1f %d'
+
+MAGIC=b'PYBRAU\x00\x01'
+HEADER=struct.Struct('<8sII')
+
+
+class data_logger(threading.Thread):
+    def __init__(self,path,timestr,labels=LOG_LABELS,units=LOG_UNITS,fmt=LOG_FORMAT,block=64,flush_dt=5.0,decimate=1):
+        #path=binary log file name
+        #timestr=time stamp written in the log header
+        #block=number of records per block written to disk
+        #flush_dt=sec, time between flush/fsync of the log file
+        #decimate=only every Nth record is written
+        threading.Thread.__init__(self,name='PyBrau logger')
+        self.daemon=True
+        self.path=path
+        self.nfields=len(labels)
+        self.block=block
+        self.flush_dt=flush_dt
+        self.decimate=decimate
+        self.count=0 #records handed to log()
+
+        self.records=collections.deque() #records waiting to be written, thread safe for append/popleft
+        self.wake=threading.Event()
+        self.stopping=False
+        self.records_written=0
+        self.blocks_written=0
+
+        ##Write the header
+        text='# PyBrau Data Log\n# %s\n\n#LABELS %s\n#UNITS %s\n#FORMAT %s\n' % (timestr,' '.join(labels),' '.join(units),fmt)
+        text=text.encode('utf-8')
+        header_len=HEADER.size+len(text)
+        pad=(-header_len)%8
+        self.log_file=open(path,'wb')
+        self.log_file.write(HEADER.pack(MAGIC,header_len+pad,self.nfields))
+        self.log_file.write(text+b' '*pad)
+        self.flush()
+
+    ##Queue one record, a sequence of nfields numbers
+    def log(self,record):
+        self.count+=1
+        if self.count%self.decimate:
+            return
+        self.records.append(record)
+        if len(self.records)>=self.block:
+            self.wake.set()
+
+    ##Write everything that is queued, close the file and end the thread
+    def stop(self):
+        self.stopping=True
+        self.wake.set()
+
+    ##Flush the file and make sure it is on the disk
+    def flush(self):
+        self.log_file.flush()
+        os.fsync(self.log_file.fileno())
+
+    def run(self):
+        buf=array('d')
+        try:
+            while True:
+                self.wake.wait(self.flush_dt)
+                self.wake.clear()
+                stopping=self.stopping
+                ##Pack the queued records into blocks
+                while self.records:
+                    buf.extend(self.records.popleft())
+                    if len(buf)>=self.block*self.nfields:
+                        self.write_block(buf)
+                        buf=array('d')
+                ##Write the partial block and sync on every flush interval
+                if len(buf):
+                    self.write_block(buf)
+                    buf=array('d')
+                self.flush()
+                if stopping:
+                    break
+        finally:
+            self.log_file.close()
+
+    def write_block(self,buf):
+        if sys.byteorder!='little':
+            buf.byteswap()
+        self.log_file.write(buf.tobytes())
+        self.records_written+=len(buf)//self.nfields
+        self.blocks_written+=1
+
+
+##Read the header of a binary log, returns (header_len,nfields,header lines)
+def read_header(f):
+    magic,header_len,nfields=HEADER.unpack(f.read(HEADER.size))
+    if magic!=MAGIC:
+        raise ValueError('Not a PyBrau binary log')
+    lines=f.read(header_len-HEADER.size).decode('utf-8').rstrip(' ').splitlines()
+    return header_len,nfields,lines
+
+
+##Convert a binary log into the PyBrau text log format
+def convert_to_text(bin_path,txt_path=None):
+    if txt_path is None:
+        txt_path=os.path.splitext(bin_path)[0]+'.txt'
+    with open(bin_path,'rb') as f:
+        header_len,nfields,lines=read_header(f)
+        data=array('d')
+        raw=f.read()
+        data.frombytes(raw[:len(raw)-len(raw)%(8*nfields)])
+    if sys.byteorder!='little':
+        data.byteswap()
+    fmt=' '.join(['%g']*nfields)
+    with open(txt_path,'w') as out:
+        for line in lines:
+            if line.startswith('#FORMAT'):
+                fmt=line[len('#FORMAT '):]
+            else:
+                out.write(line+'\n')
+        fmt=fmt+'\n'
+        for i in range(0,len(data),nfields):
+            out.write(fmt % tuple(data[i:i+nfields]))
+    return txt_path
+
+
+if __name__ == "__main__":
+    for bin_path in sys.argv[1:]:
+        print('Wrote %s' % convert_to_text(bin_path))
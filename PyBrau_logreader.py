@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_logreader.py
+
+    Description: Fast reader for PyBrau data logs.  A log is memory mapped
+                 and every column is exposed as a memoryview keyed by its
+                 #LABELS name (Time, Mash_temp, Boil_dutycycle_active,
+                 Mash_errorSum, ...).  Binary logs are not copied at all,
+                 the column views point straight into the mapped file.
+                 Text logs are parsed once into one array and the column
+                 views point into that array.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Usage:
+        from PyBrau_logreader import brau_log
+        with brau_log('PyBrau_Log_2026-10-16--09-30.bin') as log:
+            temp=log['Mash_temp']                 #all samples
+            rest=log.slice(1800,3600)['Mash_temp'] #samples from 30 to 60 minutes
+            print(max(rest))
+
+    Notes:
+    - Columns are strided memoryviews of float64, they support len(), indexing,
+      slicing and iteration; use list() or array('d',...) to get a copy
+    - The Time column must be increasing for slice() to work, which it is for
+      every log written by PyBrau
+    - A partial record or line at the end of the file (e.g. power cut while
+      logging) is ignored
+    - Binary logs load in well under a millisecond whatever their length.  Text
+      logs have to be parsed, which takes about a second per 200k records.
+    - close() drops the views held by the reader.  If column views are still
+      referenced elsewhere the file map stays open until they are gone.
+
+    Calls:  PyBrau_logger.py
+    '''
+
+
+import mmap
+import sys
+import bisect
+from array import array
+from PyBrau_logger import MAGIC, HEADER
+
+
+class brau_log:
+    def __init__(self,path):
+        self.path=path
+        self.file=open(path,'rb')
+        self.mm=mmap.mmap(self.file.fileno(),0,access=mmap.ACCESS_READ)
+        self.labels=[]
+        self.units=[]
+        self.data=None #flat float64 view of all records
+
+        if self.mm[:len(MAGIC)]==MAGIC:
+            self.read_binary()
+        else:
+            self.read_text()
+
+        self.nfields=len(self.labels)
+        self.rows=len(self.data)//self.nfields if self.nfields else 0
+        self.columns={label:self.data[i::self.nfields] for i,label in enumerate(self.labels)}
+        self.time=self.columns.get('Time')
+
+    ##Binary log, the records are used straight from the mapped file
+    def read_binary(self):
+        magic,header_len,nfields=HEADER.unpack_from(self.mm,0)
+        self.parse_header(self.mm[HEADER.size:header_len].decode('utf-8').splitlines())
+        nbytes=(len(self.mm)-header_len)//(8*nfields)*(8*nfields)
+        if sys.byteorder=='little':
+            self.data=memoryview(self.mm)[header_len:header_len+nbytes].cast('d')
+        else:
+            data=array('d',self.mm[header_len:header_len+nbytes])
+            data.byteswap()
+            self.data=memoryview(data)
+
+    ##Text log, all numbers are parsed in one go into one array
+    def read_text(self):
+        #Header lines are at the top of the file and start with '#' (or are blank)
+        pos=0
+        header=[]
+        while pos<len(self.mm):
+            end=self.mm.find(b'\n',pos)
+            if end<0:
+                end=len(self.mm)
+            line=self.mm[pos:end]
+            if line.strip() and not line.startswith(b'#'):
+                break
+            header.append(line.decode('utf-8'))
+            pos=end+1
+        self.parse_header(header)
+        nfields=len(self.labels)
+        #Drop a partial last line
+        end=len(self.mm)
+        if not self.mm[end-1:end]==b'\n':
+            end=self.mm.rfind(b'\n',pos)+1
+        data=array('d',map(float,self.mm[pos:end].split()))
+        del data[len(data)-len(data)%nfields:]
+        self.data=memoryview(data)
+
+    def parse_header(self,lines):
+        for line in lines:
+            if line.startswith('#LABELS'):
+                self.labels=line.split()[1:]
+            elif line.startswith('#UNITS'):
+                self.units=line.split()[1:]
+        if not self.labels:
+            raise ValueError('%s has no #LABELS line' % self.path)
+
+    ##Column view by label
+    def __getitem__(self,label):
+        return self.columns[label]
+
+    def __len__(self):
+        return self.rows
+
+    ##Unit of a column
+    def unit(self,label):
+        return self.units[self.labels.index(label)]
+
+    ##Rows with t0 <= Time < t1
+    def index_range(self,t0=None,t1=None):
+        i0=0 if t0 is None else bisect.bisect_left(self.time,t0)
+        i1=self.rows if t1 is None else bisect.bisect_left(self.time,t1)
+        return i0,i1
+
+    ##Column views of the rows with t0 <= Time < t1, keyed by label
+    def slice(self,t0=None,t1=None):
+        i0,i1=self.index_range(t0,t1)
+        return {label:column[i0:i1] for label,column in self.columns.items()}
+
+    def close(self):
+        self.columns={}
+        self.time=None
+        if isinstance(self.data,memoryview):
+            self.data.release()
+        self.data=None
+        try:
+            self.mm.close()
+        except BufferError:
+            #Column views are still held somewhere, the map is closed when they are gone
+            pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+
+##Print a summary of one or more logs
+if __name__ == "__main__":
+    import time
+    for path in sys.argv[1:]:
+        t=time.perf_counter()
+        log=brau_log(path)
+        t=time.perf_counter()-t
+        print('%s: %d records, loaded in %.2f ms' % (path,len(log),t*1e3))
+        for label in log.labels:
+            column=log[label]
+            if len(column):
+                print('    %-24s %-8s min %10.2f  max %10.2f' % (label,log.unit(label),min(column),max(column)))
+        del column
+        log.close()
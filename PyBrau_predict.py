@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_predict.py
+
+    Description: Short horizon predictive allocation of the shared heater
+                 budget between the mash (RIMS) heater and the boil heater.
+                 A linear thermal model of each kettle is discretized once
+                 per control period and turned into precomputed prediction
+                 coefficients over the next N periods.  When both heaters
+                 ask for more than the period allows, every candidate
+                 split of the budget over the horizon is scored from these
+                 coefficients and the split with the lowest priority
+                 weighted setpoint error is applied to the next period.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Models (temperatures in degF, same form as the simulator in PyBrau_sim.py):
+        Mash:  m_MH*c*dT_MH/dt = P_M*u_M - mdot*c*(T_MH-T_MK) - UA_MH*(T_MH-T_amb)
+               m_MK*c*dT_MK/dt = mdot*c*(T_MH-T_MK) - UA_MK*(T_MK-T_amb)
+        Boil:  m_BK*c*dT_BK/dt = P_B*u_B - UA_BK*(T_BK-T_amb)
+    equipment_models builds them for the equipment in use: P_M and P_B are
+    the heater power of the configuration (heater_watts), the kettle water
+    and heat loss follow from the process model a relay test or a log
+    identified for the equipment profile (PyBrau_tune.py, k=degF/sec at full
+    power, a=1/sec heat loss): m=P/(k*c), UA=a*m*c.  The defaults below are
+    used for whatever is not known.
+
+    Method:
+    - Each model is discretized over one period DC_T: x[k+1]=A*x[k]+B*u[k]+E*T_amb
+    - The horizon is split in two blocks (move blocking), the duty cycle is held
+      constant over the first block (block sec) and over the rest of the horizon
+      (horizon sec).  The predicted kettle temperature is then
+          T[k] = F[k].x0 + G[k]*T_amb + S0[k]*u0 + S1[k]*u1
+      F, G, S0 and S1 are computed once when the allocator is created.
+    - The cost of a kettle is the sum of the squared setpoint errors over the
+      horizon.  It is a quadratic in (u0,u1) whose second order terms Q are
+      precomputed, so each tick costs O(N) to get the first order terms and
+      O(1) per candidate.
+    - Candidates are duty cycles on a grid of levels steps in each block.  The
+      boil cost of every grid point is turned into a running minimum table so
+      that for every mash candidate the best boil candidate that fits in the
+      remaining budget is a single lookup.
+    - Each kettle cost is divided by the square of its present setpoint error
+      (at least tolerance), so it measures the error left over the horizon
+      relative to where the kettle is now.  A kettle close to its setpoint
+      is not starved because the other kettle is far from its setpoint (and
+      has the bigger heater); the split favours the kettle that can make the
+      most relative progress, which gets both to setpoint soonest.
+    - Priorities wM and wB multiply the mash and boil costs (the DC Wt inputs)
+    - Neither heater is starved: in the first block each heater gets at least
+      its share of the priorities times the duty cycle it asks for (times
+      floor), the least the two weight rule of the control worker gives it.
+      The predictive split works within what is left.  The scaling
+      by the present error alone would let the kettle that can make the most
+      relative progress take the whole budget period after period, e.g. a
+      manual boil next to a mash far below its setpoint.
+    - A heater without a temperature target (manual boil, or a boil setpoint at
+      or above boiling, where the kettle cannot follow the model) tracks its
+      requested duty cycle instead, its cost is the temperature error that the
+      difference in duty cycle would make, relative to the temperature rise
+      the requested duty cycle makes over the horizon
+    - Only the first period of the chosen split is applied, the allocation is
+      done again every period
+
+    Usage:
+        python3 PyBrau_predict.py       #print the allocation for a few cases and time it
+    '''
+
+
+import math
+
+
+HEATER_W={'mash':1500.0,'boil':5500.0} #W, heater power of the default models
+
+##Thermal model of a kettle as a linear state space model, discretized per period
+class kettle_model:
+    def __init__(self,derivative,n,output,DC_T,dt_max=0.05):
+        #derivative=function(x,u,T_amb) returning dx/dt, linear in x, u and T_amb
+        #n=number of states
+        #output=index of the kettle temperature in the state
+        self.n=n
+        self.output=output
+        ##Discretize by integrating the unit responses over one period
+        steps=max(1,int(math.ceil(DC_T/dt_max)))
+        h=DC_T/steps
+        def period(x,u,T_amb):
+            x=list(x)
+            for i in range(steps):
+                dx=derivative(x,u,T_amb)
+                x=[a+h*b for a,b in zip(x,dx)]
+            return x
+        zero=[0.0]*n
+        columns=[period([1.0 if j==i else 0.0 for j in range(n)],0.0,0.0) for i in range(n)]
+        self.A=[[columns[j][i] for j in range(n)] for i in range(n)]
+        self.B=period(zero,1.0,0.0)
+        self.E=period(zero,0.0,1.0)
+
+    ##Prediction coefficients of the kettle temperature for k=1..N periods ahead
+    def coefficients(self,N,N0):
+        #N0=periods in the first input block
+        n=self.n
+        F=[] #F[k]=row of A^(k+1) for the output, free response to the initial state
+        G=[] #ambient temperature response
+        S0=[] #response to a unit duty cycle in the first block
+        S1=[] #response to a unit duty cycle in the second block
+        Ak=[[1.0 if i==j else 0.0 for j in range(n)] for i in range(n)] #A^k
+        xg=[0.0]*n
+        x0=[0.0]*n
+        x1=[0.0]*n
+        for k in range(N):
+            Ak=[[sum(self.A[i][m]*Ak[m][j] for m in range(n)) for j in range(n)] for i in range(n)]
+            u0=1.0 if k<N0 else 0.0
+            xg=[sum(self.A[i][j]*xg[j] for j in range(n))+self.E[i] for i in range(n)]
+            x0=[sum(self.A[i][j]*x0[j] for j in range(n))+self.B[i]*u0 for i in range(n)]
+            x1=[sum(self.A[i][j]*x1[j] for j in range(n))+self.B[i]*(1.0-u0) for i in range(n)]
+            F.append(tuple(Ak[self.output]))
+            G.append(xg[self.output])
+            S0.append(x0[self.output])
+            S1.append(x1[self.output])
+        return F,G,S0,S1
+
+
+##Model of the mash tun with the RIMS heater tube, state (T_MH,T_MK)
+def mash_model(DC_T,m_MK=35.0,m_MH=0.4,P_M=HEATER_W['mash'],mdot=0.07,UA_MK=4.0,UA_MH=0.3,c=4186/1.8):
+    def derivative(x,u,T_amb):
+        T_MH,T_MK=x
+        flow=mdot*c*(T_MH-T_MK)
+        return [(P_M*u-flow-UA_MH*(T_MH-T_amb))/(m_MH*c),(flow-UA_MK*(T_MK-T_amb))/(m_MK*c)]
+    return kettle_model(derivative,2,1,DC_T)
+
+##Model of the boil kettle, state (T_BK,)
+def boil_model(DC_T,m_BK=30.0,P_B=HEATER_W['boil'],UA_BK=6.0,c=4186/1.8):
+    def derivative(x,u,T_amb):
+        return [(P_B*u-UA_BK*(x[0]-T_amb))/(m_BK*c)]
+    return kettle_model(derivative,1,0,DC_T)
+
+
+##Models of the mash and boil kettles of the equipment in use, (mash,boil)
+def equipment_models(DC_T,watts=None,tuned=None,c=4186/1.8):
+    #watts={'mash':W,'boil':W}, heater power, None or missing=default heater
+    #tuned={'mash':model,'boil':model}, dicts with the identified k and a (PyBrau_tune.py), missing=default kettle
+    watts=watts or {}
+    tuned=tuned or {}
+    ##Heater power, then the water and heat loss that give the identified heating rate and loss
+    params={}
+    for kettle in ('mash','boil'):
+        P=watts.get(kettle) or HEATER_W[kettle]
+        result=tuned.get(kettle)
+        if result is not None and result['k']>0:
+            m=P/(result['k']*c)
+            params[kettle]=(P,m,max(result['a'],0.0)*m*c)
+        else:
+            params[kettle]=(P,)
+    mash=dict(zip(('P_M','m_MK','UA_MK'),params['mash']))
+    boil=dict(zip(('P_B','m_BK','UA_BK'),params['boil']))
+    return mash_model(DC_T,**mash),boil_model(DC_T,**boil)
+
+
+##Quadratic cost of one kettle over the horizon as a function of the block duty cycles
+class kettle_cost:
+    def __init__(self,model,N,N0):
+        self.F,self.G,self.S0,self.S1=model.coefficients(N,N0)
+        self.Q00=sum(s*s for s in self.S0)
+        self.Q01=sum(a*b for a,b in zip(self.S0,self.S1))
+        self.Q11=sum(s*s for s in self.S1)
+
+    ##First order terms for reaching setpoint SP from state x
+    def linear_terms(self,x,SP,T_amb):
+        P0=0.0
+        P1=0.0
+        for F,G,S0,S1 in zip(self.F,self.G,self.S0,self.S1):
+            e=SP-sum(f*xi for f,xi in zip(F,x))-G*T_amb
+            P0+=e*S0
+            P1+=e*S1
+        return P0,P1
+
+    ##First order terms for holding a requested duty cycle u
+    def request_terms(self,u):
+        return u*(self.Q00+self.Q01),u*(self.Q01+self.Q11)
+
+    ##Temperature rise over the horizon at duty cycle u
+    def rise(self,u):
+        return u*(self.S0[-1]+self.S1[-1])
+
+    ##Cost (without the constant term) of the block duty cycles u0,u1
+    def cost(self,P0,P1,u0,u1):
+        return u0*(u0*self.Q00-2*P0)+u1*(u1*self.Q11-2*P1)+2*u0*u1*self.Q01
+
+
+class power_allocator:
+    def __init__(self,DC_T,horizon=120,block=20,levels=21,tolerance=1.0,T_amb=70.0,T_boil=212.0,mash=None,boil=None,floor=1.0):
+        #horizon=sec, prediction horizon
+        #block=sec, length of the first input block, the duty cycle applied next is the one of this block
+        #levels=duty cycle grid steps from 0 to 1 in each block
+        #tolerance=degF, smallest error used to scale a kettle cost
+        #mash,boil=kettle_model, the default models if None
+        #floor=fraction of its priority share of its request that each heater always gets, 0=none
+        self.DC_T=DC_T
+        self.N=max(2,int(round(horizon/DC_T)))
+        self.N0=min(max(1,int(round(block/DC_T))),self.N-1)
+        self.tolerance=tolerance
+        self.floor=floor
+        self.T_amb=T_amb
+        self.T_boil=T_boil
+        self.levels=levels
+        self.grid=[i/(levels-1) for i in range(levels)]
+        self.mash=kettle_cost(mash if mash is not None else mash_model(DC_T),self.N,self.N0)
+        self.boil=kettle_cost(boil if boil is not None else boil_model(DC_T),self.N,self.N0)
+        self.cost=0.0 #cost of the last allocation
+
+    ##Split the heater budget of the next period, returns (u_M,u_B)
+    def allocate(self,x_mash,setMK,x_boil,setBK,u_M,u_B,wM=0.5,wB=0.5):
+        #x_mash=(T_MH,T_MK), x_boil=(T_BK,)
+        #setMK,setBK=setpoints in degF, setBK=None for a boil heater without a temperature target
+        #u_M,u_B=requested duty cycles (0 to 1), used by a heater without a temperature target
+        #wM,wB=priorities of the mash and the boil
+        L=self.levels
+        top=L-1
+        ##Least grid steps of each heater in the first block, its share of the priorities times its request
+        share=wM/(wM+wB) if wM+wB>0 else 0.5
+        lo_M=int(math.floor(self.floor*share*u_M*top+1e-9))
+        lo_B=int(math.floor(self.floor*(1-share)*u_B*top+1e-9))
+
+        tol2=self.tolerance**2
+        PM0,PM1=self.mash.linear_terms(x_mash,setMK,self.T_amb)
+        wM=wM/max((setMK-x_mash[1])**2,tol2)
+        if setBK is None or setBK>=self.T_boil:
+            PB0,PB1=self.boil.request_terms(u_B)
+            wB=wB/max(self.boil.rise(u_B)**2,tol2)
+        else:
+            PB0,PB1=self.boil.linear_terms(x_boil,setBK,self.T_amb)
+            wB=wB/max((setBK-x_boil[0])**2,tol2)
+
+        ##Boil cost of every grid point, then the lowest cost with at most i0,i1 grid steps (and at least lo_B in the first block)
+        grid=self.grid
+        best=[[math.inf]*L for i in range(L)]
+        arg=[[None]*L for i in range(L)]
+        for i0 in range(L):
+            for i1 in range(L):
+                c=wB*self.boil.cost(PB0,PB1,grid[i0],grid[i1]) if i0>=lo_B else math.inf
+                a=(i0,i1)
+                if i0>0 and best[i0-1][i1]<c:
+                    c,a=best[i0-1][i1],arg[i0-1][i1]
+                if i1>0 and best[i0][i1-1]<c:
+                    c,a=best[i0][i1-1],arg[i0][i1-1]
+                best[i0][i1]=c
+                arg[i0][i1]=a
+
+        ##Every mash candidate with the best boil candidate that fits in the rest of the budget
+        cost=None
+        for i0 in range(lo_M,top-lo_B+1):
+            for i1 in range(L):
+                c=wM*self.mash.cost(PM0,PM1,grid[i0],grid[i1])+best[top-i0][top-i1]
+                if cost is None or c<cost:
+                    cost=c
+                    choice=(i0,arg[top-i0][top-i1][0])
+        self.cost=cost
+        return grid[choice[0]],grid[choice[1]]
+
+
+if __name__ == "__main__":
+    import time
+    ALLOC=power_allocator(0.5)
+    print('Horizon %d periods, first block %d periods, %d x %d grid' % (ALLOC.N,ALLOC.N0,ALLOC.levels,ALLOC.levels))
+    cases=[('Mash far, boil far',(140,140),152,(120,),170,1,1),
+           ('Mash close, boil far',(153,151.5),152,(120,),170,1,1),
+           ('Mash far, boil close',(140,140),152,(169,),170,1,1),
+           ('Mash far, manual boil 60%',(140,140),152,(150,),None,1,0.6),
+           ('Mash at setpoint, boil at 212',(152.5,152),152,(212,),212,0.3,1)]
+    for name,x_mash,setMK,x_boil,setBK,u_M,u_B in cases:
+        for wM in (0.5,0.8):
+            t=time.perf_counter()
+            u=ALLOC.allocate(x_mash,setMK,x_boil,setBK,u_M,u_B,wM,1-wM)
+            t=time.perf_counter()-t
+            print('%-32s wM=%.1f  u_M=%.2f u_B=%.2f  (%.2f ms)' % (name,wM,u[0],u[1],t*1e3))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_probes.py
+
+    Description: Lightweight timing probes for the stages of the PyBrau
+                 control loop and GUI (DAQ read, thermistor conversion,
+                 PI control, SSR output, data log and GUI refresh).  Every
+                 measurement goes into a preallocated log2 histogram per
+                 stage, nothing is allocated while the probes run.  The
+                 probes are switched on and off at runtime with enable().
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Usage:
+        t=PROBES.start()
+        codes=IO.read_codes(pins)
+        PROBES.stop(PROBE_DAQ,t)
+
+    Notes:
+    - While the probes are off start() returns 0 and stop() returns straight
+      away, so a disabled probe costs two function calls
+    - Histogram bucket k counts the durations of k bits in ns, i.e. from 2^(k-1)
+      up to 2^k ns.  Percentiles are reported as the upper edge of their bucket,
+      so they are accurate to within a factor of 2; count, mean and worst are
+      exact.
+    - Each stage is written by one thread only (the GUI stage by the Tk thread,
+      all others by the control worker), so no lock is needed
+    - enable() clears the statistics, turning the probes off and on again
+      starts a new measurement
+    '''
+
+
+import time
+from array import array
+
+
+##Probed stages
+PROBE_DAQ=0 #DAQ read of all thermistor channels
+PROBE_CONVERT=1 #thermistor conversion and filter
+PROBE_PI=2 #PI control and duty cycle optimization
+PROBE_SSR=3 #SSR output writes
+PROBE_LOG=4 #data log record
+PROBE_GUI=5 #GUI refresh
+PROBE_NAMES=('daq','conv','PI','ssr','log','gui')
+
+PROBE_BUCKETS=40 #log2 histogram buckets, the last one takes everything from 2^38 ns (~4.6 min) up
+
+
+def _off():
+    return 0
+
+
+class timing_probes:
+    def __init__(self,enabled=False,names=PROBE_NAMES):
+        self.names=names
+        self.n=len(names)
+        self.hist=array('Q',bytes(8*self.n*PROBE_BUCKETS)) #histogram of every stage, one row per stage
+        self.count=array('Q',bytes(8*self.n)) #measurements per stage
+        self.total=array('Q',bytes(8*self.n)) #ns, sum of all measurements per stage
+        self.worst=array('Q',bytes(8*self.n)) #ns, longest measurement per stage
+        self.enable(enabled)
+
+    ##Switch the probes on or off, switching them on clears the statistics
+    def enable(self,enabled=True):
+        if enabled:
+            self.reset()
+        self.enabled=enabled
+        self.start=time.perf_counter_ns if enabled else _off
+
+    def reset(self):
+        for buf in (self.hist,self.count,self.total,self.worst):
+            for i in range(len(buf)):
+                buf[i]=0
+
+    ##Record the time since t0 (from start()) for a stage
+    def stop(self,stage,t0):
+        if not t0:
+            return
+        dt=time.perf_counter_ns()-t0
+        self.hist[stage*PROBE_BUCKETS+min(dt.bit_length(),PROBE_BUCKETS-1)]+=1
+        self.count[stage]+=1
+        self.total[stage]+=dt
+        if dt>self.worst[stage]:
+            self.worst[stage]=dt
+
+    ##Duration (sec) below which a fraction p of the measurements of a stage fall, upper edge of the bucket
+    def percentile(self,stage,p):
+        n=self.count[stage]
+        if n==0:
+            return 0.0
+        k=0
+        seen=0
+        row=stage*PROBE_BUCKETS
+        for k in range(PROBE_BUCKETS):
+            seen+=self.hist[row+k]
+            if seen>=p*n:
+                break
+        return min(2**k,self.worst[stage])*1e-9
+
+    ##Stage with the longest measurement and its duration in seconds
+    def worst_stage(self):
+        stage=max(range(self.n),key=self.worst.__getitem__)
+        return self.names[stage],self.worst[stage]*1e-9
+
+    ##Statistics of every stage, durations in seconds
+    def summary(self):
+        stats={}
+        for stage,name in enumerate(self.names):
+            n=self.count[stage]
+            stats[name]={'count':n,
+                         'mean':self.total[stage]/n*1e-9 if n else 0.0,
+                         'p50':self.percentile(stage,0.5),
+                         'p99':self.percentile(stage,0.99),
+                         'worst':self.worst[stage]*1e-9}
+        return stats
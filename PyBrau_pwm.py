@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_pwm.py
+
+    Description: Deadline based PWM scheduler for the heater SSRs.  At the
+                 start of every duty cycle period the scheduler turns the
+                 requested on-interval of each pin into a list of ON/OFF
+                 events with absolute deadlines on a monotonic clock.  The
+                 control worker fires the events as their deadlines pass
+                 and the scheduler records when each event actually fired
+                 so that it can report the achieved duty cycle and the
+                 timing jitter of every period.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - Period start times advance by exactly DC_T so timing errors do not add up
+      from one period to the next
+    - If an ON event fires late, the matching OFF event is moved back by the
+      same amount so the pin still gets its full on-time, limited to the end
+      of the period and to the earliest ON event still pending for another
+      pin.  Heaters packed one after the other are so never ON together.
+      Without compensate (circuit limit set) the OFF events keep their
+      deadlines, a late ON only shortens the interval: layout_budget starts
+      heaters at the planned OFF of others, the planned intervals are what
+      keeps the total power within the limit.
+    - Every pin with an on-interval that ends before the period does gets an
+      OFF event, so no pin is left ON into the next period by mistake
+    - layout_exclusive packs heaters one after the other, layout_budget lets
+      heaters overlap as long as their total power stays within the circuit
+      limit.  Each heater gets one interval per period, as early as it fits,
+      in the order given.  A heater that does not fit in full gets the
+      longest interval that does.
+    '''
+
+
+import time
+
+
+##Lay out the on-intervals of heaters that may never be ON at the same time
+def layout_exclusive(duties,DC_T):
+    #duties=list of (pin,u) with 0 <= u <= 1 and sum(u) <= 1
+    #Returns {pin:(t_on,t_off)} with times in seconds from the start of the period, heaters are packed one after the other
+    layout={}
+    t=0.0
+    for pin,u in duties:
+        t_on=t
+        t_off=min(t_on+u*DC_T,DC_T)
+        layout[pin]=(t_on,t_off)
+        t=t_off
+    return layout
+
+
+##Lay out the on-intervals of heaters that may be ON together while their total power is within a limit
+def layout_budget(duties,watts,limit,DC_T):
+    #duties=list of (pin,u) with 0 <= u <= 1, in order of priority
+    #watts={pin:W}, power of each heater
+    #limit=W, largest total power of the heaters that are ON at the same time
+    #Returns {pin:(t_on,t_off)} with times in seconds from the start of the period
+    edges=[0.0,DC_T] #the period split into segments of constant power
+    load=[0.0] #W, power of the heaters ON in each segment
+    layout={}
+    for pin,u in duties:
+        d=u*DC_T
+        if d<=0:
+            continue
+        W=watts[pin]
+        t_on,t_off=0.0,0.0
+        for i in range(len(load)):
+            #Longest interval from the start of segment i that stays within the limit
+            j=i
+            while j<len(load) and load[j]+W<=limit+1e-9:
+                j+=1
+            length=min(d,edges[j]-edges[i])
+            if length>t_off-t_on+1e-12:
+                t_on,t_off=edges[i],edges[i]+length
+                if length>=d:
+                    break
+        if t_off<=t_on:
+            continue
+        layout[pin]=(t_on,t_off)
+        ##Add the heater to the power of the segments it covers
+        for t in (t_on,t_off):
+            if t not in edges:
+                k=next(k for k,edge in enumerate(edges) if edge>t)
+                edges.insert(k,t)
+                load.insert(k-1,load[k-1])
+        for k in range(len(load)):
+            if edges[k]>=t_on and edges[k+1]<=t_off:
+                load[k]+=W
+    return layout
+
+
+class pwm_scheduler:
+    def __init__(self,pins,DC_T,clock=time.monotonic,compensate=True):
+        self.pins=tuple(pins) #SSR pins driven by the scheduler
+        self.DC_T=DC_T #Duty cycle period in seconds
+        self.clock=clock
+        self.compensate=compensate #delay the OFF event of a late ON event, False=OFF events are never moved
+
+        self.t0=0 #start of the active period
+        self.events=[] #pending events as [deadline,pin,state], sorted by deadline
+        self.t_on={} #actual time each pin was turned ON in the active period
+        self.on_time={} #actual accumulated ON time of each pin in the active period
+
+        ##Results of the last completed period
+        self.duty={pin:0.0 for pin in self.pins} #achieved duty cycle (0 to 1)
+        self.jitter=0.0 #sec, worst event lateness
+        self.period=DC_T #sec, actual period length
+
+    ##Build the event list of a new period
+    def plan(self,t0,layout):
+        #t0=period start time on the scheduler clock
+        #layout={pin:(t_on,t_off)} in seconds from t0, pins not in layout stay OFF
+        self.t0=t0
+        self.events=[]
+        self.t_on={}
+        self.on_time={pin:0.0 for pin in self.pins}
+        self.jitter=0.0
+        start={}
+        for pin in self.pins:
+            t_on,t_off=layout.get(pin,(0.0,0.0))
+            if t_off-t_on<=0:
+                start[pin]=0
+                continue
+            if t_on<=0:
+                start[pin]=1
+            else:
+                start[pin]=0
+                self.events.append([t0+t_on,pin,1])
+            if t_off<self.DC_T:
+                self.events.append([t0+t_off,pin,0])
+        #All pins are set at the period start in one go
+        self.events.append([t0,None,start])
+        self.events.sort(key=lambda event:(event[0],event[1] is not None))
+
+    ##Deadline of the next pending event, None if all events of the period were fired
+    def next_deadline(self):
+        if self.events:
+            return self.events[0][0]
+        return None
+
+    ##Fire all events whose deadline has passed
+    def fire_due(self,write):
+        #write=function taking {pin:state} that sets the outputs
+        now=self.clock()
+        states={}
+        while self.events and self.events[0][0]<=now:
+            deadline,pin,state=self.events.pop(0)
+            self.jitter=max(self.jitter,now-deadline)
+            if pin is None:
+                states.update(state)
+            else:
+                states[pin]=state
+            #Compensate a late ON event by delaying the matching OFF event, but never past the ON of another heater
+            if self.compensate and pin is not None and state==1 and now>deadline:
+                latest=min([event[0] for event in self.events if event[1] is not None and event[1]!=pin and event[2]==1],default=self.t0+self.DC_T)
+                for event in self.events:
+                    if event[1]==pin and event[2]==0:
+                        event[0]=max(event[0],min(event[0]+(now-deadline),self.t0+self.DC_T,latest))
+                self.events.sort(key=lambda event:(event[0],event[1] is not None))
+        if states:
+            write(states)
+            now=self.clock()
+            for pin,state in states.items():
+                if state==1 and pin not in self.t_on:
+                    self.t_on[pin]=now
+                elif state==0 and pin in self.t_on:
+                    self.on_time[pin]+=now-self.t_on.pop(pin)
+        return states
+
+    ##Close the active period and compute the achieved duty cycle and jitter
+    def end_period(self):
+        now=self.clock()
+        self.period=now-self.t0
+        for pin in self.pins:
+            on_time=self.on_time.get(pin,0.0)
+            if pin in self.t_on:
+                on_time+=now-self.t_on.pop(pin)
+            self.duty[pin]=min(on_time/self.period,1.0) if self.period>0 else 0.0
+        #Count a late period end as jitter too
+        self.jitter=max(self.jitter,self.period-self.DC_T)
+        return self.duty,self.jitter
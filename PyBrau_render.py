@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_render.py
+
+    Description: Diff based render layer for the PyBrau GUI.  Keeps the last
+                 value sent to Tk for every StringVar, canvas item option
+                 and widget option that goes through it, and only calls
+                 into Tk when a value actually changes.  Counts the Tk
+                 calls made and saved so the effect can be checked on the
+                 Pi.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - Anything that changes a cached StringVar or option outside of this layer
+      makes the cache wrong, such code must go through the layer too (or call
+      forget())
+    - begin()/end() around a GUI refresh record the calls saved by that
+      refresh in saved_last
+    '''
+
+
+class tk_render:
+    def __init__(self):
+        self.last={} #last value sent to Tk, keyed by ((Tk name, canvas item), option)
+        self.calls=0 #Tk calls made since startup
+        self.saved=0 #Tk calls skipped since startup
+        self.saved_refresh=0 #Tk calls skipped in the active refresh
+        self.saved_last=0 #Tk calls skipped in the last complete refresh
+
+    ##Set a StringVar
+    def set(self,var,value):
+        key=((str(var),None),'value')
+        if self.last.get(key)==value:
+            self.skip(1)
+            return
+        self.last[key]=value
+        var.set(value)
+        self.calls+=1
+
+    ##Change options of a canvas item, only the options that changed are sent
+    def itemconfig(self,canvas,item,**options):
+        changed=self.changed((str(canvas),item),options)
+        if changed:
+            canvas.itemconfig(item,**changed)
+            self.calls+=1
+        else:
+            self.skip(1)
+
+    ##Change options of a widget, only the options that changed are sent
+    def config(self,widget,**options):
+        changed=self.changed((str(widget),None),options)
+        if changed:
+            widget.config(**changed)
+            self.calls+=1
+        else:
+            self.skip(1)
+
+    ##Forget the cached values of a StringVar or widget, e.g. after changing it directly
+    def forget(self,obj,item=None):
+        name=str(obj)
+        for key in [key for key in self.last if key[0][0]==name and (item is None or key[0][1]==item)]:
+            del self.last[key]
+
+    def changed(self,target,options):
+        changed={}
+        for option,value in options.items():
+            key=(target,option)
+            if self.last.get(key)!=value:
+                self.last[key]=value
+                changed[option]=value
+        return changed
+
+    def skip(self,n):
+        self.saved+=n
+        self.saved_refresh+=n
+
+    ##Mark the start and end of a GUI refresh
+    def begin(self):
+        self.saved_refresh=0
+
+    def end(self):
+        self.saved_last=self.saved_refresh
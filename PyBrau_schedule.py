@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_schedule.py
+
+    Description: Mash schedule engine.  Runs a recipe of rests, each with a
+                 mash temperature, a hold time and a ramp rate, and
+                 drives the mash (and optionally the boil) setpoint of the
+                 control worker.  The hold timer of a rest only starts
+                 once the mash temperature is within tolerance of the
+                 rest temperature.  The setpoint ramps are precomputed
+                 when the schedule is loaded, so every control tick is a
+                 table lookup.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Recipe file (text, one rest per line, '#' starts a comment):
+        # name      mash_temp  hold  ramp   boil_temp
+        tolerance   1.0
+        Protein     122        15    0
+        Sacch       152        60    2      170
+        Mashout     168        10    2      -
+    - mash_temp and boil_temp in degF, hold in minutes, ramp in degF/min
+    - ramp=0 steps the setpoint straight to the rest temperature
+    - boil_temp is optional, '-' or nothing leaves the boil setpoint alone
+    - 'tolerance <degF>' sets the band the mash temperature must be in for
+      the hold timer to start (default 1.0, the edge of the green/yellow box)
+
+    Notes:
+    - Every rest goes through three phases:
+        'ramp' - setpoint follows the ramp table from the previous temperature
+        'wait' - setpoint at the rest temperature, waiting for the mash to get
+                 within tolerance
+        'hold' - hold timer running, the rest ends when it runs out
+      After the last rest the schedule is 'done' and keeps the last setpoints.
+    - The ramp of the first rest starts from the mash temperature at the time
+      the schedule is started, its table is built then; all other ramp
+      tables are built when the schedule is loaded.  Ramp tables have one
+      entry per dt (the control period).
+    - Once started, the hold timer keeps running if the temperature leaves
+      the tolerance band again
+
+    Usage:
+        python3 PyBrau_schedule.py recipe.txt   #print the schedule and its ramp lengths
+    '''
+
+
+import math
+from array import array
+
+
+##One rest of the schedule
+class mash_step:
+    def __init__(self,name,temp,hold,ramp=0.0,boil=None):
+        self.name=name
+        self.temp=temp #degF, mash rest temperature
+        self.hold=hold #min, hold time
+        self.ramp=ramp #degF/min, setpoint ramp rate into the rest, 0=step
+        self.boil=boil #degF, boil setpoint during the rest, None=unchanged
+        self.table=None #precomputed setpoint ramp, one entry per dt
+
+
+class mash_schedule:
+    def __init__(self,steps,dt=0.5,tolerance=1.0,name=''):
+        #steps=list of mash_step
+        #dt=sec, control period, resolution of the ramp tables
+        #tolerance=degF, band around the rest temperature that starts the hold timer
+        if not steps:
+            raise ValueError('Mash schedule has no steps')
+        self.steps=steps
+        self.dt=dt
+        self.tolerance=tolerance
+        self.name=name
+        for i in range(1,len(steps)):
+            steps[i].table=self.ramp_table(steps[i-1].temp,steps[i])
+
+        ##Progress, changed by start() and update()
+        self.step=-1 #index of the active rest, -1=not started
+        self.phase='idle' #'idle','ramp','wait','hold','done'
+        self.t_step=0 #time the active rest started
+        self.t_hold=0 #time the hold timer of the active rest ends
+        self.setMK=0
+        self.setBK=None
+
+    ##Setpoint every dt from temperature T0 to the rest temperature
+    def ramp_table(self,T0,step):
+        if step.ramp<=0:
+            return array('d',[step.temp])
+        n=max(1,int(math.ceil(abs(step.temp-T0)/(step.ramp*self.dt/60))))
+        dT=(step.temp-T0)/n
+        table=array('d',(T0+dT*(k+1) for k in range(n)))
+        table[-1]=step.temp
+        return table
+
+    ##Start the first rest at time t with the mash at tempMK
+    def start(self,t,tempMK,setBK=None):
+        self.steps[0].table=self.ramp_table(tempMK,self.steps[0])
+        self.setBK=setBK
+        self.begin_step(0,t)
+
+    def begin_step(self,i,t):
+        self.step=i
+        self.t_step=t
+        self.phase='ramp'
+        step=self.steps[i]
+        if step.boil is not None:
+            self.setBK=step.boil
+
+    ##Setpoints for time t, called once per control tick
+    def update(self,t,tempMK):
+        if self.phase in ('idle','done'):
+            return self.setMK,self.setBK
+        step=self.steps[self.step]
+        if self.phase=='ramp':
+            k=int((t-self.t_step)/self.dt)
+            if k<len(step.table):
+                self.setMK=step.table[k]
+                return self.setMK,self.setBK
+            self.phase='wait'
+        self.setMK=step.temp
+        if self.phase=='wait':
+            if abs(tempMK-step.temp)<=self.tolerance:
+                self.phase='hold'
+                self.t_hold=t+step.hold*60
+        if self.phase=='hold' and t>=self.t_hold:
+            if self.step+1<len(self.steps):
+                self.begin_step(self.step+1,t)
+                return self.update(t,tempMK)
+            self.phase='done'
+        return self.setMK,self.setBK
+
+    ##End the active rest now and go on to the next one
+    def skip(self,t,tempMK):
+        if self.phase in ('ramp','wait','hold'):
+            self.phase='hold'
+            self.t_hold=t
+            self.update(t,tempMK)
+
+    ##Seconds left in the hold of the active rest, None while the hold has not started
+    def remaining(self,t):
+        if self.phase!='hold':
+            return None
+        return max(0.0,self.t_hold-t)
+
+    ##Total time of all rests, ramps and holds, not counting the waits (min)
+    def duration(self,tempMK=None):
+        total=0.0
+        for i,step in enumerate(self.steps):
+            if i==0 and tempMK is None:
+                ramp=0
+            elif i==0:
+                ramp=len(self.ramp_table(tempMK,step))
+            else:
+                ramp=len(step.table)
+            total+=step.hold+(ramp*self.dt/60 if step.ramp>0 else 0)
+        return total
+
+
+##Read a recipe file into a mash_schedule
+def read_schedule(path,dt=0.5):
+    steps=[]
+    tolerance=1.0
+    with open(path) as f:
+        for n,line in enumerate(f,1):
+            fields=line.split('#')[0].split()
+            if not fields:
+                continue
+            try:
+                if fields[0].lower()=='tolerance':
+                    tolerance=float(fields[1])
+                    continue
+                name=fields[0]
+                temp=float(fields[1])
+                hold=float(fields[2])
+                ramp=float(fields[3]) if len(fields)>3 else 0.0
+                boil=float(fields[4]) if len(fields)>4 and fields[4]!='-' else None
+            except (IndexError,ValueError):
+                raise ValueError('%s line %d: expected "name mash_temp hold [ramp] [boil_temp]", got: %s' % (path,n,line.strip()))
+            steps.append(mash_step(name,temp,hold,ramp,boil))
+    return mash_schedule(steps,dt,tolerance,path)
+
+
+if __name__ == "__main__":
+    import sys
+    for path in sys.argv[1:]:
+        sched=read_schedule(path)
+        print('%s: %d rests, tolerance %.1f degF, %.0f min plus waits' % (path,len(sched.steps),sched.tolerance,sched.duration()))
+        for i,step in enumerate(sched.steps):
+            ramp='step' if step.ramp<=0 else '%.1f degF/min' % step.ramp
+            if i>0 and step.ramp>0:
+                ramp+=' (%.1f min)' % (len(step.table)*sched.dt/60)
+            boil='' if step.boil is None else '  boil %.0f' % step.boil
+            print('    %-12s %6.1f degF  hold %5.1f min  ramp %s%s' % (step.name,step.temp,step.hold,ramp,boil))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_sim.py
+
+    Description: Hardware free DLP-IO8-G simulator with a thermal model of
+                 the brew system.  sim_DLP has the same methods as DLP
+                 (initialize, changeSettings, setDigitalOutput, getVoltage,
+                 disconnect).  The SSR pins drive a model of the mash tun,
+                 the RIMS heater tube and the boil kettle, and the
+                 thermistor pins return the divider voltage for the model
+                 temperatures.  With a sim_clock the control worker runs
+                 on virtual time, so a full brew runs in seconds.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Thermal model (temperatures in degF):
+        Mash heater tube:  m_MH*c*dT_MH/dt = P_M*SSR5 - mdot*c*(T_MH-T_MK)*pump - UA_MH*(T_MH-T_amb)
+        Mash tun:          m_MK*c*dT_MK/dt = mdot*c*(T_MH-T_MK)*pump - UA_MK*(T_MK-T_amb)
+        Boil kettle:       m_BK*c*dT_BK/dt = P_B*SSR6 - UA_BK*(T_BK-T_amb), limited to T_boil
+    The SSR states are constant between DAQ calls, so the model is advanced
+    to the current time on every call with a small fixed step.
+
+    Usage:
+        python3 PyBrau_sim.py            #run the brew profile as fast as possible
+        python3 PyBrau_sim.py 100        #run the brew profile at 100x real time
+    In the GUI, type "sim" in the device field to run against the simulator
+    in real time.
+
+    Calls:  PyBrau_thermLUT.py
+            PyBrau_daqio.py
+            PyBrau_control.py (profile run only)
+            Thermistor_B57861S.py (through the THERM object passed in)
+            PyBrau_vessels.py (pin map)
+    '''
+
+
+import time
+import heapq
+import bisect
+import random
+from PyBrau_thermLUT import therm_table
+from PyBrau_daqio import ADC_MAX, code_to_volts
+from PyBrau_vessels import DEFAULT_PINS
+
+
+##Virtual clock for faster than real time runs, same interface as PyBrau_control.real_clock
+class sim_clock:
+    def __init__(self,speed=0):
+        #speed=virtual seconds per real second, 0=as fast as possible
+        self.t=0.0
+        self.speed=speed
+        self.timers=[] #heap of (t,n,function) run when the clock passes t
+        self.n=0
+
+    def time(self):
+        return self.t
+
+    def time_ns(self):
+        return int(self.t*1e9)
+
+    ##Run a function (on the thread that advances the clock) when the clock reaches time t
+    def at(self,t,function):
+        heapq.heappush(self.timers,(t,self.n,function))
+        self.n+=1
+
+    def wait_until(self,t,stop_event):
+        while self.timers and self.timers[0][0]<=t:
+            t_timer,n,function=heapq.heappop(self.timers)
+            self.advance(t_timer,stop_event)
+            function()
+        self.advance(t,stop_event)
+
+    def advance(self,t,stop_event):
+        if t<=self.t:
+            return
+        if self.speed>0:
+            stop_event.wait((t-self.t)/self.speed)
+        self.t=t
+
+
+##Thermal model of the mash tun, RIMS heater tube and boil kettle
+class brew_plant:
+    def __init__(self,T_MK=70.0,T_MH=70.0,T_BK=70.0):
+        ##Temperatures, degF
+        self.T_MK=T_MK #mash tun
+        self.T_MH=T_MH #RIMS heater tube outlet
+        self.T_BK=T_BK #boil kettle
+        self.T_amb=70.0 #ambient
+        self.T_boil=212.0 #boiling point
+
+        ##Equipment
+        self.c=4186/1.8 #J/(kg*degF), specific heat of water
+        self.m_MK=35.0 #kg, water and grain in the mash tun (as water)
+        self.m_MH=0.4 #kg, water in the RIMS heater tube
+        self.m_BK=30.0 #kg, water in the boil kettle
+        self.P_M=1500.0 #W, RIMS heater element
+        self.P_B=5500.0 #W, boil heater element
+        self.mdot=0.07 #kg/s, pump flow
+        self.UA_MK=4.0 #W/degF, mash tun losses
+        self.UA_MH=0.3 #W/degF, heater tube losses
+        self.UA_BK=6.0 #W/degF, boil kettle losses (lid off)
+
+        self.dt_max=0.05 #sec, integration step
+
+    ##Advance the model by dt seconds with constant inputs
+    def step(self,dt,pump,heatM,heatB):
+        while dt>0:
+            h=min(dt,self.dt_max)
+            flow=self.mdot*self.c*(self.T_MH-self.T_MK) if pump else 0.0
+            dT_MH=(self.P_M*heatM-flow-self.UA_MH*(self.T_MH-self.T_amb))/(self.m_MH*self.c)
+            dT_MK=(flow-self.UA_MK*(self.T_MK-self.T_amb))/(self.m_MK*self.c)
+            dT_BK=(self.P_B*heatB-self.UA_BK*(self.T_BK-self.T_amb))/(self.m_BK*self.c)
+            self.T_MH+=dT_MH*h
+            self.T_MK+=dT_MK*h
+            self.T_BK=min(self.T_BK+dT_BK*h,self.T_boil)
+            dt-=h
+
+
+##Simulated DLP-IO8-G, drop in replacement for DLP_IO8_G_py.DLP
+class sim_DLP:
+    def __init__(self,THERM,plant=None,clock=time.monotonic,R_ref=10000,VREF=5.0,noise=0.0,spikes=0.0,pins=None):
+        #THERM=thermistor model, used to turn temperatures into voltages
+        #plant=thermal model, a new brew_plant if None
+        #clock=function returning the time in seconds (e.g. sim_clock.time)
+        #noise=ADC noise, standard deviation in ADC codes
+        #spikes=probability that a reading is a random spike (e.g. pump relay noise)
+        #pins=pin map of the mash/boil system (see PyBrau_vessels.py), pins of extra vessels read 0 V
+        self.plant=brew_plant() if plant is None else plant
+        self.clock=clock
+        self.noise=noise
+        self.spikes=spikes
+        self.outputs=[0]*9 #pin states, index=pin
+        self.t=None
+        self.calls=0 #number of DAQ calls, each one would be a serial round-trip
+
+        ##Thermistor table inverted: ADC code for a temperature
+        table=therm_table(THERM,R_ref,VREF)
+        self.codes=sorted(range(ADC_MAX+1),key=lambda code:table.temp[code])
+        self.temps=[table.temp[code] for code in self.codes]
+
+        ##Thermistor and SSR pins
+        self.pins=dict(DEFAULT_PINS,**(pins or {}))
+        self.sensors={self.pins['mash_temp']:'T_MK',self.pins['heater_temp']:'T_MH',self.pins['boil_temp']:'T_BK'}
+
+    def initialize(self):
+        self.t=self.clock()
+        return 0
+
+    def changeSettings(self,mode,units):
+        pass
+
+    def disconnect(self):
+        pass
+
+    ##Bring the model up to the current time with the SSR states of the last period
+    def update(self):
+        t=self.clock()
+        if self.t is None:
+            self.t=t
+        self.plant.step(t-self.t,self.outputs[self.pins['pump']],self.outputs[self.pins['mash_heater']],self.outputs[self.pins['boil_heater']])
+        self.t=t
+
+    def setDigitalOutput(self,pin,state):
+        self.calls+=1
+        self.update()
+        self.outputs[pin]=state
+
+    def getVoltage(self,pin):
+        self.calls+=1
+        self.update()
+        if pin not in self.sensors:
+            return 0.0
+        temp=getattr(self.plant,self.sensors[pin])
+        i=min(bisect.bisect_left(self.temps,temp),ADC_MAX)
+        code=self.codes[i]
+        if self.noise:
+            code=code+int(round(random.gauss(0,self.noise)))
+        if self.spikes and random.random()<self.spikes:
+            code=random.randint(0,ADC_MAX)
+        return code_to_volts(min(max(code,0),ADC_MAX))
+
+
+##Brew profile run by the simulator: (minute, command, arguments)
+SIM_PROFILE=[(0,'setpoints',(152,170,0,0.5,0.5)),
+             (0,'pump',(1,)),
+             (0,'mash',(1,)),
+             (0,'boil_type',(1,)),
+             (0,'boil',(1,)),
+             (60,'setpoints',(168,212,100,0.5,0.5)),
+             (70,'mash',(0,)),
+             (70,'pump',(0,)),
+             (75,'boil_type',(0,))]
+
+
+##Run the brew profile against the simulator on virtual time
+def run_profile(THERM,minutes=90,speed=0,profile=SIM_PROFILE,report_dt=600,**worker_args):
+    from PyBrau_control import control_worker
+    from PyBrau_daqio import daq_io
+
+    CLOCK=sim_clock(speed)
+    plant=brew_plant(T_MK=145.0,T_MH=145.0,T_BK=70.0)
+    DAQ=sim_DLP(THERM,plant,CLOCK.time)
+    DAQ.initialize()
+    CTRL=control_worker(daq_io(DAQ),THERM,clock=CLOCK,**worker_args)
+    for minute,cmd,args in profile:
+        CLOCK.at(minute*60,lambda cmd=cmd,args=args:CTRL.send(cmd,*args))
+    def report():
+        state=CTRL.state
+        print('%5.1f min  mash %6.1f (heater %6.1f, DC %3.0f%%)  boil %6.1f (DC %3.0f%%)  DC opt %d' % (CLOCK.t/60,state.tempMK,state.tempMH,state.heatM_DC,state.tempBK,state.heatB_DC,state.DCopt))
+    for k in range(1,int(minutes*60/report_dt)+1):
+        CLOCK.at(k*report_dt,report)
+    CLOCK.at(minutes*60,CTRL.stop_event.set)
+
+    t_wall=time.perf_counter()
+    CTRL.start()
+    CTRL.join()
+    t_wall=time.perf_counter()-t_wall
+    print('Simulated %.0f min in %.2f s (%.0fx real time), %d DAQ calls' % (minutes,t_wall,minutes*60/t_wall,DAQ.calls))
+    return CTRL
+
+
+if __name__ == "__main__":
+    import sys
+    from Thermistor_B57861S import thermistor
+    speed=float(sys.argv[1]) if len(sys.argv)>1 else 0
+    run_profile(thermistor(),speed=speed)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_supervisor.py
+
+    Description: Supervised DAQ I/O for the control worker.  Wraps the
+                 batched I/O layer (daq_io) with the same read_codes and
+                 write_pins calls, but a failed transaction never raises:
+                 it is retried with an exponential backoff, the serial port
+                 is reopened in the background when the failures go on
+                 (the USB device enumerated again or was unplugged) and
+                 the outputs are set again once the DAQ is back.  The
+                 worker turns everything OFF when the DAQ has been gone
+                 longer than the blackout time.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    States:
+        'ok'      - last transaction worked
+        'retry'   - transactions failing, retried every backoff sec
+                    (doubling from backoff_min up to backoff_max)
+        'reopen'  - closing and opening the port again (PyBrau_connect.py)
+    blackout is True once the DAQ has been failing for blackout sec, it is
+    up to the control worker to turn the heaters and pump OFF.
+
+    Notes:
+    - Calls made while waiting for the next retry return straight away
+      (read_codes returns None, write_pins returns None) so the control
+      loop never waits on a dead serial link
+    - Every state written with write_pins is remembered.  After a failure
+      the first successful transaction writes all of them again (forced), so
+      an SSR that was left ON by a lost write is turned OFF again.
+    - The port is reopened after reopen_after failed transactions in a row.
+      The old port is closed first, then daq_connector opens the same
+      device again with its timeout: port is the identity of the device
+      (its /dev/serial/by-id path, which follows it to whatever ttyUSB it
+      enumerated as) and no other port is ever tried.  If the device does
+      not come back the transactions go on failing until the blackout.
+    - Counters: retries (failed transactions), reconnects (successful
+      reopens), errors (from daq_io, also counts the errors of the I/O
+      objects that were replaced by a reopen)
+
+    Calls:  PyBrau_daqio.py
+            PyBrau_connect.py
+    '''
+
+
+import time
+from PyBrau_daqio import daq_io
+from PyBrau_connect import daq_connector
+
+
+class daq_supervisor:
+    def __init__(self,IO,port=None,factory=None,blackout=10.0,backoff_min=0.1,backoff_max=5.0,reopen_after=3,timeout=5.0,clock=time.monotonic,lock=None):
+        #IO=daq_io of the opened DAQ
+        #port=identity of the opened DAQ (daq_connector.identity), the only device a reopen accepts
+        #factory=how to open the DAQ again (see daq_connector), None=never reopen
+        #lock=port_lock of the opened DAQ, released when it is closed
+        #blackout=sec, time without a working transaction after which blackout is set
+        #backoff_min,backoff_max=sec, time between retries
+        #reopen_after=failed transactions in a row before the port is reopened
+        #timeout=sec, longest time the reopen may take
+        self.IO=IO
+        self.port=port
+        self.factory=factory
+        self.LOCK=lock
+        self.blackout_dt=blackout
+        self.backoff_min=backoff_min
+        self.backoff_max=backoff_max
+        self.reopen_after=reopen_after
+        self.timeout=timeout
+        self.clock=clock
+
+        self.state='ok'
+        self.t_ok=clock() #time of the last working transaction
+        self.t_retry=0 #time of the next retry
+        self.backoff=backoff_min
+        self.failures=0 #failed transactions in a row
+        self.desired={} #every output state written, {pin:0/1}
+        self.CONNECT=None #background reopen
+
+        ##Counters
+        self.retries=0
+        self.reconnects=0
+        self.errors_old=0 #errors of the replaced I/O objects
+        self.last_error=''
+
+    ##DAQ I/O errors since connecting
+    @property
+    def errors(self):
+        return self.errors_old+self.IO.errors
+
+    ##True if the DAQ has been failing for longer than the blackout time
+    @property
+    def blackout(self):
+        return self.state!='ok' and self.clock()-self.t_ok>=self.blackout_dt
+
+    @property
+    def outputs(self):
+        return self.IO.outputs
+
+    def invalidate(self):
+        self.IO.invalidate()
+
+    ##Set digital outputs, states={pin:0/1}, None if the DAQ is down
+    def write_pins(self,states,force=False):
+        self.desired.update(states)
+        return self.transaction(self.IO.write_pins,states,force)
+
+    ##Raw ADC codes of several analog channels, None if the DAQ is down
+    def read_codes(self,pins):
+        return self.transaction(self.IO.read_codes,pins)
+
+    def transaction(self,function,*args):
+        now=self.clock()
+        if self.state=='reopen' and not self.reopened():
+            return None
+        if self.state!='ok' and now<self.t_retry:
+            return None
+        try:
+            if self.state!='ok':
+                #Whatever was lost while the DAQ was failing is written again first
+                self.IO.flush()
+                self.IO.write_pins(self.desired,force=True)
+            result=function(*args)
+        except (IOError,OSError) as e:
+            self.failed(now,e)
+            return None
+        if self.state!='ok':
+            print('DAQ back after %.1f s' % (now-self.t_ok))
+        self.state='ok'
+        self.t_ok=now
+        self.backoff=self.backoff_min
+        self.failures=0
+        return result
+
+    def failed(self,now,e):
+        self.retries+=1
+        self.failures+=1
+        self.last_error=str(e) or type(e).__name__
+        if self.state=='ok':
+            print('DAQ error: %s' % self.last_error)
+        self.state='retry'
+        self.t_retry=now+self.backoff
+        self.backoff=min(2*self.backoff,self.backoff_max)
+        if self.failures>=self.reopen_after and self.factory is not None:
+            self.reopen()
+
+    ##Close the port and open it again in the background
+    def reopen(self):
+        print('DAQ reopening %s' % self.port)
+        try:
+            self.IO.DAQ.disconnect()
+        except Exception:
+            pass
+        self.release()
+        self.state='reopen'
+        self.CONNECT=daq_connector(self.port,self.factory,self.timeout,attempts=1,fallback=False)
+        self.CONNECT.start()
+
+    ##Check on the reopen, True once there is a DAQ to try again
+    def reopened(self):
+        if self.CONNECT.is_alive() and self.CONNECT.phase!='connected':
+            return False
+        if self.CONNECT.phase=='connected':
+            self.errors_old+=self.IO.errors
+            self.IO=daq_io(self.CONNECT.DAQ)
+            self.LOCK=self.CONNECT.LOCK
+            self.reconnects+=1
+            self.failures=0
+            print('DAQ reopened on %s' % self.CONNECT.port)
+        self.CONNECT=None
+        self.state='retry'
+        self.t_retry=self.clock()
+        return True
+
+    ##Close the port
+    def disconnect(self):
+        if self.CONNECT is not None:
+            self.CONNECT.cancel()
+        try:
+            self.IO.DAQ.disconnect()
+        finally:
+            self.release()
+
+    ##Let other programs have the port
+    def release(self):
+        if self.LOCK is not None:
+            self.LOCK.release()
+            self.LOCK=None
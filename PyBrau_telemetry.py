@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_telemetry.py
+
+    Description: Streaming telemetry for remote dashboards.  The control
+                 worker hands the publisher one sample per temperature
+                 sample: every field of the data log plus the states the
+                 SSR outputs were actually last written with.  The sample
+                 is packed once into a fixed size binary frame and queued
+                 for every subscriber connected to a local TCP port.  Each
+                 subscriber has its own thread and a bounded queue, a
+                 subscriber that cannot keep up loses the oldest frames
+                 and never holds up the control loop.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Protocol (TCP on 127.0.0.1, port telemetry_port of PyBrau_config.py):
+        The subscriber may send one line within a second of connecting:
+            json  - newline delimited JSON, one object per frame with the
+                    labels below plus 'seq' and 'dropped'
+            bin   - (or nothing) binary frames
+        Binary stream:
+            8 bytes   magic, b'PYBRAUT\\x01'
+            4 bytes   header length in bytes including these 16 bytes (uint32, little endian)
+            4 bytes   frame size in bytes (uint32, little endian)
+            text      #LABELS and #UNITS lines, padded with spaces to a multiple of 8 bytes
+            frames    uint32 sequence number, one float64 per log field, one
+                      uint8 per SSR output (little endian, no padding)
+
+    Notes:
+    - Time is the UNIX time of the sample, the other fields are the ones of
+      the data log (PyBrau_logger.py) in the same order
+    - The sequence number counts every frame published, a gap means frames
+      were dropped for that subscriber
+    - publish() packs one frame and appends it to the deque of every
+      subscriber, it takes a few microseconds.  The JSON text is made in the
+      subscriber thread.
+    - A subscriber whose socket does not take a write within send_timeout sec
+      is disconnected
+    - Watch the stream with:
+        python3 PyBrau_telemetry.py [port]
+
+    Calls:  PyBrau_logger.py (log layout)
+    '''
+
+
+import threading
+import collections
+import socket
+import struct
+import json
+import sys
+from PyBrau_logger import LOG_LABELS, LOG_UNITS
+
+
+##Telemetry layout, the data log fields plus the SSR outputs
+SSR_LABELS=['Pump_SSR','Mash_SSR','Boil_SSR']
+TELEM_LABELS=LOG_LABELS+SSR_LABELS
+TELEM_UNITS=['unix_sec']+LOG_UNITS[1:]+['On/Off']*len(SSR_LABELS)
+FRAME=struct.Struct('<I%dd%dB' % (len(LOG_LABELS),len(SSR_LABELS)))
+
+MAGIC=b'PYBRAUT\x01'
+HEADER=struct.Struct('<8sII')
+
+
+##Header of the binary stream
+def stream_header():
+    text=('#LABELS %s\n#UNITS %s\n' % (' '.join(TELEM_LABELS),' '.join(TELEM_UNITS))).encode('utf-8')
+    header_len=HEADER.size+len(text)
+    pad=(-header_len)%8
+    return HEADER.pack(MAGIC,header_len+pad,FRAME.size)+text+b' '*pad
+
+
+##Start a publisher on 127.0.0.1, None if port is None or the port is taken
+def start_publisher(port):
+    if port is None:
+        return None
+    try:
+        TELEM=telemetry_publisher(port)
+    except OSError as e:
+        print('Telemetry not started, port %s: %s' % (port,e))
+        return None
+    TELEM.start()
+    print('Telemetry on 127.0.0.1:%d' % TELEM.port)
+    return TELEM
+
+
+class telemetry_publisher(threading.Thread):
+    def __init__(self,port,host='127.0.0.1',queue_len=64,max_subscribers=8,send_timeout=2.0):
+        #port=TCP port, 0 picks a free one (see self.port)
+        #queue_len=frames queued per subscriber before the oldest are dropped
+        #send_timeout=sec, a subscriber that does not take a write for this long is disconnected
+        threading.Thread.__init__(self,name='PyBrau telemetry')
+        self.daemon=True
+        self.queue_len=queue_len
+        self.max_subscribers=max_subscribers
+        self.send_timeout=send_timeout
+        self.server=socket.create_server((host,port))
+        self.port=self.server.getsockname()[1]
+        self.pack=FRAME.pack
+        self.seq=0 #frames published
+        self.subscribers=() #replaced, never changed in place, so publish() needs no lock
+        self.lock=threading.Lock()
+        self.closed=False
+
+    ##Queue one sample for every subscriber, record=data log record, ssr=states of the pump, mash and boil SSRs
+    def publish(self,record,ssr):
+        if not self.subscribers:
+            self.seq+=1
+            return
+        frame=self.pack(self.seq&0xFFFFFFFF,*record,*ssr)
+        self.seq+=1
+        for sub in self.subscribers:
+            sub.put(frame)
+
+    ##Stop listening and disconnect every subscriber
+    def close(self):
+        self.closed=True
+        try:
+            self.server.close()
+        except OSError:
+            pass
+        for sub in self.subscribers:
+            sub.close()
+
+    def run(self):
+        while not self.closed:
+            try:
+                conn,addr=self.server.accept()
+            except OSError:
+                break
+            if len(self.subscribers)>=self.max_subscribers:
+                conn.close()
+                continue
+            sub=telemetry_subscriber(conn,addr,self)
+            self.add(sub)
+            sub.start()
+
+    def add(self,sub):
+        with self.lock:
+            self.subscribers=self.subscribers+(sub,)
+
+    def remove(self,sub):
+        with self.lock:
+            self.subscribers=tuple(other for other in self.subscribers if other is not sub)
+
+
+class telemetry_subscriber(threading.Thread):
+    def __init__(self,conn,addr,publisher):
+        threading.Thread.__init__(self,name='PyBrau telemetry %s:%d' % addr[:2])
+        self.daemon=True
+        self.conn=conn
+        self.publisher=publisher
+        self.frames=collections.deque(maxlen=publisher.queue_len) #append drops the oldest frame when full
+        self.wake=threading.Event()
+        self.dropped=0 #frames lost because the subscriber fell behind
+        self.closed=False
+
+    ##Queue a frame, called from the control worker
+    def put(self,frame):
+        if len(self.frames)==self.frames.maxlen:
+            self.dropped+=1
+        self.frames.append(frame)
+        self.wake.set()
+
+    def close(self):
+        self.closed=True
+        self.wake.set()
+
+    def run(self):
+        try:
+            ##Format requested by the subscriber
+            self.conn.settimeout(1.0)
+            try:
+                request=self.conn.recv(64)
+            except socket.timeout:
+                request=b''
+            as_json=request.strip()==b'json'
+            self.conn.settimeout(self.publisher.send_timeout)
+            if not as_json:
+                self.conn.sendall(stream_header())
+            while not self.closed:
+                self.wake.wait(1.0)
+                self.wake.clear()
+                chunk=[]
+                while self.frames:
+                    frame=self.frames.popleft()
+                    chunk.append(self.to_json(frame) if as_json else frame)
+                if chunk:
+                    self.conn.sendall(b''.join(chunk))
+        except OSError:
+            pass
+        finally:
+            self.publisher.remove(self)
+            self.conn.close()
+
+    def to_json(self,frame):
+        values=FRAME.unpack(frame)
+        data=dict(zip(TELEM_LABELS,values[1:]))
+        data['seq']=values[0]
+        data['dropped']=self.dropped
+        return (json.dumps(data)+'\n').encode()
+
+
+if __name__ == "__main__":
+    port=int(sys.argv[1]) if len(sys.argv)>1 else 8421
+    with socket.create_connection(('127.0.0.1',port)) as conn:
+        conn.sendall(b'json\n')
+        for line in conn.makefile('r'):
+            print(line,end='')
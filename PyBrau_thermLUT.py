@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_thermLUT.py
+
+    Description: Precomputed voltage to temperature table for the B57861S
+                 thermistors.  The DAQ has a 10 bit ADC so every reading
+                 is one of 1024 codes.  The table evaluates the thermistor
+                 model once per code at startup, after that a reading is a
+                 list lookup (by ADC code) or a linear interpolation
+                 between two codes (by voltage).
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - Lookups by ADC code return exactly what the thermistor model returns
+    - Lookups by voltage are within 0.05 degF of the model over the brewing
+      range, run this file to check the error and the speedup:
+        python3 PyBrau_thermLUT.py
+    - Codes where the model can not be evaluated (0 V and full scale) take the
+      value of the nearest code that can
+
+    Calls:  Thermistor_B57861S.py (through the THERM object passed in)
+            PyBrau_daqio.py
+    '''
+
+
+from array import array
+from PyBrau_daqio import ADC_MAX, ADC_VREF, code_to_volts
+
+
+class therm_table:
+    def __init__(self,THERM,R_ref=10000,VREF=5.0):
+        #THERM=thermistor model object
+        #R_ref=fixed resistor of the voltage divider, ohms
+        #VREF=voltage divider supply voltage
+        self.THERM=THERM
+        self.R_ref=R_ref
+        self.VREF=VREF
+
+        ##Evaluate the model for every ADC code
+        self.temp=array('d',[0.0]*(ADC_MAX+1)) #degF, indexed by ADC code
+        valid=[]
+        for code in range(ADC_MAX+1):
+            try:
+                self.temp[code]=THERM.getTempF(R_ref,VREF,code_to_volts(code))
+                valid.append(code)
+            except (ValueError,ZeroDivisionError,OverflowError):
+                self.temp[code]=float('nan')
+        for code in range(ADC_MAX+1):
+            if self.temp[code]!=self.temp[code]:
+                self.temp[code]=self.temp[min(valid,key=lambda v:abs(v-code))]
+
+    ##Temperature for an ADC code
+    def getTempF_code(self,code):
+        return self.temp[code]
+
+    ##Drop in replacement for thermistor.getTempF, interpolates between ADC codes
+    def getTempF(self,R_ref,VREF,volts):
+        #Anything the table was not built for goes to the model
+        if R_ref!=self.R_ref or VREF!=self.VREF:
+            return self.THERM.getTempF(R_ref,VREF,volts)
+        x=volts*(ADC_MAX/ADC_VREF)
+        if x<=0:
+            return self.temp[0]
+        if x>=ADC_MAX:
+            return self.temp[ADC_MAX]
+        i=int(x)
+        return self.temp[i]+(x-i)*(self.temp[i+1]-self.temp[i])
+
+
+##Accuracy check and benchmark against the thermistor model
+if __name__ == "__main__":
+    import timeit
+    from Thermistor_B57861S import thermistor
+
+    THERM=thermistor()
+    t_build=timeit.default_timer()
+    TABLE=therm_table(THERM,10000,5.0)
+    t_build=timeit.default_timer()-t_build
+
+    ##Worst error over the brewing range (40 to 230 degF) on a voltage sweep 10x finer than the ADC
+    err_max=0
+    for i in range(10*ADC_MAX+1):
+        volts=i*ADC_VREF/(10*ADC_MAX)
+        try:
+            temp=THERM.getTempF(10000,5.0,volts)
+        except (ValueError,ZeroDivisionError,OverflowError):
+            continue
+        if 40<=temp<=230:
+            err_max=max(err_max,abs(TABLE.getTempF(10000,5.0,volts)-temp))
+    err_code=max(abs(TABLE.getTempF_code(code)-THERM.getTempF(10000,5.0,code_to_volts(code))) for code in range(1,ADC_MAX))
+
+    n=100000
+    t_model=timeit.timeit(lambda:THERM.getTempF(10000,5.0,2.5),number=n)/n
+    t_volts=timeit.timeit(lambda:TABLE.getTempF(10000,5.0,2.5),number=n)/n
+    t_code=timeit.timeit(lambda:TABLE.getTempF_code(512),number=n)/n
+
+    print('Table build time:            %.1f ms' % (t_build*1e3))
+    print('Max error by voltage:        %.4f degF (40 to 230 degF)' % err_max)
+    print('Max error by ADC code:       %.4f degF' % err_code)
+    print('Thermistor model:            %.2f us/call' % (t_model*1e6))
+    print('Table by voltage:            %.2f us/call (%.1fx)' % (t_volts*1e6,t_model/t_volts))
+    print('Table by ADC code:           %.2f us/call (%.1fx)' % (t_code*1e6,t_model/t_code))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_trend.py
+
+    Description: Scrolling trend chart of the mash and boil temperatures,
+                 their setpoints and the heater duty cycles.  Samples are
+                 decimated to one point per screen pixel as they come in
+                 and kept in fixed size ring buffers.  Every line is
+                 created once and redrawn by moving its coordinates, so
+                 the cost of a redraw does not depend on how long the
+                 brew has been running.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Notes:
+    - One pixel column covers span/width seconds, all samples that fall into
+      the same column are averaged into one point
+    - Temperatures use the left axis (temp_min to temp_max degF), duty cycles
+      use the right axis (0 to 100 %), values outside the axis range are drawn
+      at the edge of the plot
+    - The window is created the first time it is shown and only hidden when it
+      is closed, samples keep coming in while it is hidden
+    '''
+
+
+import tkinter as tk
+from array import array
+
+
+##Series drawn in the chart: (name, color, dash, axis)
+TREND_SERIES=[('Mash','blue',None,'temp'),
+              ('Mash heater','#7F00FF',None,'temp'),
+              ('Boil','red',None,'temp'),
+              ('Mash set','blue',(4,2),'temp'),
+              ('Boil set','red',(4,2),'temp'),
+              ('Mash DC','#00A000',None,'dc'),
+              ('Boil DC','#FFA500',None,'dc')]
+
+
+class trend_chart:
+    def __init__(self,master,span=1800,width=700,height=300,temp_min=50,temp_max=220):
+        #span=sec, time shown across the chart
+        #width,height=plot area in pixels
+        self.master=master
+        self.span=span
+        self.width=width
+        self.height=height
+        self.temp_min=temp_min
+        self.temp_max=temp_max
+        self.dt=span/width #sec per pixel column
+        self.n=len(TREND_SERIES)
+
+        ##Ring buffers, one point per pixel column
+        self.points=[array('d',bytes(8*width)) for i in range(self.n)]
+        self.row=0 #next column to write
+        self.count=0 #columns written, up to width
+        self.col_t=None #start time of the column being averaged
+        self.col_sum=[0.0]*self.n
+        self.col_count=0
+
+        self.window=None
+        self.dirty=False #new points since the last redraw
+
+    ##Add one sample of all series (same order as TREND_SERIES)
+    def add(self,t,values):
+        if self.col_t is None:
+            self.col_t=t
+        #Close the columns the sample is past
+        while t-self.col_t>=self.dt:
+            if self.col_count:
+                for i in range(self.n):
+                    self.points[i][self.row]=self.col_sum[i]/self.col_count
+                self.row=(self.row+1)%self.width
+                self.count=min(self.count+1,self.width)
+                self.dirty=True
+            self.col_t=self.col_t+self.dt
+            self.col_sum=[0.0]*self.n
+            self.col_count=0
+            #Do not fill a long gap one column at a time
+            if t-self.col_t>=self.dt*self.width:
+                self.col_t=t
+        self.col_sum=[s+v for s,v in zip(self.col_sum,values)]
+        self.col_count+=1
+
+    #################### WINDOW ####################
+    def show(self):
+        if self.window is None:
+            self.build()
+        self.window.deiconify()
+        self.window.lift()
+        self.dirty=True
+        self.redraw()
+
+    def hide(self):
+        self.window.withdraw()
+
+    def visible(self):
+        return self.window is not None and self.window.state()=='normal'
+
+    def build(self):
+        pad_l=45
+        pad_r=45
+        pad_t=30
+        pad_b=25
+        self.x0=pad_l
+        self.y0=pad_t
+        self.window=tk.Toplevel(self.master)
+        self.window.title('Py Brau Trends')
+        self.window.geometry('800x412+0+0')
+        self.window.protocol("WM_DELETE_WINDOW",self.hide)
+        self.canvas=tk.Canvas(self.window,width=self.width+pad_l+pad_r,height=self.height+pad_t+pad_b,background='white')
+        self.canvas.pack()
+        tk.Button(self.window,text="CLOSE",command=self.hide).pack(pady=(5,0))
+
+        ##Axes, grid and labels are drawn once
+        x1=self.x0+self.width
+        y1=self.y0+self.height
+        self.canvas.create_rectangle(self.x0,self.y0,x1,y1,outline='black')
+        for k in range(5):
+            y=self.y0+k*self.height/4
+            self.canvas.create_line(self.x0,y,x1,y,fill='#DDDDDD')
+            self.canvas.create_text(self.x0-5,y,text='{:.0f}'.format(self.temp_max-k*(self.temp_max-self.temp_min)/4),anchor=tk.E)
+            self.canvas.create_text(x1+5,y,text='{:.0f}%'.format(100-k*25),anchor=tk.W)
+        self.canvas.create_text(self.x0,y1+12,text='-{:.0f} min'.format(self.span/60),anchor=tk.W)
+        self.canvas.create_text(x1,y1+12,text='now',anchor=tk.E)
+        x=self.x0
+        for name,color,dash,axis in TREND_SERIES:
+            item=self.canvas.create_text(x,self.y0-15,text=name,fill=color,anchor=tk.W)
+            x=self.canvas.bbox(item)[2]+15
+
+        ##One line per series, moved by redraw()
+        self.lines=[self.canvas.create_line(0,0,0,0,fill=color,dash=dash,width=2,state='hidden') for name,color,dash,axis in TREND_SERIES]
+        self.lines_shown=False
+
+        ##Precomputed screen scaling
+        self.xs=[self.x0+i for i in range(self.width)]
+        self.scale=[]
+        for name,color,dash,axis in TREND_SERIES:
+            if axis=='temp':
+                self.scale.append((self.height/(self.temp_max-self.temp_min),self.temp_max))
+            else:
+                self.scale.append((self.height/100,100))
+
+    ##Move the lines to the buffered points, newest point at the right edge
+    def redraw(self):
+        if not self.dirty or not self.visible():
+            return
+        self.dirty=False
+        if self.count<2:
+            return
+        xs=self.xs[self.width-self.count:]
+        start=(self.row-self.count)%self.width
+        for i in range(self.n):
+            points=self.points[i]
+            if start+self.count<=self.width:
+                values=points[start:start+self.count]
+            else:
+                values=points[start:]+points[:self.row]
+            k,top=self.scale[i]
+            y0=self.y0
+            y1=self.y0+self.height
+            ys=[min(max(y0+k*(top-v),y0),y1) for v in values]
+            coords=[c for xy in zip(xs,ys) for c in xy]
+            self.canvas.coords(self.lines[i],*coords)
+        if not self.lines_shown:
+            for line in self.lines:
+                self.canvas.itemconfig(line,state='normal')
+            self.lines_shown=True
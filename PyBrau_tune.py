@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_tune.py
+
+    Description: Auto-tuning of the mash and boil PI gains.  A process model
+                 (gain, dead time and heat loss) of a kettle is identified
+                 either live with a relay test run by the control worker or
+                 from a PyBrau data log, the PI gains are computed from the
+                 model with the SIMC rules and the closed loop settling time
+                 and overshoot are predicted by simulating the model.  Gains
+                 are kept per equipment profile in a JSON file.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Process model (per kettle):
+        dT/dt = k*u(t-theta) - a*(T-T_amb)
+        k=degF/sec at full duty cycle, theta=sec dead time, a=1/sec heat loss
+    A kettle heats for much longer than it takes to lose its heat, so a is
+    small and the model is close to an integrator with dead time.
+
+    Relay test:
+    - The heater is switched between u_high and u_low around the setpoint
+      with a hysteresis band, the kettle oscillates around the setpoint
+    - With A the peak to peak amplitude and H1, H2 the heating and cooling
+      half periods (time between relay switches), the heating and cooling
+      rates are r1=A/H1 and r2=A/H2, k=(r1+r2)/(u_high-u_low) and the dead
+      time is theta=(A-2*hysteresis)/(r1+r2).  Switch times and averaged peaks
+      are used rather than slopes because the temperature is quantized to
+      the ADC resolution (about 0.3 degF at mash temperatures).
+    - The relay works on a moving average of the temperature (smooth sec) so
+      sensor noise does not switch it, the delay of the average (smooth/2)
+      is taken off the dead time
+    - The duty cycle that holds the setpoint follows from the ratio of the
+      two rates and gives the heat loss a
+    - The boil kettle cools slowly with the heater OFF, so a boil relay test
+      takes a long time; u_low must stay below the duty cycle that holds the
+      setpoint or the kettle never cools back through the band
+
+    Gains (SIMC, tauc=closed loop time constant, the dead time but at least
+    TAUC_MIN by default, faster loops just chatter on the ADC steps):
+        P=1/(k*(tauc+theta)),  Ti=min(1/a,4*(tauc+theta)),  I=P/Ti
+    The integrator clamp is set so the integral term alone can reach full
+    duty cycle (esum_max=1/I).
+
+    Usage:
+        python3 PyBrau_tune.py PyBrau_Log_<timestamp>.bin                  #identify both kettles from a log
+        python3 PyBrau_tune.py PyBrau_Log_<timestamp>.bin --save -p 10gal  #and store the gains in profile '10gal'
+        python3 PyBrau_tune.py --sim                                       #relay test of both kettles on the simulator
+
+    Calls:  PyBrau_config.py
+            PyBrau_logreader.py (log identification only)
+            PyBrau_sim.py (--sim only)
+    '''
+
+
+import json
+import os
+import time
+import collections
+from PyBrau_config import write_json
+
+
+PROFILE_PATH='PyBrau_profiles.json' #equipment profiles with the tuned gains
+T_AMB=70.0 #degF, ambient temperature used by the models
+TAUC_MIN=5.0 #sec, shortest default closed loop time constant
+
+
+##Kettle model identified by a relay test or from a log
+process_model=collections.namedtuple('process_model',['k','theta','a'])
+
+
+##Relay test of one kettle, run by the control worker in place of the PI controller
+class relay_tuner:
+    def __init__(self,kettle,setpoint,u_high=1.0,u_low=0.0,hysteresis=1.0,cycles=3,timeout=7200,smooth=10.0,T_amb=T_AMB):
+        #kettle='mash' or 'boil'
+        #setpoint=degF, temperature the test oscillates around
+        #hysteresis=degF, the heater switches at setpoint +/- hysteresis
+        #cycles=number of full oscillations measured (after one to settle)
+        #timeout=sec, the test fails if it has not finished by then
+        #smooth=sec, length of the moving average of the temperature
+        self.kettle=kettle
+        self.setpoint=setpoint
+        self.u_high=u_high
+        self.u_low=u_low
+        self.hysteresis=hysteresis
+        self.cycles=cycles
+        self.timeout=timeout
+        self.smooth=smooth
+        self.T_amb=T_amb
+
+        self.samples=collections.deque() #(t,T) in the moving average
+        self.T_sum=0.0
+
+        self.phase='idle' #'idle','relay','done','failed'
+        self.t_start=None
+        self.u=u_high
+        self.t_switch=None
+        self.ext_T=None #temperature peak after the last switch
+        self.turns=[] #(t_switch,u,T_turn) of every finished half cycle, T_turn=temperature peak after the switch
+        self.model=None
+        self.message=''
+
+    ##Heater duty cycle (0 to 1) for temperature T at time t
+    def update(self,t,T):
+        if self.phase in ('done','failed'):
+            return 0.0
+        ##Moving average of the temperature
+        self.samples.append((t,T))
+        self.T_sum+=T
+        while t-self.samples[0][0]>=self.smooth:
+            self.T_sum-=self.samples.popleft()[1]
+        T=self.T_sum/len(self.samples)
+
+        if self.phase=='idle':
+            self.phase='relay'
+            self.t_start=t
+            self.u=self.u_high if T<self.setpoint else self.u_low
+        if t-self.t_start>self.timeout:
+            self.phase='failed'
+            self.message='no steady oscillation after %.0f min' % (self.timeout/60)
+            return 0.0
+
+        ##Follow the turning point of the temperature after the last switch
+        if self.t_switch is not None:
+            if (self.u==self.u_low and T>self.ext_T) or (self.u==self.u_high and T<self.ext_T):
+                self.ext_T=T
+
+        ##Relay with hysteresis
+        if self.u==self.u_high and T>=self.setpoint+self.hysteresis:
+            self.switch(t,T,self.u_low)
+        elif self.u==self.u_low and T<=self.setpoint-self.hysteresis:
+            self.switch(t,T,self.u_high)
+        return self.u
+
+    def switch(self,t,T,u):
+        if self.t_switch is not None:
+            self.turns.append((self.t_switch,self.u,self.ext_T))
+        self.u=u
+        self.t_switch=t
+        self.ext_T=T
+        #Two half cycles to settle, then the measured cycles
+        if len(self.turns)>=2*(self.cycles+1):
+            self.model=relay_model(self.turns[2:]+[(t,u,None)],self.u_high,self.u_low,self.hysteresis,self.setpoint,self.T_amb,self.smooth/2)
+            self.phase='done'
+
+    ##Seconds since the test started
+    def elapsed(self,t):
+        return 0.0 if self.t_start is None else t-self.t_start
+
+
+##Process model from the relay switches and temperature peaks of a relay test
+def relay_model(turns,u_high,u_low,hysteresis,setpoint,T_amb=T_AMB,lag=0.0):
+    #turns=(t_switch,u,T_peak) of every half cycle, the last one only gives the end time of the one before
+    #lag=sec, delay of the temperature measurement that is not part of the process
+    heat=[t1-t0 for (t0,u,T),(t1,u1,T1) in zip(turns,turns[1:]) if u==u_high]
+    cool=[t1-t0 for (t0,u,T),(t1,u1,T1) in zip(turns,turns[1:]) if u==u_low]
+    T_max=[T for t0,u,T in turns[:-1] if u==u_low] #the temperature peaks after switching the heater down
+    T_min=[T for t0,u,T in turns[:-1] if u==u_high]
+    A=sum(T_max)/len(T_max)-sum(T_min)/len(T_min)
+    r1=A/(sum(heat)/len(heat))
+    r2=A/(sum(cool)/len(cool))
+    theta=max(max(A-2*hysteresis,0.0)/(r1+r2)-lag,0.0)
+    k=(r1+r2)/(u_high-u_low)
+    u_hold=u_high-r1/k #duty cycle that holds the setpoint
+    a=max(k*u_hold/(setpoint-T_amb),0.0) if setpoint>T_amb else 0.0
+    return process_model(k,theta,a)
+
+
+##Process model from logged data by least squares, for every dead time up to theta_max
+def identify(t,T,u,theta_max=120,window=10,T_amb=T_AMB):
+    #t=sec, T=degF, u=duty cycle (0 to 1), all sequences of the same length with a fixed sample time
+    #window=samples over which the temperature slope is taken, smooths sensor noise
+    n=len(t)
+    if n<2*window+2:
+        raise ValueError('Not enough samples to identify a model (%d)' % n)
+    dt=(t[-1]-t[0])/(n-1)
+    best=None
+    for lag in range(0,int(theta_max/dt)+1):
+        ##Regress the slope on the delayed mean duty cycle and the temperature above ambient
+        #dT/dt = k*u(t-theta) - a*(T-T_amb) over each window
+        Suu=Sux=Sxx=Suy=Sxy=Syy=0.0
+        m=0
+        for i in range(lag,n-window,window):
+            y=(T[i+window]-T[i])/(t[i+window]-t[i])
+            uu=sum(u[i-lag:i-lag+window])/window
+            x=-(0.5*(T[i]+T[i+window])-T_amb)
+            Suu+=uu*uu
+            Sux+=uu*x
+            Sxx+=x*x
+            Suy+=uu*y
+            Sxy+=x*y
+            Syy+=y*y
+            m+=1
+        det=Suu*Sxx-Sux*Sux
+        if m<3 or det<=0:
+            continue
+        k=(Suy*Sxx-Sxy*Sux)/det
+        a=(Sxy*Suu-Suy*Sux)/det
+        res=(Syy-k*Suy-a*Sxy)/m #mean squared residual
+        if k>0 and (best is None or res<best[0]):
+            best=(res,process_model(k,lag*dt,max(a,0.0)))
+    if best is None:
+        raise ValueError('No heater response found, the heater must change duty cycle during the log')
+    return best[1]
+
+
+##PI gains for a process model, returns (P,I,esum_max) for PI_ctrl
+def pi_gains(model,tauc=None,DC_T=0.5):
+    #tauc=sec, closed loop time constant, the dead time (at least TAUC_MIN) if None
+    theta=max(model.theta,DC_T)
+    if tauc is None:
+        tauc=max(theta,TAUC_MIN)
+    P=1/(model.k*(tauc+theta))
+    Ti=4*(tauc+theta)
+    if model.a>0:
+        Ti=min(Ti,1/model.a)
+    I=P/Ti
+    return P,I,1/I
+
+
+##Closed loop step response of PI_ctrl on the model, returns (settling time sec, overshoot degF)
+def predict_step(model,P,I,esum_max,DC_T=0.5,step=10.0,setpoint=152.0,band=0.5,t_max=14400,T_amb=T_AMB):
+    #band=degF, the temperature has settled once it stays within setpoint +/- band
+    delay=collections.deque([0.0]*max(1,int(round(model.theta/DC_T))))
+    T=setpoint-step
+    esum=0.0
+    T_max=T
+    t_settled=0.0
+    for i in range(int(t_max/DC_T)):
+        ##Same PI as the control worker
+        error=setpoint-T
+        esum=min(max(esum+error*DC_T,-esum_max),esum_max)
+        u=min(max(P*error+I*esum,0.0),1.0)
+        delay.append(u)
+        u=delay.popleft()
+        T+=(model.k*u-model.a*(T-T_amb))*DC_T
+        T_max=max(T_max,T)
+        if abs(T-setpoint)>band:
+            t_settled=(i+1)*DC_T
+    return t_settled,max(T_max-setpoint,0.0)
+
+
+##Measured settling time and overshoot of a logged setpoint step starting at time t0
+def step_metrics(t,T,setpoint,t0,band=0.5):
+    T_max=None
+    t_settled=0.0
+    for ti,Ti in zip(t,T):
+        if ti<t0:
+            continue
+        T_max=Ti if T_max is None else max(T_max,Ti)
+        if abs(Ti-setpoint)>band:
+            t_settled=ti-t0
+    if T_max is None:
+        return None,None
+    return t_settled,max(T_max-setpoint,0.0)
+
+
+##Tuning result of one kettle, as stored in the profile
+def tune_result(model,DC_T=0.5,tauc=None,source=''):
+    P,I,esum_max=pi_gains(model,tauc,DC_T)
+    settling,overshoot=predict_step(model,P,I,esum_max,DC_T)
+    return {'P':P,'I':I,'esum_max':esum_max,
+            'k':model.k,'theta':model.theta,'a':model.a,
+            'settling':settling,'overshoot':overshoot,
+            'source':source,'time':time.strftime("%Y-%m-%d %H:%M")}
+
+
+#################### EQUIPMENT PROFILES ####################
+def load_profiles(path=PROFILE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+##Gains of a profile as {kettle:(P,I,esum_max)}, empty if the profile has not been tuned
+def profile_gains(profile,path=PROFILE_PATH):
+    kettles=load_profiles(path).get(profile,{})
+    return {kettle:(r['P'],r['I'],r['esum_max']) for kettle,r in kettles.items()}
+
+##Tuning results of a profile as {kettle:result}, with the process model (k, theta, a) of each tuned kettle
+def profile_models(profile,path=PROFILE_PATH):
+    return load_profiles(path).get(profile,{})
+
+##Store the tuning result of one kettle in a profile
+def save_result(profile,kettle,result,path=PROFILE_PATH):
+    profiles=load_profiles(path)
+    profiles.setdefault(profile,{})[kettle]=result
+    write_json(path,profiles,indent=2)
+
+
+def report(kettle,result):
+    print('%-4s model: k=%.4f degF/s, dead time %.1f s, loss %.2e 1/s' % (kettle,result['k'],result['theta'],result['a']))
+    print('     gains: P=%.4f I=%.5f integrator clamp=%.1f' % (result['P'],result['I'],result['esum_max']))
+    print('     10 degF step: settles (+/-0.5 degF) in %.1f min, overshoot %.2f degF' % (result['settling']/60,result['overshoot']))
+
+
+if __name__ == "__main__":
+    import argparse
+    parser=argparse.ArgumentParser(description='PyBrau PI auto-tune')
+    parser.add_argument('log',nargs='?',help='PyBrau data log to identify the kettles from')
+    parser.add_argument('--kettle',choices=('mash','boil'),help='only this kettle')
+    parser.add_argument('-p','--profile',default='default',help='equipment profile')
+    parser.add_argument('--save',action='store_true',help='store the gains in the profile')
+    parser.add_argument('--sim',action='store_true',help='relay test on the simulator instead of a log')
+    args=parser.parse_args()
+    kettles=(args.kettle,) if args.kettle else ('mash','boil')
+
+    results={}
+    if args.sim:
+        from Thermistor_B57861S import thermistor
+        from PyBrau_sim import sim_DLP, sim_clock, brew_plant
+        from PyBrau_control import control_worker
+        from PyBrau_daqio import daq_io
+        for kettle in kettles:
+            CLOCK=sim_clock()
+            DAQ=sim_DLP(thermistor(),brew_plant(T_MK=140,T_MH=140,T_BK=160),CLOCK.time,noise=0.5)
+            DAQ.initialize()
+            CTRL=control_worker(daq_io(DAQ),thermistor(),clock=CLOCK)
+            CTRL.send('pump',1)
+            CTRL.send('mash',1)
+            CTRL.send('boil',1)
+            CTRL.send('boil_type',1)
+            TUNE=relay_tuner(kettle,152 if kettle=='mash' else 170)
+            CTRL.send('autotune',TUNE)
+            def check():
+                if TUNE.phase in ('done','failed'):
+                    CTRL.stop_event.set()
+                else:
+                    CLOCK.at(CLOCK.t+10,check)
+            CLOCK.at(10,check)
+            CTRL.start()
+            CTRL.join()
+            if TUNE.phase!='done':
+                print('%s relay test failed: %s' % (kettle,TUNE.message))
+                continue
+            print('%s relay test took %.1f min' % (kettle,TUNE.elapsed(CLOCK.t)/60))
+            results[kettle]=tune_result(TUNE.model,source='relay test (simulator)')
+    else:
+        from PyBrau_logreader import brau_log
+        with brau_log(args.log) as log:
+            t=list(log['Time'])
+            for kettle,temp,duty in (('mash','Mash_temp','Mash_dutycycle_active'),('boil','Boil_temp','Boil_dutycycle_active')):
+                if kettle in kettles:
+                    try:
+                        model=identify(t,list(log[temp]),[d/100 for d in log[duty]])
+                    except ValueError as e:
+                        print('%s: %s' % (kettle,e))
+                        continue
+                    results[kettle]=tune_result(model,source=os.path.basename(args.log))
+
+    for kettle,result in results.items():
+        report(kettle,result)
+        if args.save:
+            save_result(args.profile,kettle,result)
+    if args.save and results:
+        print('Saved to profile "%s" in %s' % (args.profile,PROFILE_PATH))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+'''
+    PyBrau_vessels.py
+
+    Description: Data driven pin map of a brew system.  Instead of the
+                 fixed DLP-IO8-G pins (1-3 thermistors, 4 pump, 5 and 6
+                 heaters) the channels come from the configuration: the
+                 pins of the mash/boil system and a list of extra vessels
+                 (e.g. a hot liquor tank or a second pump), each with its
+                 own sensor, heater, pump and PI controller.  Several
+                 brew systems, each on its own DAQ, can be listed for the
+                 daemon, it runs one control worker (and so one DAQ I/O
+                 thread) per system.
+
+    Revision History
+    16 Oct 2026 - Created
+
+    Author: Lars Soltmann
+
+    Configuration (PyBrau_config.json):
+        "pins":    {"mash_temp":1,"heater_temp":2,"boil_temp":3,
+                    "pump":4,"mash_heater":5,"boil_heater":6}
+                   any pin left out keeps the default above
+        "vessels": [{"name":"hlt","sensor":7,"heater":8,"pump":null,
+                     "P":0.375,"I":0.09375,"esum_max":5.0}]
+                   sensor, heater and pump are optional (null), a vessel
+                   without a heater is a switched pump, the gains default
+                   to the boil gains
+        "systems": [{"name":"second","port":"/dev/serial/by-id/usb-...","pins":{...},
+                     "vessels":[...]}]
+                   more brew systems run by PyBrau_daemon.py, pins and
+                   vessels start from the defaults, any other configuration
+                   key in an entry overrides the main one, a system never
+                   opens the port of another one
+        "heater_watts":    {"mash":5500,"boil":5500,"hlt":2000}
+        "circuit_limit_W": 7500
+                   power of every heater (mash, boil and the vessel names)
+                   and of the circuit, see below
+
+    Notes:
+    - Extra vessels are switched with the command 'vessel' (name, ON,
+      setpoint).  Their pump is ON while the vessel is, their heater is PI
+      controlled on their sensor.
+    - Without a circuit limit the heaters of one system are never ON at the
+      same time: the extra vessel heaters get what the mash and boil heaters
+      leave of the period, in the order they are listed.  With a limit the
+      heaters are packed into the period by their power (layout_budget in
+      PyBrau_pwm.py) and may be ON together while the total stays within it,
+      the mash and boil duty cycles are only split when the two heaters
+      together are above the limit.
+    - A pin may only be used once per system, pins are 1 to 8
+    - The temperatures of the vessel sensors follow the three kettle
+      temperatures in the worker's temps
+
+    Calls:  None
+    '''
+
+
+import collections
+
+
+##Pins of the standard mash/boil system on a DLP-IO8-G
+DEFAULT_PINS={'mash_temp':1,'heater_temp':2,'boil_temp':3,'pump':4,'mash_heater':5,'boil_heater':6}
+DAQ_PINS=range(1,9)
+
+##Published state of an extra vessel
+vessel_state=collections.namedtuple('vessel_state',['name','ON','setpoint','temp','DC','eta','kWh'])
+
+
+class vessel:
+    def __init__(self,name,sensor=None,heater=None,pump=None,P=0.375,I=0.09375,esum_max=5.0):
+        #sensor=thermistor pin, heater=SSR pin, pump=output pin, None if the vessel has none
+        self.name=name
+        self.sensor=sensor
+        self.heater=heater
+        self.pump=pump
+        self.P=P #Proportional gain
+        self.I=I #Integral gain
+        self.esum_max=esum_max #Integrator clamp
+        self.ON=0
+        self.setpoint=0
+        self.esum=0 #error summation used by integrator
+        self.temp=0
+        self.DC=0 #%, active duty cycle
+        self.ETA=None #heat-up estimator, set by the control worker if the vessel has a sensor and a heater
+        self.METER=None #energy meter of the heater, set by the control worker
+
+    ##Duty cycle (0 to 1) of the heater for the next period
+    def control(self,DC_T):
+        if self.ON==0 or self.heater is None or self.sensor is None:
+            self.esum=0
+            return 0.0
+        error=self.setpoint-self.temp
+        self.esum=max(-self.esum_max,min(self.esum_max,self.esum+error*DC_T))
+        return max(0.0,min(1.0,self.P*error+self.I*self.esum))
+
+    def state(self):
+        eta=self.ETA.eta(self.temp,self.setpoint,self.ON==1) if self.ETA is not None else None
+        kWh=self.METER.kWh if self.METER is not None else None
+        return vessel_state(self.name,self.ON,self.setpoint,self.temp,self.DC,eta,kWh)
+
+
+class system_layout:
+    def __init__(self,pins=None,vessels=(),P=0.375,I=0.09375,esum_max=5.0,watts=None,limit=None):
+        #pins=pins of the mash/boil system that differ from DEFAULT_PINS
+        #vessels=list of dicts of the extra vessels
+        #P,I,esum_max=default gains of the vessel heaters
+        #watts={'mash':W,'boil':W,vessel name:W}, power of the heaters
+        #limit=W, circuit limit of the heaters ON together, None=one heater at a time
+        self.pins=dict(DEFAULT_PINS)
+        for key,pin in (pins or {}).items():
+            if key not in DEFAULT_PINS:
+                raise ValueError('Unknown pin: %s' % key)
+            self.pins[key]=pin
+        self.vessels=[]
+        for spec in vessels:
+            spec=dict(spec)
+            if 'name' not in spec:
+                raise ValueError('Vessel without a name: %s' % spec)
+            unknown=set(spec)-{'name','sensor','heater','pump','P','I','esum_max'}
+            if unknown:
+                raise ValueError('Unknown keys of vessel %s: %s' % (spec['name'],sorted(unknown)))
+            self.vessels.append(dict({'sensor':None,'heater':None,'pump':None,'P':P,'I':I,'esum_max':esum_max},**spec))
+        names=[spec['name'] for spec in self.vessels]
+        if len(set(names))!=len(names) or 'mash' in names or 'boil' in names:
+            raise ValueError('Vessel names must be unique and not mash or boil: %s' % names)
+
+        ##Channels in the order the worker uses them
+        self.sensor_pins=(self.pins['mash_temp'],self.pins['heater_temp'],self.pins['boil_temp'])+tuple(spec['sensor'] for spec in self.vessels if spec['sensor'] is not None)
+        self.heater_pins=(self.pins['mash_heater'],self.pins['boil_heater'])+tuple(spec['heater'] for spec in self.vessels if spec['heater'] is not None)
+        self.output_pins=(self.pins['pump'],)+self.heater_pins+tuple(spec['pump'] for spec in self.vessels if spec['pump'] is not None)
+        used=self.sensor_pins+self.output_pins
+        for pin in used:
+            if pin not in DAQ_PINS:
+                raise ValueError('Pin %s is not a DAQ pin' % pin)
+        if len(set(used))!=len(used):
+            raise ValueError('A pin is used twice: sensors %s, outputs %s' % (self.sensor_pins,self.output_pins))
+
+        ##Power of each heater {pin:W}, for the circuit limit (every heater needs one) and the energy meters
+        self.limit=limit
+        self.watts={}
+        heaters={'mash':self.pins['mash_heater'],'boil':self.pins['boil_heater']}
+        heaters.update({spec['name']:spec['heater'] for spec in self.vessels if spec['heater'] is not None})
+        for name,pin in heaters.items():
+            if name in (watts or {}):
+                if limit is not None and watts[name]>limit:
+                    raise ValueError('The %s heater (%s W) is above the circuit limit (%s W)' % (name,watts[name],limit))
+                self.watts[pin]=watts[name]
+            elif limit is not None:
+                raise ValueError('No heater power given for %s' % name)
+
+    ##True if the mash and boil heaters may never be ON at the same time
+    def exclusive(self):
+        return self.limit is None or self.watts[self.pins['mash_heater']]+self.watts[self.pins['boil_heater']]>self.limit
+
+    ##Every output OFF, {pin:0}
+    def all_off(self):
+        return {pin:0 for pin in self.output_pins}
+
+    ##Fresh runtime objects of the extra vessels
+    def make_vessels(self):
+        return [vessel(**spec) for spec in self.vessels]
+
+
+##Layout of the system described by a configuration
+def config_layout(config):
+    return system_layout(config['pins'],config['vessels'],config['P_B'],config['I_B'],config['esum_max_B'],config['heater_watts'],config['circuit_limit_W'])
+
+
+##DAQ ports of every brew system but name, never opened by it
+def claimed_ports(configs,name):
+    return [system['port'] for other,system in configs if other!=name]
+
+
+##Configuration of every brew system, [(name,config)], the main one first
+def system_configs(config):
+    systems=[('main',config)]
+    for entry in config['systems']:
+        entry=dict(entry)
+        name=entry.pop('name',None)
+        if not name or name in [other for other,_ in systems]:
+            raise ValueError('Every brew system needs a unique name: %s' % name)
+        unknown=[key for key in entry if key not in config]
+        if unknown:
+            raise ValueError('Unknown configuration keys of system %s: %s' % (name,unknown))
+        #The DAQ serial number, the pin map, the vessels, the heater power and the telemetry stream belong to the main system unless the entry sets its own
+        system=dict(config,port_serial=None,pins={},vessels=[],heater_watts={},circuit_limit_W=None,telemetry_port=None,systems=[])
+        system.update(entry)
+        systems.append((name,system))
+    return systems